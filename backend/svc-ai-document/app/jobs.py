@@ -0,0 +1,444 @@
+"""
+Async job queue for long-running document processing tasks
+
+Jobs are submitted by the API and executed by workers, so OCR on a large
+deck never holds an HTTP request open. Two queue backends are provided:
+Redis for deployments and an in-process queue for tests and local runs.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+import structlog
+from pydantic import BaseModel, Field
+
+logger = structlog.get_logger()
+
+# Values of the document_status enum in backend/svc-catalog/schema.sql
+DOCUMENT_STATUSES = (
+    'uploaded',
+    'processing',
+    'classified',
+    'extracted',
+    'reviewed',
+    'approved',
+    'failed',
+)
+
+# Document status set when a task of the given type succeeds; other tasks
+# hand the document back in the status it had before the job
+TASK_SUCCESS_STATUS = {
+    'classify': 'classified',
+    'extract': 'extracted',
+}
+
+MIN_PRIORITY = 0
+MAX_PRIORITY = 9
+
+
+class Job(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    task: str
+    file_id: str
+    document_id: Optional[str] = None
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    priority: int = Field(default=5, ge=MIN_PRIORITY, le=MAX_PRIORITY)
+    max_retries: int = Field(default=3, ge=0)
+    attempts: int = 0
+    status: str = 'queued'  # queued, running, retrying, succeeded, failed
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    # documents.status before the first attempt
+    document_status: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+class JobQueue:
+    """Priority queue of jobs with delayed re-delivery for retries"""
+
+    def enqueue(self, job: Job, delay: float = 0.0) -> None:
+        raise NotImplementedError
+
+    def dequeue(self, timeout: float = 1.0) -> Optional[Job]:
+        raise NotImplementedError
+
+    def ack(self, job: Job) -> None:
+        """Mark a dequeued job as finished so it is never redelivered"""
+        raise NotImplementedError
+
+    def save(self, job: Job) -> None:
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+
+class InMemoryJobQueue(JobQueue):
+    """In-process queue, used for tests and single-process development"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Job] = {}
+        self._ready: List[tuple] = []
+        self._delayed: List[tuple] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+
+    def enqueue(self, job: Job, delay: float = 0.0) -> None:
+        with self._cond:
+            self._jobs[job.id] = job
+            if delay > 0:
+                heapq.heappush(self._delayed, (time.time() + delay, next(self._counter), job.id))
+            else:
+                heapq.heappush(self._ready, (-job.priority, next(self._counter), job.id))
+            self._cond.notify()
+
+    def _promote_delayed(self) -> None:
+        now = time.time()
+        while self._delayed and self._delayed[0][0] <= now:
+            _, _, job_id = heapq.heappop(self._delayed)
+            job = self._jobs[job_id]
+            heapq.heappush(self._ready, (-job.priority, next(self._counter), job_id))
+
+    def dequeue(self, timeout: float = 1.0) -> Optional[Job]:
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                self._promote_delayed()
+                if self._ready:
+                    _, _, job_id = heapq.heappop(self._ready)
+                    return self._jobs[job_id].model_copy()
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return None
+                if self._delayed:
+                    remaining = min(remaining, max(self._delayed[0][0] - time.time(), 0.0))
+                self._cond.wait(remaining)
+
+    def ack(self, job: Job) -> None:
+        # Jobs don't outlive the process, so there is nothing to redeliver
+        pass
+
+    def save(self, job: Job) -> None:
+        with self._cond:
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return job.model_copy() if job else None
+
+
+class RedisJobQueue(JobQueue):
+    """
+    Redis-backed queue
+
+    Ready jobs live in a sorted set scored by (priority, enqueue time).
+    Claiming a job moves the highest-priority, oldest one into a processing
+    set scored by its lease deadline in one script, and ack() removes it. A
+    worker that dies mid-job never acks, so its job is put back on the ready
+    set once the lease expires. Retries wait in a third sorted set scored by
+    their due time.
+    """
+
+    JOB_TTL_SECONDS = 7 * 24 * 3600
+    POLL_INTERVAL_SECONDS = 0.2
+
+    # Pop the best ready job into the processing set with its lease deadline
+    CLAIM_SCRIPT = """
+    local ids = redis.call('ZRANGE', KEYS[1], 0, 0)
+    if #ids == 0 then
+        return false
+    end
+    redis.call('ZREM', KEYS[1], ids[1])
+    redis.call('ZADD', KEYS[2], ARGV[1], ids[1])
+    return ids[1]
+    """
+
+    # Move a job between sorted sets only if it is still in the source
+    MOVE_SCRIPT = """
+    if redis.call('ZREM', KEYS[1], ARGV[1]) == 1 then
+        redis.call('ZADD', KEYS[2], ARGV[2], ARGV[1])
+        return 1
+    end
+    return 0
+    """
+
+    def __init__(
+        self,
+        client,
+        namespace: str = 'svc-ai-document:jobs',
+        visibility_timeout: float = 900.0,
+    ):
+        self.redis = client
+        self.visibility_timeout = visibility_timeout
+        self.ready_key = f"{namespace}:ready"
+        self.delayed_key = f"{namespace}:delayed"
+        self.processing_key = f"{namespace}:processing"
+        self.data_prefix = f"{namespace}:data:"
+        self._claim = client.register_script(self.CLAIM_SCRIPT)
+        self._move = client.register_script(self.MOVE_SCRIPT)
+
+    def _score(self, job: Job) -> float:
+        # Lower scores pop first: priority dominates, then FIFO by enqueue time
+        return (MAX_PRIORITY - job.priority) * 1e13 + time.time() * 1000
+
+    def enqueue(self, job: Job, delay: float = 0.0) -> None:
+        pipe = self.redis.pipeline()
+        pipe.set(self.data_prefix + job.id, job.model_dump_json(), ex=self.JOB_TTL_SECONDS)
+        # A retry re-enqueued by its worker gives up the lease in the same transaction
+        pipe.zrem(self.processing_key, job.id)
+        if delay > 0:
+            pipe.zadd(self.delayed_key, {job.id: time.time() + delay})
+        else:
+            pipe.zadd(self.ready_key, {job.id: self._score(job)})
+        pipe.execute()
+
+    def _promote_delayed(self) -> None:
+        """Move due retries and jobs with expired leases back to the ready set"""
+        now = time.time()
+        for source in (self.delayed_key, self.processing_key):
+            for job_id in self.redis.zrangebyscore(source, '-inf', now, start=0, num=100):
+                job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+                job = self.get(job_id)
+                if job is None:
+                    self.redis.zrem(source, job_id)
+                    continue
+                # The script only moves jobs still in the source set, so
+                # concurrent workers never promote the same job twice
+                moved = self._move(keys=[source, self.ready_key], args=[job_id, self._score(job)])
+                if moved and source == self.processing_key:
+                    logger.warning("job_lease_expired", job_id=job_id, task=job.task, attempts=job.attempts)
+
+    def dequeue(self, timeout: float = 1.0) -> Optional[Job]:
+        deadline = time.time() + timeout
+        while True:
+            self._promote_delayed()
+            job_id = self._claim(
+                keys=[self.ready_key, self.processing_key],
+                args=[time.time() + self.visibility_timeout]
+            )
+            if job_id:
+                job = self.get(job_id.decode() if isinstance(job_id, bytes) else job_id)
+                if job:
+                    return job
+                # The job's data expired; drop the orphaned id
+                self.redis.zrem(self.processing_key, job_id)
+                continue
+            if time.time() >= deadline:
+                return None
+            time.sleep(self.POLL_INTERVAL_SECONDS)
+
+    def ack(self, job: Job) -> None:
+        self.redis.zrem(self.processing_key, job.id)
+
+    def save(self, job: Job) -> None:
+        self.redis.set(self.data_prefix + job.id, job.model_dump_json(), ex=self.JOB_TTL_SECONDS)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raw = self.redis.get(self.data_prefix + job_id)
+        return Job.model_validate_json(raw) if raw else None
+
+
+class DocumentStatusStore:
+    """Reads and writes documents.status transitions"""
+
+    def get_status(self, document_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set_status(self, document_id: str, status: str) -> None:
+        raise NotImplementedError
+
+
+class InMemoryDocumentStatusStore(DocumentStatusStore):
+    def __init__(self):
+        self.statuses: Dict[str, str] = {}
+
+    def get_status(self, document_id: str) -> Optional[str]:
+        return self.statuses.get(document_id)
+
+    def set_status(self, document_id: str, status: str) -> None:
+        if status not in DOCUMENT_STATUSES:
+            raise ValueError(f"Unknown document status: {status}")
+        self.statuses[document_id] = status
+
+
+class PostgresDocumentStatusStore(DocumentStatusStore):
+    def __init__(self, dsn: Optional[str] = None):
+        import psycopg2
+
+        self.dsn = dsn or (
+            f"host={os.getenv('DB_HOST', 'localhost')} "
+            f"port={os.getenv('DB_PORT', '5432')} "
+            f"dbname={os.getenv('DB_NAME', 'acquismart')} "
+            f"user={os.getenv('DB_USER', 'acquismart')} "
+            f"password={os.getenv('DB_PASSWORD', 'changeme')}"
+        )
+        self._psycopg2 = psycopg2
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self._psycopg2.connect(self.dsn)
+            self._conn.autocommit = True
+        return self._conn
+
+    def get_status(self, document_id: str) -> Optional[str]:
+        with self._connection().cursor() as cur:
+            cur.execute("SELECT status::text FROM documents WHERE id = %s", (document_id,))
+            row = cur.fetchone()
+        return row[0] if row else None
+
+    def set_status(self, document_id: str, status: str) -> None:
+        if status not in DOCUMENT_STATUSES:
+            raise ValueError(f"Unknown document status: {status}")
+        with self._connection().cursor() as cur:
+            cur.execute(
+                "UPDATE documents SET status = %s::document_status WHERE id = %s",
+                (status, document_id)
+            )
+
+
+TaskHandler = Callable[[Job], Dict[str, Any]]
+
+
+class JobWorker:
+    """Pulls jobs from a queue, runs the task handler and records the outcome"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, TaskHandler],
+        status_store: Optional[DocumentStatusStore] = None,
+        retry_backoff: float = 2.0,
+        poll_timeout: float = 1.0,
+    ):
+        self.queue = queue
+        self.handlers = handlers
+        self.status_store = status_store
+        self.retry_backoff = retry_backoff
+        self.poll_timeout = poll_timeout
+        self._stop = threading.Event()
+
+    def _set_document_status(self, job: Job, status: str) -> None:
+        if not job.document_id or not self.status_store:
+            return
+        try:
+            self.status_store.set_status(job.document_id, status)
+        except Exception as e:
+            logger.error("document_status_error", job_id=job.id,
+                         document_id=job.document_id, status=status, error=str(e))
+
+    def _get_document_status(self, job: Job) -> Optional[str]:
+        if not job.document_id or not self.status_store:
+            return None
+        try:
+            return self.status_store.get_status(job.document_id)
+        except Exception as e:
+            logger.error("document_status_error", job_id=job.id,
+                         document_id=job.document_id, error=str(e))
+            return None
+
+    def _fail(self, job: Job) -> None:
+        logger.error("job_failed", job_id=job.id, task=job.task,
+                     attempts=job.attempts, error=job.error)
+        self._save(job, 'failed')
+        self._set_document_status(job, 'failed')
+        self.queue.ack(job)
+
+    def _save(self, job: Job, status: str) -> None:
+        job.status = status
+        job.updated_at = datetime.utcnow()
+        self.queue.save(job)
+
+    def process(self, job: Job) -> Job:
+        """Run a single job, scheduling a retry or marking it failed on error"""
+        handler = self.handlers.get(job.task)
+        if job.status == 'running' and job.attempts > job.max_retries:
+            # Redelivered after its worker died on the last allowed attempt
+            job.error = job.error or "Worker stopped while running the job"
+            self._fail(job)
+            return job
+
+        job.attempts += 1
+        if job.document_status is None:
+            job.document_status = self._get_document_status(job)
+        self._save(job, 'running')
+        self._set_document_status(job, 'processing')
+        logger.info("job_started", job_id=job.id, task=job.task, attempt=job.attempts)
+
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown task: {job.task}")
+            job.result = handler(job)
+            job.error = None
+        except Exception as e:
+            job.error = str(e)
+            if handler is not None and job.attempts <= job.max_retries:
+                delay = self.retry_backoff ** job.attempts
+                logger.warning("job_retry", job_id=job.id, task=job.task,
+                               attempt=job.attempts, delay=delay, error=str(e))
+                self._save(job, 'retrying')
+                self.queue.enqueue(job, delay=delay)
+            else:
+                self._fail(job)
+            return job
+
+        self._save(job, 'succeeded')
+        status = TASK_SUCCESS_STATUS.get(job.task)
+        if status is None:
+            # Another job on the same document may have left it 'processing'
+            status = job.document_status if job.document_status not in (None, 'processing') else 'uploaded'
+        self._set_document_status(job, status)
+        self.queue.ack(job)
+        logger.info("job_succeeded", job_id=job.id, task=job.task)
+        return job
+
+    def run_once(self) -> Optional[Job]:
+        job = self.queue.dequeue(timeout=self.poll_timeout)
+        return self.process(job) if job else None
+
+    def run_forever(self) -> None:
+        logger.info("worker_started", tasks=sorted(self.handlers))
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                # Queue backend errors (e.g. Redis restart) must not kill the worker
+                logger.error("worker_error", error=str(e))
+                time.sleep(self.poll_timeout)
+        logger.info("worker_stopped")
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+def create_job_queue() -> JobQueue:
+    """Build the queue backend selected by JOB_QUEUE_BACKEND (redis or memory)"""
+    backend = os.getenv('JOB_QUEUE_BACKEND', 'redis')
+    if backend == 'memory':
+        return InMemoryJobQueue()
+
+    import redis
+
+    client = redis.Redis(
+        host=os.getenv('REDIS_HOST', 'localhost'),
+        port=int(os.getenv('REDIS_PORT', '6379')),
+    )
+    return RedisJobQueue(
+        client,
+        visibility_timeout=float(os.getenv('JOB_VISIBILITY_TIMEOUT_SECONDS', '900'))
+    )
+
+
+def create_status_store() -> Optional[DocumentStatusStore]:
+    """Postgres status store, or in-memory when the queue itself is in-memory"""
+    if os.getenv('JOB_QUEUE_BACKEND', 'redis') == 'memory':
+        return InMemoryDocumentStatusStore()
+    return PostgresDocumentStatusStore()
@@ -1,10 +1,14 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
+import os
+import threading
 import structlog
 from datetime import datetime
 
+from app.jobs import Job, JobWorker, create_job_queue, create_status_store
+
 # Initialize logger
 logger = structlog.get_logger()
 
@@ -65,6 +69,81 @@ class ExtractRequest(BaseModel):
 class ExtractResponse(BaseModel):
     fields: List[ExtractedField]
 
+class JobSubmitRequest(BaseModel):
+    task: str  # classify, ocr, extract, summarize
+    file_id: str
+    document_id: Optional[str] = None
+    payload: Dict[str, Any] = Field(default_factory=dict)
+    priority: int = Field(default=5, ge=0, le=9)
+    max_retries: int = Field(default=3, ge=0)
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+
+# Task implementations shared by the synchronous endpoints and job workers
+def run_classification(file_id: str, s3_path: str) -> ClassifyResponse:
+    # TODO: Implement actual classification logic
+    # For now, return mock response
+    return ClassifyResponse(
+        type="quarterly_financials",
+        confidence=0.92,
+        suggested_parser="financial_parser_v1"
+    )
+
+def run_ocr(file_id: str, pages: Optional[List[int]] = None) -> OCRResponse:
+    # TODO: Implement actual OCR logic
+    return OCRResponse(
+        text="Sample OCR text",
+        tables=[],
+        bboxes=[],
+        confidence_map={}
+    )
+
+def run_extraction(file_id: str, doc_type: str) -> ExtractResponse:
+    # TODO: Implement actual extraction logic
+    return ExtractResponse(fields=[])
+
+def run_summarization(file_id: str, max_length: int = 500) -> Dict[str, Any]:
+    # TODO: Implement summarization logic
+    return {
+        "summary": "Document summary will appear here",
+        "key_metrics": [],
+        "confidence": 0.0
+    }
+
+TASK_HANDLERS = {
+    "classify": lambda job: run_classification(
+        job.file_id, job.payload.get("s3_path", "")).model_dump(),
+    "ocr": lambda job: run_ocr(job.file_id, job.payload.get("pages")).model_dump(),
+    "extract": lambda job: run_extraction(
+        job.file_id, job.payload.get("doc_type", "other")).model_dump(),
+    "summarize": lambda job: run_summarization(
+        job.file_id, job.payload.get("max_length", 500)),
+}
+
+# Job queue; workers normally run as separate processes (python -m app.worker),
+# JOB_WORKERS > 0 additionally starts worker threads inside the API process
+job_queue = create_job_queue()
+job_workers: List[JobWorker] = []
+
+@app.on_event("startup")
+async def start_job_workers():
+    num_workers = int(os.getenv("JOB_WORKERS", "0"))
+    if num_workers <= 0:
+        return
+    status_store = create_status_store()
+    for _ in range(num_workers):
+        worker = JobWorker(job_queue, TASK_HANDLERS, status_store)
+        threading.Thread(target=worker.run_forever, daemon=True).start()
+        job_workers.append(worker)
+    logger.info("job_workers_started", count=num_workers)
+
+@app.on_event("shutdown")
+async def stop_job_workers():
+    for worker in job_workers:
+        worker.stop()
+
 # Health check
 @app.get("/health")
 async def health_check():
@@ -83,13 +162,7 @@ async def classify_document(request: ClassifyRequest):
     try:
         logger.info("classify_document", file_id=request.file_id)
 
-        # TODO: Implement actual classification logic
-        # For now, return mock response
-        return ClassifyResponse(
-            type="quarterly_financials",
-            confidence=0.92,
-            suggested_parser="financial_parser_v1"
-        )
+        return run_classification(request.file_id, request.s3_path)
     except Exception as e:
         logger.error("classification_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
@@ -103,13 +176,7 @@ async def ocr_document(request: OCRRequest):
     try:
         logger.info("ocr_document", file_id=request.file_id, pages=request.pages)
 
-        # TODO: Implement actual OCR logic
-        return OCRResponse(
-            text="Sample OCR text",
-            tables=[],
-            bboxes=[],
-            confidence_map={}
-        )
+        return run_ocr(request.file_id, request.pages)
     except Exception as e:
         logger.error("ocr_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
@@ -123,8 +190,7 @@ async def extract_fields(request: ExtractRequest):
     try:
         logger.info("extract_fields", file_id=request.file_id, doc_type=request.doc_type)
 
-        # TODO: Implement actual extraction logic
-        return ExtractResponse(fields=[])
+        return run_extraction(request.file_id, request.doc_type)
     except Exception as e:
         logger.error("extraction_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
@@ -138,16 +204,39 @@ async def summarize_document(file_id: str, max_length: int = 500):
     try:
         logger.info("summarize_document", file_id=file_id, max_length=max_length)
 
-        # TODO: Implement summarization logic
-        return {
-            "summary": "Document summary will appear here",
-            "key_metrics": [],
-            "confidence": 0.0
-        }
+        return run_summarization(file_id, max_length)
     except Exception as e:
         logger.error("summarization_error", error=str(e))
         raise HTTPException(status_code=500, detail=str(e))
 
+# Async job endpoints
+@app.post("/jobs", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(request: JobSubmitRequest):
+    """
+    Queue a document processing task and return its job ID immediately
+    """
+    if request.task not in TASK_HANDLERS:
+        raise HTTPException(status_code=400, detail=f"Unknown task: {request.task}")
+    try:
+        job = Job(**request.model_dump())
+        job_queue.enqueue(job)
+        logger.info("job_submitted", job_id=job.id, task=job.task,
+                    file_id=job.file_id, priority=job.priority)
+        return JobSubmitResponse(job_id=job.id, status=job.status)
+    except Exception as e:
+        logger.error("job_submit_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """
+    Get the status and result of a queued job
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
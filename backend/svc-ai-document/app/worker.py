@@ -0,0 +1,50 @@
+"""
+Standalone document job worker
+
+Run one or more of these next to the API:
+    python -m app.worker --concurrency 2
+"""
+
+import argparse
+import signal
+import threading
+
+import structlog
+
+from app.jobs import JobWorker, create_job_queue, create_status_store
+from app.main import TASK_HANDLERS
+
+logger = structlog.get_logger()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of worker threads in this process"
+    )
+    args = parser.parse_args()
+
+    queue = create_job_queue()
+    status_store = create_status_store()
+    workers = [JobWorker(queue, TASK_HANDLERS, status_store) for _ in range(args.concurrency)]
+
+    def shutdown(signum, frame):
+        logger.info("worker_shutdown", signal=signum)
+        for worker in workers:
+            worker.stop()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    threads = [threading.Thread(target=worker.run_forever) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,549 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Literal
+from collections import defaultdict
+import json
+import os
+import threading
+import structlog
+from datetime import datetime
+
+from app.match_store import DEFAULT_STORE_DIR, STORE_FILE, MatchStore
+from app.matching import BuyerProfile, MatchWeights, score_buyers
+from app.name_index import NameIndex, NameIndexRefresher, PostgresNameSource, normalize_name
+from app.ner import DEFAULT_MODEL, NerExtractor, PageEntity, PageText
+from app.resolution import ResolutionConfig, resolve
+from app.semantic_search import DEFAULT_INDEX_DIR, INDEX_FILE, ListingEncoder, ListingSearch, SemanticIndex
+
+# Initialize logger
+logger = structlog.get_logger()
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="AcquiSmart AI Entities Service",
+    description="Entity resolution, matching and search over business listings",
+    version="1.0.0"
+)
+
+# CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Request/Response models
+class ListingRecord(BaseModel):
+    id: str
+    source: Optional[str] = None
+    title: Optional[str] = None
+    location: Optional[str] = None
+    asking_price: Optional[float] = None
+    url: Optional[str] = None
+
+class ResolveRequest(BaseModel):
+    listings: List[ListingRecord]
+    config: ResolutionConfig = Field(default_factory=ResolutionConfig)
+
+class DuplicatePair(BaseModel):
+    left_id: str
+    right_id: str
+    score: float
+
+class EntityCluster(BaseModel):
+    entity_id: str
+    listing_ids: List[str]
+    sources: List[str]
+
+class ResolveResponse(BaseModel):
+    clusters: List[EntityCluster]
+    pairs: List[DuplicatePair]
+    stats: Dict[str, float]
+
+class NameMatchRequest(BaseModel):
+    name: str
+    tenant_id: Optional[str] = None
+    kind: Optional[Literal["firm", "company"]] = None
+    top_k: int = Field(default=5, ge=1, le=50)
+    min_score: float = Field(default=0.0, ge=0, le=1)
+
+class NameMatchResult(BaseModel):
+    id: str
+    name: str
+    kind: str
+    score: float
+
+class NameMatchResponse(BaseModel):
+    matches: List[NameMatchResult]
+
+class EntityRefQuery(BaseModel):
+    ref: str
+    name: str
+
+class BatchNameMatchRequest(BaseModel):
+    entity_refs: List[EntityRefQuery]
+    tenant_id: Optional[str] = None
+    kind: Optional[Literal["firm", "company"]] = None
+    top_k: int = Field(default=1, ge=1, le=50)
+    min_score: float = Field(default=0.8, ge=0, le=1)
+
+class EntityRefMatches(BaseModel):
+    ref: str
+    matches: List[NameMatchResult]
+
+class BatchNameMatchResponse(BaseModel):
+    results: List[EntityRefMatches]
+
+class NerRequest(BaseModel):
+    pages: List[PageText]
+    types: Optional[List[Literal["org", "money", "date", "percentage"]]] = None
+
+class NerResponse(BaseModel):
+    entities: List[PageEntity]
+    stats: Dict[str, float]
+
+class SearchListing(BaseModel):
+    id: str
+    name: Optional[str] = None
+    industry: Optional[str] = None
+    description: Optional[str] = None
+    highlights: List[str] = []
+    askingPrice: Optional[float] = None
+    revenue: Optional[float] = None
+
+class IndexListingsRequest(BaseModel):
+    listings: List[SearchListing]
+
+class RemoveListingsRequest(BaseModel):
+    ids: List[str]
+
+class SemanticSearchRequest(BaseModel):
+    q: str
+    minPrice: Optional[float] = None
+    maxPrice: Optional[float] = None
+    minRevenue: Optional[float] = None
+    maxRevenue: Optional[float] = None
+    top_k: int = Field(default=10, ge=1, le=100)
+
+class SearchHitResult(BaseModel):
+    id: str
+    score: float
+    askingPrice: Optional[float] = None
+    revenue: Optional[float] = None
+
+class SemanticSearchResponse(BaseModel):
+    results: List[SearchHitResult]
+    total_indexed: int
+
+class MatchListing(BaseModel):
+    id: str
+    industry: Optional[str] = None
+    location: Optional[str] = None
+    askingPrice: Optional[float] = None
+    revenue: Optional[float] = None
+    ebitda: Optional[float] = None
+
+class BuyerMatchRequest(BaseModel):
+    buyers: List[BuyerProfile]
+    listings: List[MatchListing]
+    top_k: int = Field(default=20, ge=1, le=500)
+    weights: MatchWeights = Field(default_factory=MatchWeights)
+
+class ListingMatch(BaseModel):
+    listing_id: str
+    matchScore: float
+
+class BuyerMatches(BaseModel):
+    buyer_id: str
+    matches: List[ListingMatch]
+
+class BuyerMatchResponse(BaseModel):
+    results: List[BuyerMatches]
+
+class RebuildMatchesRequest(BaseModel):
+    buyers: List[BuyerProfile]
+    listings: List[MatchListing]
+
+class MatchListingsRequest(BaseModel):
+    listings: List[MatchListing]
+
+
+# Firm/company name index, loaded from Postgres at startup and refreshed
+# in the background from rows whose updated_at changed
+name_index = NameIndex()
+name_index_refresher: Optional[NameIndexRefresher] = None
+
+
+@app.on_event("startup")
+async def load_name_index():
+    global name_index_refresher
+    if os.getenv("NAME_INDEX_ENABLED", "true").lower() != "true":
+        return
+    try:
+        name_index_refresher = NameIndexRefresher(
+            name_index,
+            PostgresNameSource(),
+            interval_seconds=float(os.getenv("NAME_INDEX_REFRESH_SECONDS", "60"))
+        )
+        name_index_refresher.load()
+    except Exception as e:
+        # Serve the other endpoints anyway; the refresher retries the load
+        logger.error("name_index_load_error", error=str(e))
+    if name_index_refresher is not None:
+        threading.Thread(target=name_index_refresher.run_forever, daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def stop_name_index_refresher():
+    if name_index_refresher is not None:
+        name_index_refresher.stop()
+
+
+# spaCy NER, loaded once per worker process at startup
+ner_extractor: Optional[NerExtractor] = None
+
+
+@app.on_event("startup")
+async def load_ner():
+    global ner_extractor
+    if os.getenv("NER_ENABLED", "true").lower() != "true":
+        return
+    try:
+        ner_extractor = NerExtractor(
+            model=DEFAULT_MODEL,
+            workers=int(os.getenv("NER_WORKERS", str(os.cpu_count() or 1))),
+            batch_size=int(os.getenv("NER_BATCH_SIZE", "64")),
+            chunk_size=int(os.getenv("NER_CHUNK_SIZE", "256"))
+        )
+    except Exception as e:
+        logger.error("ner_load_error", error=str(e))
+
+
+@app.on_event("shutdown")
+async def stop_ner():
+    if ner_extractor is not None:
+        ner_extractor.close()
+
+
+# Semantic listing search; the FAISS index is mmapped from SEARCH_INDEX_DIR
+# and seeded from SEARCH_SEED_FILE the first time it is built
+listing_search: Optional[ListingSearch] = None
+
+
+@app.on_event("startup")
+async def load_listing_search():
+    global listing_search
+    if os.getenv("SEARCH_ENABLED", "true").lower() != "true":
+        return
+    try:
+        encoder = ListingEncoder(batch_size=int(os.getenv("EMBEDDING_BATCH_SIZE", "64")))
+        if os.path.exists(os.path.join(DEFAULT_INDEX_DIR, INDEX_FILE)):
+            listing_search = ListingSearch(encoder, SemanticIndex.load(DEFAULT_INDEX_DIR))
+            return
+        listing_search = ListingSearch(encoder)
+        seed_file = os.getenv("SEARCH_SEED_FILE")
+        if seed_file and os.path.exists(seed_file):
+            with open(seed_file) as f:
+                listing_search.upsert(json.load(f))
+            listing_search.index.save(DEFAULT_INDEX_DIR)
+    except Exception as e:
+        logger.error("search_load_error", error=str(e))
+
+
+# Health check
+@app.get("/health")
+async def health_check():
+    return {
+        "status": "healthy",
+        "service": "svc-ai-entities",
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# Cross-source dedup / entity resolution endpoint
+@app.post("/resolve", response_model=ResolveResponse)
+def resolve_listings(request: ResolveRequest):
+    """
+    Group listings of the same business across sources; only clusters with
+    more than one listing are returned
+    """
+    try:
+        listings = request.listings
+        logger.info("resolve_listings", count=len(listings))
+        result = resolve(
+            [listing.title for listing in listings],
+            [listing.location for listing in listings],
+            [listing.asking_price for listing in listings],
+            sources=[listing.source for listing in listings],
+            config=request.config
+        )
+
+        members = defaultdict(list)
+        for index, label in enumerate(result.labels):
+            members[label].append(listings[index])
+        clusters = [
+            EntityCluster(
+                # The first listing seen stands in as the entity's id
+                entity_id=group[0].id,
+                listing_ids=[listing.id for listing in group],
+                sources=sorted({listing.source for listing in group if listing.source})
+            )
+            for group in members.values() if len(group) > 1
+        ]
+        pairs = [
+            DuplicatePair(left_id=listings[i].id, right_id=listings[j].id, score=score)
+            for i, j, score in result.pairs
+        ]
+        return ResolveResponse(clusters=clusters, pairs=pairs, stats=result.stats)
+    except Exception as e:
+        logger.error("resolution_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Name matching endpoints
+@app.post("/match", response_model=NameMatchResponse)
+def match_name(request: NameMatchRequest):
+    """
+    Top-k fuzzy matches for a firm or company name from the in-memory index
+    """
+    matches = name_index.search(
+        request.name,
+        top_k=request.top_k,
+        tenant_id=request.tenant_id,
+        kind=request.kind,
+        min_score=request.min_score
+    )
+    return NameMatchResponse(matches=[NameMatchResult(**match._asdict()) for match in matches])
+
+
+@app.post("/match/batch", response_model=BatchNameMatchResponse)
+def match_names_batch(request: BatchNameMatchRequest):
+    """
+    Map many extracted entity_refs to firms/companies in one call
+    """
+    try:
+        logger.info("match_names_batch", count=len(request.entity_refs))
+        # Extracted refs repeat a lot across pages; search each distinct name once
+        cache: Dict[str, List[NameMatchResult]] = {}
+        results = []
+        for query in request.entity_refs:
+            key = normalize_name(query.name)
+            if key not in cache:
+                cache[key] = [
+                    NameMatchResult(**match._asdict())
+                    for match in name_index.search(
+                        query.name,
+                        top_k=request.top_k,
+                        tenant_id=request.tenant_id,
+                        kind=request.kind,
+                        min_score=request.min_score
+                    )
+                ]
+            results.append(EntityRefMatches(ref=query.ref, matches=cache[key]))
+        return BatchNameMatchResponse(results=results)
+    except Exception as e:
+        logger.error("match_batch_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Named-entity extraction endpoint
+@app.post("/ner", response_model=NerResponse)
+def extract_entities(request: NerRequest):
+    """
+    Org, money, date and percentage entities for document pages, with page
+    number and the bbox of the OCR words each entity covers
+    """
+    if ner_extractor is None:
+        raise HTTPException(status_code=503, detail="NER model not loaded")
+    try:
+        logger.info("extract_entities", pages=len(request.pages))
+        entities, stats = ner_extractor.extract(request.pages, types=request.types)
+        return NerResponse(entities=entities, stats=stats)
+    except Exception as e:
+        logger.error("ner_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Persisted per-buyer matches, maintained incrementally
+match_store = MatchStore()
+
+
+@app.on_event("startup")
+async def load_match_store():
+    global match_store
+    if not os.path.exists(os.path.join(DEFAULT_STORE_DIR, STORE_FILE)):
+        return
+    try:
+        match_store = MatchStore.load(DEFAULT_STORE_DIR)
+    except Exception as e:
+        logger.error("match_store_load_error", error=str(e))
+
+
+# Semantic search endpoints
+@app.post("/search", response_model=SemanticSearchResponse)
+def search_listings(request: SemanticSearchRequest):
+    """
+    Listings closest in meaning to q, restricted to the askingPrice/revenue ranges
+    """
+    if listing_search is None:
+        raise HTTPException(status_code=503, detail="Search index not loaded")
+    try:
+        hits = listing_search.search(
+            [request.q],
+            top_k=request.top_k,
+            min_price=request.minPrice,
+            max_price=request.maxPrice,
+            min_revenue=request.minRevenue,
+            max_revenue=request.maxRevenue
+        )[0]
+        return SemanticSearchResponse(
+            results=[
+                SearchHitResult(id=hit.id, score=hit.score, askingPrice=hit.asking_price, revenue=hit.revenue)
+                for hit in hits
+            ],
+            total_indexed=len(listing_search.index)
+        )
+    except Exception as e:
+        logger.error("search_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/search/listings")
+def index_listings(request: IndexListingsRequest):
+    """
+    Embed and add listings, replacing any already indexed under the same id
+    """
+    if listing_search is None:
+        raise HTTPException(status_code=503, detail="Search index not loaded")
+    try:
+        indexed = listing_search.upsert([listing.model_dump() for listing in request.listings])
+        listing_search.index.save(DEFAULT_INDEX_DIR)
+        return {"indexed": indexed, "total_indexed": len(listing_search.index)}
+    except Exception as e:
+        logger.error("search_index_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/search/listings/remove")
+def remove_listings(request: RemoveListingsRequest):
+    if listing_search is None:
+        raise HTTPException(status_code=503, detail="Search index not loaded")
+    try:
+        removed = listing_search.index.remove(request.ids)
+        listing_search.index.save(DEFAULT_INDEX_DIR)
+        return {"removed": removed, "total_indexed": len(listing_search.index)}
+    except Exception as e:
+        logger.error("search_remove_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Buyer-to-listing match scoring
+@app.post("/matches/score", response_model=BuyerMatchResponse)
+def score_matches(request: BuyerMatchRequest):
+    """
+    Top-k listings per buyer, scored 0-100 from industry, location, price
+    range and EBITDA margin
+    """
+    try:
+        buyers = [buyer for buyer in request.buyers if buyer.userType != "sell"]
+        listings = request.listings
+        logger.info("score_matches", buyers=len(buyers), listings=len(listings))
+        scores, indices = score_buyers(
+            buyers,
+            [listing.industry for listing in listings],
+            [listing.location for listing in listings],
+            [listing.askingPrice for listing in listings],
+            [listing.revenue for listing in listings],
+            [listing.ebitda for listing in listings],
+            k=request.top_k,
+            weights=request.weights
+        )
+        results = [
+            BuyerMatches(
+                buyer_id=buyer.id,
+                matches=[
+                    ListingMatch(listing_id=listings[index].id, matchScore=round(float(score), 1))
+                    for score, index in zip(scores[row], indices[row]) if index >= 0
+                ]
+            )
+            for row, buyer in enumerate(buyers)
+        ]
+        return BuyerMatchResponse(results=results)
+    except Exception as e:
+        logger.error("match_scoring_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/matches/rebuild")
+def rebuild_matches(request: RebuildMatchesRequest):
+    """
+    Full rescore that replaces the stored per-buyer matches, e.g. nightly
+    """
+    try:
+        buyers = [buyer for buyer in request.buyers if buyer.userType != "sell"]
+        match_store.rebuild(buyers, [listing.model_dump() for listing in request.listings])
+        match_store.save(DEFAULT_STORE_DIR)
+        return {"buyers": len(match_store.buyers), "listings": len(match_store.listing_ids)}
+    except Exception as e:
+        logger.error("match_rebuild_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/matches/listings")
+def upsert_match_listings(request: MatchListingsRequest):
+    """
+    Score new or changed listings against all buyers and merge them into
+    the stored matches
+    """
+    try:
+        result = match_store.upsert_listings([listing.model_dump() for listing in request.listings])
+        match_store.save(DEFAULT_STORE_DIR)
+        return result
+    except Exception as e:
+        logger.error("match_listings_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/matches/listings/remove")
+def remove_match_listings(request: RemoveListingsRequest):
+    try:
+        result = match_store.remove_listings(request.ids)
+        match_store.save(DEFAULT_STORE_DIR)
+        return result
+    except Exception as e:
+        logger.error("match_remove_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/matches/buyers")
+def upsert_match_buyer(buyer: BuyerProfile):
+    """
+    Rescore one new or changed buyer against all listings
+    """
+    if buyer.userType == "sell":
+        raise HTTPException(status_code=400, detail="Only buyers are matched")
+    try:
+        match_store.upsert_buyer(buyer)
+        match_store.save(DEFAULT_STORE_DIR)
+        return {"buyer_id": buyer.id}
+    except Exception as e:
+        logger.error("match_buyer_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/matches/{buyer_id}", response_model=BuyerMatches)
+def get_matches(buyer_id: str, top_k: Optional[int] = None):
+    matches = match_store.matches(buyer_id, top_k)
+    if matches is None:
+        raise HTTPException(status_code=404, detail="Buyer not found")
+    return BuyerMatches(
+        buyer_id=buyer_id,
+        matches=[ListingMatch(listing_id=listing_id, matchScore=round(score, 1)) for listing_id, score in matches]
+    )
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8002)
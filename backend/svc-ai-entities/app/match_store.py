@@ -0,0 +1,269 @@
+"""
+Persisted per-buyer match lists with incremental maintenance
+
+The store keeps every buyer's best k + slack listings. A new, repriced or
+removed listing is scored against all buyers on its own and merged into the
+stored lists, and a changed buyer is rescored against all listings, so a
+change reaches recommendations without a full rescore.
+
+Dropping a listing from a buyer's list leaves the entries after it possibly
+incomplete, so each buyer tracks how many leading entries are still exact.
+The slack absorbs those drops; once fewer than k exact entries remain, that
+buyer alone is rescored.
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from app.matching import (
+    BuyerProfile, ListingFeatures, MatchWeights, Vocabulary,
+    encode_listings, merge_top_k, score_profiles, sort_top_k,
+)
+
+logger = structlog.get_logger()
+
+DEFAULT_STORE_DIR = os.getenv('MATCH_STORE_DIR', 'data/match_store')
+STORE_FILE = 'matches.npz'
+
+CODE_BLOCKS = ('industry', 'city', 'state', 'price')
+
+
+class MatchStore:
+    def __init__(self, k: int = 20, slack: int = 20, weights: Optional[MatchWeights] = None):
+        self.k = k
+        self.slack = slack
+        self.weights = weights or MatchWeights()
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.vocab = Vocabulary()
+        self.listing_ids: List[str] = []
+        self.listing_row: Dict[str, int] = {}
+        self.codes = {name: np.zeros(0, dtype=np.int64) for name in CODE_BLOCKS}
+        self.bias = np.zeros(0, dtype=np.float32)
+
+        self.buyers: List[BuyerProfile] = []
+        self.buyer_row: Dict[str, int] = {}
+        self.scores = np.zeros((0, self.depth_limit), dtype=np.float32)
+        self.indices = np.zeros((0, self.depth_limit), dtype=np.int64)
+        # Leading entries per buyer known to be exact
+        self.exact = np.zeros(0, dtype=np.int64)
+
+    @property
+    def depth_limit(self) -> int:
+        return self.k + self.slack
+
+    @property
+    def alive_listings(self) -> int:
+        return int(np.isfinite(self.bias).sum())
+
+    def _features(self, rows: Optional[np.ndarray] = None) -> ListingFeatures:
+        if rows is None:
+            return ListingFeatures(codes=self.codes, bias=self.bias)
+        return ListingFeatures(
+            codes={name: codes[rows] for name, codes in self.codes.items()},
+            bias=self.bias[rows]
+        )
+
+    def _score(self, buyers: Sequence[BuyerProfile], rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top depth_limit of buyers against all listings, or only listings[rows]"""
+        scores, indices = score_profiles(buyers, self.vocab, self._features(rows), self.weights, self.depth_limit)
+        if rows is not None:
+            indices = np.where(indices >= 0, rows[np.maximum(indices, 0)], -1)
+        if scores.shape[1] < self.depth_limit:
+            pad = self.depth_limit - scores.shape[1]
+            scores = np.pad(scores, ((0, 0), (0, pad)), constant_values=-np.inf)
+            indices = np.pad(indices, ((0, 0), (0, pad)), constant_values=-1)
+        return scores, indices
+
+    def _write_listings(self, listings: Sequence[Dict]) -> np.ndarray:
+        """Encode listings into their rows, appending new ids; returns the rows"""
+        delta = encode_listings(
+            self.vocab,
+            [listing.get('industry') for listing in listings],
+            [listing.get('location') for listing in listings],
+            [listing.get('askingPrice') for listing in listings],
+            [listing.get('revenue') for listing in listings],
+            [listing.get('ebitda') for listing in listings],
+            self.weights
+        )
+        rows = np.empty(len(listings), dtype=np.int64)
+        start = len(self.listing_ids)
+        for i, listing in enumerate(listings):
+            listing_id = str(listing['id'])
+            if listing_id not in self.listing_row:
+                self.listing_row[listing_id] = len(self.listing_ids)
+                self.listing_ids.append(listing_id)
+            rows[i] = self.listing_row[listing_id]
+        appended = len(self.listing_ids) - start
+        if appended:
+            for name in CODE_BLOCKS:
+                self.codes[name] = np.concatenate([self.codes[name], np.full(appended, -1, dtype=np.int64)])
+            self.bias = np.concatenate([self.bias, np.full(appended, -np.inf, dtype=np.float32)])
+        # A listing repeated within one batch keeps its last version
+        for name in CODE_BLOCKS:
+            self.codes[name][rows] = delta.codes[name]
+        self.bias[rows] = delta.bias
+        return rows
+
+    def _drop(self, rows: np.ndarray) -> None:
+        """Remove listings[rows] from every stored list"""
+        hit = np.isin(self.indices, rows)
+        if not hit.any():
+            return
+        # The exact prefix minus dropped entries is still the exact ranking
+        # of the remaining listings; past it nothing is known
+        in_prefix = hit & (np.arange(self.depth_limit) < self.exact[:, None])
+        self.exact = self.exact - in_prefix.sum(axis=1)
+        self.scores[hit] = -np.inf
+        self.indices[hit] = -1
+        self.scores, self.indices = sort_top_k(self.scores, self.indices)
+
+    def _refill(self) -> int:
+        """Rescore buyers whose exact prefix fell below k"""
+        needed = min(self.k, self.alive_listings)
+        rows = np.flatnonzero(self.exact < needed)
+        if len(rows):
+            self.scores[rows], self.indices[rows] = self._score([self.buyers[row] for row in rows])
+            self.exact[rows] = self.depth_limit
+        return len(rows)
+
+    def rebuild(self, buyers: Sequence[BuyerProfile], listings: Sequence[Dict]) -> None:
+        """Full rescore of every buyer against every listing"""
+        with self._lock:
+            start = time.perf_counter()
+            self._reset()
+            self._write_listings(listings)
+            self.buyers = list(buyers)
+            self.buyer_row = {buyer.id: row for row, buyer in enumerate(self.buyers)}
+            self.scores, self.indices = self._score(self.buyers)
+            self.exact = np.full(len(self.buyers), self.depth_limit, dtype=np.int64)
+            logger.info(
+                "match_store_rebuilt",
+                buyers=len(self.buyers),
+                listings=len(self.listing_ids),
+                seconds=time.perf_counter() - start
+            )
+
+    def upsert_listings(self, listings: Sequence[Dict]) -> Dict[str, int]:
+        """Score new or changed listings against all buyers and merge them in"""
+        with self._lock:
+            start = time.perf_counter()
+            rows = np.unique(self._write_listings(listings))
+            self._drop(rows)
+            if self.buyers:
+                delta_scores, delta_indices = self._score(self.buyers, rows)
+                merged = merge_top_k(self.scores, self.indices, delta_scores, delta_indices, self.depth_limit)
+                self.scores, self.indices = sort_top_k(*merged)
+            refilled = self._refill()
+            logger.info(
+                "match_store_listings_upserted",
+                listings=len(rows),
+                refilled=refilled,
+                seconds=time.perf_counter() - start
+            )
+            return {'listings': len(rows), 'refilled_buyers': refilled}
+
+    def remove_listings(self, listing_ids: Sequence[str]) -> Dict[str, int]:
+        with self._lock:
+            rows = np.array(
+                [self.listing_row[listing_id] for listing_id in listing_ids if listing_id in self.listing_row],
+                dtype=np.int64
+            )
+            if len(rows) == 0:
+                return {'listings': 0, 'refilled_buyers': 0}
+            # The row stays reserved for the id; it just never scores again
+            for name in CODE_BLOCKS:
+                self.codes[name][rows] = -1
+            self.bias[rows] = -np.inf
+            self._drop(rows)
+            refilled = self._refill()
+            logger.info("match_store_listings_removed", listings=len(rows), refilled=refilled)
+            return {'listings': len(rows), 'refilled_buyers': refilled}
+
+    def upsert_buyer(self, buyer: BuyerProfile) -> None:
+        """Rescore one new or changed buyer against all listings"""
+        with self._lock:
+            scores, indices = self._score([buyer])
+            row = self.buyer_row.get(buyer.id)
+            if row is None:
+                row = len(self.buyers)
+                self.buyers.append(buyer)
+                self.buyer_row[buyer.id] = row
+                self.scores = np.concatenate([self.scores, scores])
+                self.indices = np.concatenate([self.indices, indices])
+                self.exact = np.append(self.exact, self.depth_limit)
+            else:
+                self.buyers[row] = buyer
+                self.scores[row], self.indices[row] = scores[0], indices[0]
+                self.exact[row] = self.depth_limit
+
+    def matches(self, buyer_id: str, top_k: Optional[int] = None) -> Optional[List[Tuple[str, float]]]:
+        """(listing id, score) best first, or None for an unknown buyer"""
+        with self._lock:
+            row = self.buyer_row.get(buyer_id)
+            if row is None:
+                return None
+            top_k = min(top_k or self.k, self.exact[row])
+            return [
+                (self.listing_ids[index], float(score))
+                for score, index in zip(self.scores[row, :top_k], self.indices[row, :top_k])
+                if index >= 0
+            ]
+
+    def save(self, directory: str = DEFAULT_STORE_DIR) -> None:
+        """Write the store to one file, replaced atomically"""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            state = {
+                'k': self.k,
+                'slack': self.slack,
+                'weights': self.weights.model_dump(),
+                'vocab': {
+                    'industries': self.vocab.industries,
+                    'cities': self.vocab.cities,
+                    'states': self.vocab.states,
+                },
+                'listing_ids': self.listing_ids,
+                'buyers': [buyer.model_dump() for buyer in self.buyers],
+            }
+            tmp_path = os.path.join(directory, STORE_FILE + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.savez(
+                    f,
+                    state=np.asarray(json.dumps(state)),
+                    bias=self.bias,
+                    scores=self.scores,
+                    indices=self.indices,
+                    exact=self.exact,
+                    **{f'codes_{name}': codes for name, codes in self.codes.items()}
+                )
+            os.replace(tmp_path, os.path.join(directory, STORE_FILE))
+        logger.info("match_store_saved", directory=directory, buyers=len(self.buyers), listings=len(self.listing_ids))
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_STORE_DIR) -> 'MatchStore':
+        with np.load(os.path.join(directory, STORE_FILE)) as data:
+            state = json.loads(str(data['state']))
+            store = cls(state['k'], state['slack'], MatchWeights(**state['weights']))
+            store.bias = data['bias']
+            store.scores = data['scores']
+            store.indices = data['indices']
+            store.exact = data['exact']
+            store.codes = {name: data[f'codes_{name}'] for name in CODE_BLOCKS}
+        store.vocab.industries = state['vocab']['industries']
+        store.vocab.cities = state['vocab']['cities']
+        store.vocab.states = state['vocab']['states']
+        store.listing_ids = state['listing_ids']
+        store.listing_row = {listing_id: row for row, listing_id in enumerate(store.listing_ids)}
+        store.buyers = [BuyerProfile(**buyer) for buyer in state['buyers']]
+        store.buyer_row = {buyer.id: row for row, buyer in enumerate(store.buyers)}
+        logger.info("match_store_loaded", directory=directory, buyers=len(store.buyers), listings=len(store.listing_ids))
+        return store
@@ -0,0 +1,329 @@
+"""
+Buyer-to-listing match scoring
+
+Buyer profiles (the OnboardingQuestionnaire answers plus an optional price
+range) and listings are encoded into feature matrices over the same one-hot
+blocks: industry, city, state and asking-price band. Every buyer-side block
+carries that criterion's weight, so a buyer's score for a listing is a dot
+product plus a listing-only bias, and scoring a whole batch is one matrix
+product. Buyers with identical profiles share one row, and a running top-k
+is kept per profile while listings stream through in chunks.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+import structlog
+from pydantic import BaseModel
+
+logger = structlog.get_logger()
+
+# Asking-price band edges; band i covers [edges[i-1], edges[i])
+PRICE_BAND_EDGES = np.array([
+    250_000, 500_000, 1_000_000, 2_000_000, 5_000_000, 10_000_000, 25_000_000, 50_000_000, 100_000_000
+], dtype=np.float64)
+NUM_PRICE_BANDS = len(PRICE_BAND_EDGES) + 1
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class MatchWeights(BaseModel):
+    """Points per criterion; a perfect match on every criterion scores 100"""
+    industry: float = 40.0
+    city: float = 15.0
+    state: float = 10.0
+    price: float = 20.0
+    margin: float = 15.0
+    # Share of a criterion's points given when the buyer left it unanswered
+    unspecified: float = 0.5
+
+
+class BuyerProfile(BaseModel):
+    """OnboardingQuestionnaire answers; only 'buy' users are matched"""
+    id: str
+    userType: Optional[str] = 'buy'
+    industry: Optional[str] = None
+    location: Optional[str] = None
+    minPrice: Optional[float] = None
+    maxPrice: Optional[float] = None
+
+
+@lru_cache(maxsize=65536)
+def split_location(location: Optional[str]) -> Tuple[str, str]:
+    """'Austin, TX' -> ('austin, tx', 'tx'); unknown parts are ''"""
+    if not location:
+        return '', ''
+    text = _WHITESPACE_RE.sub(' ', location.strip().lower())
+    parts = [part.strip() for part in text.split(',')]
+    state = parts[-1] if len(parts) > 1 else ''
+    return text, state
+
+
+def price_bands(prices: Sequence[Optional[float]]) -> np.ndarray:
+    """Band index per price, -1 when missing"""
+    values = np.asarray(prices, dtype=np.float64)
+    bands = np.searchsorted(PRICE_BAND_EDGES, values, side='right')
+    bands[np.isnan(values)] = -1
+    return bands
+
+
+class Vocabulary:
+    """Category -> column mapping for the one-hot blocks"""
+
+    def __init__(self):
+        self.industries: Dict[str, int] = {}
+        self.cities: Dict[str, int] = {}
+        self.states: Dict[str, int] = {}
+
+    @staticmethod
+    def _codes(mapping: Dict[str, int], values: Sequence[str], grow: bool) -> np.ndarray:
+        codes = np.full(len(values), -1, dtype=np.int64)
+        for i, value in enumerate(values):
+            if not value:
+                continue
+            if value not in mapping and grow:
+                mapping[value] = len(mapping)
+            codes[i] = mapping.get(value, -1)
+        return codes
+
+    def offsets(self) -> Tuple[int, int, int, int, int]:
+        """Start column of each block and the total width"""
+        industry = 0
+        city = industry + len(self.industries)
+        state = city + len(self.cities)
+        price = state + len(self.states)
+        return industry, city, state, price, price + NUM_PRICE_BANDS
+
+
+class ListingFeatures(NamedTuple):
+    codes: Dict[str, np.ndarray]
+    bias: np.ndarray
+
+
+def encode_listings(
+    vocab: Vocabulary,
+    industries: Sequence[Optional[str]],
+    locations: Sequence[Optional[str]],
+    asking_prices: Sequence[Optional[float]],
+    revenues: Sequence[Optional[float]],
+    ebitdas: Sequence[Optional[float]],
+    weights: MatchWeights
+) -> ListingFeatures:
+    """Category codes per listing plus the listing-only part of the score"""
+    split = [split_location(location) for location in locations]
+    codes = {
+        'industry': Vocabulary._codes(vocab.industries, [(value or '').strip().lower() for value in industries], True),
+        'city': Vocabulary._codes(vocab.cities, [city for city, _ in split], True),
+        'state': Vocabulary._codes(vocab.states, [state for _, state in split], True),
+        'price': price_bands(asking_prices),
+    }
+    revenue = np.asarray(revenues, dtype=np.float64)
+    ebitda = np.asarray(ebitdas, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        margin = np.where(revenue > 0, ebitda / revenue, np.nan)
+    # 30%+ EBITDA margin earns the full margin points; unknown margins earn none
+    bias = weights.margin * np.clip(np.nan_to_num(margin, nan=0.0) / 0.3, 0.0, 1.0)
+    return ListingFeatures(codes=codes, bias=bias.astype(np.float32))
+
+
+def listing_matrix(vocab: Vocabulary, features: ListingFeatures, start: int = 0, stop: Optional[int] = None) -> sp.csr_matrix:
+    """Sparse one-hot rows for listings[start:stop], at most one entry per block"""
+    industry, city, state, price, width = vocab.offsets()
+    stop = len(features.bias) if stop is None else stop
+    rows, cols = [], []
+    for offset, name in ((industry, 'industry'), (city, 'city'), (state, 'state'), (price, 'price')):
+        codes = features.codes[name][start:stop]
+        present = np.flatnonzero(codes >= 0)
+        rows.append(present)
+        cols.append(offset + codes[present])
+    rows = np.concatenate(rows)
+    return sp.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, np.concatenate(cols))),
+        shape=(stop - start, width)
+    )
+
+
+def buyer_matrix(vocab: Vocabulary, buyers: Sequence[BuyerProfile], weights: MatchWeights) -> np.ndarray:
+    """
+    Weighted rows per buyer; an unanswered criterion spreads a reduced
+    weight over the whole block so it neither helps nor hurts ranking
+    """
+    industry, city, state, price, width = vocab.offsets()
+    matrix = np.zeros((len(buyers), width), dtype=np.float32)
+    partial = weights.unspecified
+
+    for row, buyer in enumerate(buyers):
+        buyer_industry = (buyer.industry or '').strip().lower()
+        if buyer_industry and buyer_industry != 'other':
+            column = vocab.industries.get(buyer_industry)
+            if column is not None:
+                matrix[row, industry + column] = weights.industry
+        else:
+            matrix[row, industry:city] = weights.industry * partial
+
+        buyer_city, buyer_state = split_location(buyer.location)
+        if buyer_city:
+            column = vocab.cities.get(buyer_city)
+            if column is not None:
+                matrix[row, city + column] = weights.city
+            column = vocab.states.get(buyer_state)
+            if column is not None:
+                matrix[row, state + column] = weights.state
+        else:
+            matrix[row, city:state] = weights.city * partial
+            matrix[row, state:price] = weights.state * partial
+
+        if buyer.minPrice is None and buyer.maxPrice is None:
+            matrix[row, price:width] = weights.price * partial
+        else:
+            low = 0 if buyer.minPrice is None else int(price_bands([buyer.minPrice])[0])
+            high = NUM_PRICE_BANDS - 1 if buyer.maxPrice is None else int(price_bands([buyer.maxPrice])[0])
+            matrix[row, price + low:price + high + 1] = weights.price
+    return matrix
+
+
+def merge_top_k(
+    scores: np.ndarray,
+    indices: np.ndarray,
+    new_scores: np.ndarray,
+    new_indices: np.ndarray,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise k best of two (score, index) sets"""
+    all_scores = np.concatenate([scores, new_scores], axis=1)
+    all_indices = np.concatenate([indices, new_indices], axis=1)
+    if all_scores.shape[1] > k:
+        keep = np.argpartition(-all_scores, k - 1, axis=1)[:, :k]
+        all_scores = np.take_along_axis(all_scores, keep, axis=1)
+        all_indices = np.take_along_axis(all_indices, keep, axis=1)
+    return all_scores, all_indices
+
+
+def _tile_candidates(
+    scores: np.ndarray,
+    floor: np.ndarray,
+    k: int,
+    offset: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-row (score, index) candidates from one tile that could enter the
+    running top-k; most entries fall below the row's current k-th best, so
+    only the survivors are gathered instead of partitioning the whole tile
+    """
+    rows, cols = np.nonzero(scores > floor[:, None])
+    counts = np.bincount(rows, minlength=len(scores))
+    width = int(counts.max()) if len(rows) else 0
+    if width > 4 * k:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        return np.take_along_axis(scores, top, axis=1), top + offset
+    positions = np.arange(len(rows)) - np.repeat(np.cumsum(counts) - counts, counts)
+    candidate_scores = np.full((len(scores), width), -np.inf, dtype=np.float32)
+    candidate_indices = np.full((len(scores), width), -1, dtype=np.int64)
+    candidate_scores[rows, positions] = scores[rows, cols]
+    candidate_indices[rows, positions] = cols + offset
+    return candidate_scores, candidate_indices
+
+
+def top_k_matches(
+    buyers: np.ndarray,
+    vocab: Vocabulary,
+    listings: ListingFeatures,
+    k: int = 20,
+    buyer_block: int = 256,
+    listing_block: int = 65_536
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Best k listings per buyer row, sorted by descending score
+
+    Scores are computed one (buyer_block x listing_block) tile at a time as a
+    sparse listing matrix times the dense buyer block, so memory stays at
+    ~buyer_block * listing_block * 4 bytes; each tile is merged into the
+    running top-k per buyer before the next one is scored.
+    """
+    num_buyers, num_listings = len(buyers), len(listings.bias)
+    k = min(k, num_listings)
+    best_scores = np.full((num_buyers, k), -np.inf, dtype=np.float32)
+    best_indices = np.full((num_buyers, k), -1, dtype=np.int64)
+    if k == 0:
+        return best_scores, best_indices
+
+    for listing_start in range(0, num_listings, listing_block):
+        listing_stop = min(listing_start + listing_block, num_listings)
+        tile_listings = listing_matrix(vocab, listings, listing_start, listing_stop)
+        tile_bias = listings.bias[listing_start:listing_stop]
+        tile_k = min(k, listing_stop - listing_start)
+        for buyer_start in range(0, num_buyers, buyer_block):
+            buyer_stop = min(buyer_start + buyer_block, num_buyers)
+            block = slice(buyer_start, buyer_stop)
+            scores = np.asarray((tile_listings @ buyers[block].T).T)
+            scores += tile_bias
+            candidate_scores, candidate_indices = _tile_candidates(
+                scores, best_scores[block].min(axis=1), tile_k, listing_start
+            )
+            if candidate_scores.shape[1] == 0:
+                continue
+            best_scores[block], best_indices[block] = merge_top_k(
+                best_scores[block], best_indices[block], candidate_scores, candidate_indices, k
+            )
+
+    return sort_top_k(best_scores, best_indices)
+
+
+def sort_top_k(scores: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Order rows by score desc, then listing index asc; empty slots get index -1"""
+    indices = np.where(np.isfinite(scores), indices, -1)
+    order = np.lexsort((indices, -scores), axis=1)
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(indices, order, axis=1)
+
+
+def unique_profiles(buyers: Sequence[BuyerProfile]) -> Tuple[List[BuyerProfile], np.ndarray]:
+    """Distinct answer sets and, per buyer, the index of its profile"""
+    profile_of: Dict[Tuple, int] = {}
+    profiles: List[BuyerProfile] = []
+    inverse = np.empty(len(buyers), dtype=np.int64)
+    for row, buyer in enumerate(buyers):
+        key = (buyer.industry, buyer.location, buyer.minPrice, buyer.maxPrice)
+        if key not in profile_of:
+            profile_of[key] = len(profiles)
+            profiles.append(buyer)
+        inverse[row] = profile_of[key]
+    return profiles, inverse
+
+
+def score_profiles(
+    buyers: Sequence[BuyerProfile],
+    vocab: Vocabulary,
+    listings: ListingFeatures,
+    weights: MatchWeights,
+    k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """top_k_matches for buyers, scoring each distinct profile once"""
+    # Questionnaire answers take few distinct values
+    profiles, inverse = unique_profiles(buyers)
+    scores, indices = top_k_matches(buyer_matrix(vocab, profiles, weights), vocab, listings, k=k)
+    return scores[inverse], indices[inverse]
+
+
+def score_buyers(
+    buyers: Sequence[BuyerProfile],
+    industries: Sequence[Optional[str]],
+    locations: Sequence[Optional[str]],
+    asking_prices: Sequence[Optional[float]],
+    revenues: Sequence[Optional[float]],
+    ebitdas: Sequence[Optional[float]],
+    k: int = 20,
+    weights: Optional[MatchWeights] = None
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Top-k listings for every buyer as (scores, listing indices), one row
+    per buyer; slots beyond the number of listings hold index -1
+    """
+    weights = weights or MatchWeights()
+    vocab = Vocabulary()
+    listings = encode_listings(vocab, industries, locations, asking_prices, revenues, ebitdas, weights)
+    scores, indices = score_profiles(buyers, vocab, listings, weights, k)
+    logger.info("match_scoring_complete", buyers=len(buyers), listings=len(listings.bias))
+    return scores, indices
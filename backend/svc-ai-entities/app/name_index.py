@@ -0,0 +1,372 @@
+"""
+In-memory n-gram index of firm and portfolio company names
+
+Names are normalized and split into character trigrams (padded like
+pg_trgm). A compressed inverted index (sorted trigram codes + CSR postings)
+finds candidates by counting shared trigrams with numpy; the best
+candidates by trigram Jaccard are re-ranked with rapidfuzz. Lookups never
+touch Postgres; the index is loaded once and then refreshed incrementally
+from rows whose updated_at moved past the last watermark.
+"""
+
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+import numpy as np
+import structlog
+from rapidfuzz import fuzz, process
+
+logger = structlog.get_logger()
+
+NAME_KINDS = ('firm', 'company')
+
+# Legal-form suffixes that differ between documents for the same entity
+LEGAL_SUFFIXES = {
+    'inc', 'incorporated', 'llc', 'ltd', 'limited', 'corp', 'corporation', 'co',
+    'lp', 'llp', 'plc', 'gmbh', 'sa', 'ag', 'bv', 'nv', 'the',
+}
+
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+class NameRecord(NamedTuple):
+    id: str
+    tenant_id: str
+    name: str
+    kind: str
+    updated_at: Optional[datetime] = None
+
+
+class NameMatch(NamedTuple):
+    id: str
+    name: str
+    kind: str
+    score: float
+
+
+def normalize_name(name: Optional[str]) -> str:
+    tokens = _NON_ALNUM.sub(' ', (name or '').lower()).split()
+    kept = [token for token in tokens if token not in LEGAL_SUFFIXES]
+    # A name made only of suffixes ("The Company LLC") keeps its tokens
+    return ' '.join(kept or tokens)
+
+
+def name_trigrams(normalized: str) -> np.ndarray:
+    """Sorted unique trigram codes; each word padded with two leading spaces and one trailing"""
+    grams: Set[int] = set()
+    for word in normalized.split():
+        padded = f'  {word} '.encode('utf-8')
+        grams.update(int.from_bytes(padded[i:i + 3], 'big') for i in range(len(padded) - 2))
+    return np.array(sorted(grams), dtype=np.int64)
+
+
+class NameIndex:
+    """
+    Trigram inverted index with incremental upserts
+
+    Postings live in a compact CSR base plus a small delta of recently
+    upserted names; the delta is folded into the base once it outgrows
+    compact_ratio of the index. Replaced names are tombstoned, not removed.
+    """
+
+    def __init__(
+        self,
+        candidate_limit: int = 100,
+        posting_budget: int = 10_000,
+        compact_ratio: float = 0.1
+    ):
+        self.candidate_limit = candidate_limit
+        self.posting_budget = posting_budget
+        self.compact_ratio = compact_ratio
+        self.watermark: Optional[datetime] = None
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._ids: List[str] = []
+        self._names: List[str] = []
+        self._normalized: List[str] = []
+        self._kinds: List[str] = []
+        self._tenants: List[str] = []
+        self._slot_by_id: Dict[str, int] = {}
+        self._active = np.zeros(0, dtype=bool)
+        self._gram_counts = np.zeros(0, dtype=np.int32)
+        self._tenant_codes = np.zeros(0, dtype=np.int32)
+        self._kind_codes = np.zeros(0, dtype=np.int8)
+        self._tenant_code_by_id: Dict[str, int] = {}
+        # CSR base: postings of grams[i] are postings[indptr[i]:indptr[i + 1]]
+        self._grams = np.zeros(0, dtype=np.int64)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._postings = np.zeros(0, dtype=np.int32)
+        self._delta: Dict[int, List[int]] = {}
+        self._delta_slots = 0
+
+    def __len__(self) -> int:
+        return len(self._slot_by_id)
+
+    def _append_arrays(self, records: List[NameRecord], gram_lists: List[np.ndarray]) -> np.ndarray:
+        start = len(self._ids)
+        for record in records:
+            self._tenant_code_by_id.setdefault(record.tenant_id, len(self._tenant_code_by_id))
+        self._active = np.concatenate((self._active, np.ones(len(records), dtype=bool)))
+        self._gram_counts = np.concatenate((
+            self._gram_counts, np.fromiter(map(len, gram_lists), dtype=np.int32, count=len(records))
+        ))
+        self._tenant_codes = np.concatenate((self._tenant_codes, np.fromiter(
+            (self._tenant_code_by_id[record.tenant_id] for record in records), dtype=np.int32, count=len(records)
+        )))
+        self._kind_codes = np.concatenate((self._kind_codes, np.fromiter(
+            (NAME_KINDS.index(record.kind) for record in records), dtype=np.int8, count=len(records)
+        )))
+        return np.arange(start, start + len(records))
+
+    def _build_base(self, slot_grams: List[np.ndarray]) -> None:
+        """Rebuild the CSR postings from every active slot and clear the delta"""
+        slots = np.flatnonzero(self._active)
+        if len(slots):
+            grams = np.concatenate([slot_grams[slot] for slot in slots])
+            owners = np.repeat(slots, self._gram_counts[slots]).astype(np.int32)
+        else:
+            grams = np.zeros(0, dtype=np.int64)
+            owners = np.zeros(0, dtype=np.int32)
+        order = np.argsort(grams, kind='stable')
+        grams, owners = grams[order], owners[order]
+        unique_grams, starts = np.unique(grams, return_index=True)
+        self._grams = unique_grams
+        self._indptr = np.append(starts, len(grams)).astype(np.int64)
+        self._postings = owners
+        self._delta = {}
+        self._delta_slots = 0
+
+    def build(self, records: Iterable[NameRecord]) -> None:
+        """Replace the whole index"""
+        records = list(records)
+        with self._lock:
+            self._reset()
+            self._build_base(self._add(records, index_postings=False))
+        logger.info("name_index_built", names=len(self))
+
+    def _add(self, records: List[NameRecord], index_postings: bool = True) -> List[np.ndarray]:
+        """Append records as new slots; returns each record's trigrams"""
+        if not records:
+            return []
+        normalized = [normalize_name(record.name) for record in records]
+        gram_lists = [name_trigrams(name) for name in normalized]
+        slots = self._append_arrays(records, gram_lists)
+        for slot, record, norm, grams in zip(slots, records, normalized, gram_lists):
+            previous = self._slot_by_id.get(record.id)
+            if previous is not None:
+                self._active[previous] = False
+            self._slot_by_id[record.id] = int(slot)
+            self._ids.append(record.id)
+            self._names.append(record.name)
+            self._normalized.append(norm)
+            self._kinds.append(record.kind)
+            self._tenants.append(record.tenant_id)
+            if index_postings:
+                for gram in grams.tolist():
+                    self._delta.setdefault(gram, []).append(int(slot))
+        if index_postings:
+            self._delta_slots += len(records)
+        updated = [record.updated_at for record in records if record.updated_at]
+        if updated:
+            self.watermark = max(updated + ([self.watermark] if self.watermark else []))
+        return gram_lists
+
+    def upsert(self, records: Iterable[NameRecord]) -> int:
+        """Add new names and replace changed ones; returns how many changed"""
+        with self._lock:
+            changed = []
+            for record in records:
+                slot = self._slot_by_id.get(record.id)
+                if slot is not None and self._names[slot] == record.name and self._kinds[slot] == record.kind:
+                    if record.updated_at and (self.watermark is None or record.updated_at > self.watermark):
+                        self.watermark = record.updated_at
+                    continue
+                changed.append(record)
+            self._add(changed)
+            # Tombstones and delta postings both slow queries; fold them in
+            tombstones = len(self._ids) - len(self._slot_by_id)
+            if self._delta_slots + tombstones > self.compact_ratio * max(len(self), 1):
+                self._compact()
+        return len(changed)
+
+    def remove(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for entity_id in ids:
+                slot = self._slot_by_id.pop(entity_id, None)
+                if slot is not None:
+                    self._active[slot] = False
+
+    def _compact(self) -> None:
+        """Drop tombstoned slots and rebuild the base postings"""
+        keep = np.flatnonzero(self._active)
+        records = [
+            NameRecord(self._ids[slot], self._tenants[slot], self._names[slot], self._kinds[slot])
+            for slot in keep
+        ]
+        watermark = self.watermark
+        self._reset()
+        self._build_base(self._add(records, index_postings=False))
+        self.watermark = watermark
+        logger.info("name_index_compacted", names=len(self))
+
+    def _candidate_postings(self, query_grams: np.ndarray) -> List[np.ndarray]:
+        positions = np.searchsorted(self._grams, query_grams)
+        positions = np.minimum(positions, max(len(self._grams) - 1, 0))
+        found = (self._grams[positions] == query_grams) if len(self._grams) else np.zeros(len(query_grams), bool)
+
+        lists = []
+        for gram, position, present in zip(query_grams.tolist(), positions.tolist(), found.tolist()):
+            if present:
+                lists.append(self._postings[self._indptr[position]:self._indptr[position + 1]])
+            if gram in self._delta:
+                lists.append(np.asarray(self._delta[gram], dtype=np.int32))
+
+        # Rarest trigrams first, up to the posting budget: common ones
+        # ("ent", "ings") cost the most to count and carry the least signal
+        lists.sort(key=len)
+        selected, total = [], 0
+        for postings in lists:
+            if selected and total + len(postings) > self.posting_budget:
+                break
+            selected.append(postings)
+            total += len(postings)
+        return selected
+
+    def search(
+        self,
+        name: str,
+        top_k: int = 5,
+        tenant_id: Optional[str] = None,
+        kind: Optional[str] = None,
+        min_score: float = 0.0
+    ) -> List[NameMatch]:
+        """Top-k fuzzy matches for a name, best first; scores are in [0, 1]"""
+        normalized = normalize_name(name)
+        query_grams = name_trigrams(normalized)
+        if not len(query_grams):
+            return []
+
+        with self._lock:
+            postings = self._candidate_postings(query_grams)
+            if not postings:
+                return []
+            slots, shared = np.unique(np.concatenate(postings), return_counts=True)
+
+            mask = self._active[slots]
+            if tenant_id is not None:
+                code = self._tenant_code_by_id.get(tenant_id)
+                if code is None:
+                    return []
+                mask &= self._tenant_codes[slots] == code
+            if kind is not None:
+                mask &= self._kind_codes[slots] == NAME_KINDS.index(kind)
+            slots, shared = slots[mask], shared[mask]
+            if not len(slots):
+                return []
+
+            jaccard = shared / (len(query_grams) + self._gram_counts[slots] - shared)
+            if len(slots) > self.candidate_limit:
+                best = np.argpartition(-jaccard, self.candidate_limit)[:self.candidate_limit]
+                slots = slots[best]
+
+            choices = [self._normalized[slot] for slot in slots]
+            ranked = process.extract(
+                normalized, choices, scorer=fuzz.WRatio, limit=top_k, score_cutoff=min_score * 100
+            )
+            return [
+                NameMatch(
+                    id=self._ids[slots[index]],
+                    name=self._names[slots[index]],
+                    kind=self._kinds[slots[index]],
+                    score=round(score / 100, 4)
+                )
+                for _, score, index in ranked
+            ]
+
+
+class PostgresNameSource:
+    """Reads firm and portfolio company names, optionally only those updated since a watermark"""
+
+    QUERY = """
+        SELECT id::text, tenant_id::text, name, 'firm' AS kind, updated_at FROM firms
+        WHERE %(since)s IS NULL OR updated_at > %(since)s
+        UNION ALL
+        SELECT id::text, tenant_id::text, name, 'company' AS kind, updated_at FROM portfolio_companies
+        WHERE %(since)s IS NULL OR updated_at > %(since)s
+    """
+
+    def __init__(self, dsn: Optional[str] = None):
+        import psycopg2
+
+        self.dsn = dsn or (
+            f"host={os.getenv('DB_HOST', 'localhost')} "
+            f"port={os.getenv('DB_PORT', '5432')} "
+            f"dbname={os.getenv('DB_NAME', 'acquismart')} "
+            f"user={os.getenv('DB_USER', 'acquismart')} "
+            f"password={os.getenv('DB_PASSWORD', 'changeme')}"
+        )
+        self._psycopg2 = psycopg2
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self._psycopg2.connect(self.dsn)
+            self._conn.autocommit = True
+        return self._conn
+
+    def fetch(self, since: Optional[datetime] = None) -> List[NameRecord]:
+        with self._connection().cursor() as cur:
+            cur.execute(self.QUERY, {'since': since})
+            return [NameRecord(*row) for row in cur.fetchall()]
+
+
+class NameIndexRefresher:
+    """Loads the index once, then applies rows updated since the last refresh"""
+
+    def __init__(
+        self,
+        index: NameIndex,
+        source: PostgresNameSource,
+        interval_seconds: float = 60.0,
+        full_reload_every: int = 60
+    ):
+        self.index = index
+        self.source = source
+        self.interval_seconds = interval_seconds
+        # Deleted rows never show up in an updated_at delta, so reload fully now and then
+        self.full_reload_every = full_reload_every
+        self._refreshes = 0
+        self._stop = threading.Event()
+
+    def load(self) -> None:
+        start = time.perf_counter()
+        self.index.build(self.source.fetch())
+        logger.info("name_index_loaded", names=len(self.index),
+                    seconds=round(time.perf_counter() - start, 3))
+
+    def refresh(self) -> int:
+        self._refreshes += 1
+        if self.full_reload_every and self._refreshes % self.full_reload_every == 0:
+            self.load()
+            return len(self.index)
+        changed = self.index.upsert(self.source.fetch(since=self.index.watermark))
+        if changed:
+            logger.info("name_index_refreshed", changed=changed, names=len(self.index))
+        return changed
+
+    def run_forever(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.refresh()
+            except Exception as e:
+                # A database blip must not kill the refresher; keep serving the old index
+                logger.error("name_index_refresh_error", error=str(e))
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,235 @@
+"""
+Named-entity extraction over document page text
+
+Pages go through spaCy's nlp.pipe in batches inside a pool of worker
+processes, each of which loads the model once. Only the components the NER
+component needs are loaded, and entities are mapped back to the page and to
+the bounding boxes of the OCR words they cover.
+"""
+
+import math
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import structlog
+from pydantic import BaseModel
+
+logger = structlog.get_logger()
+
+DEFAULT_MODEL = os.getenv('SPACY_MODEL', 'en_core_web_lg')
+
+# spaCy label -> entity type returned by the service
+ENTITY_LABELS = {'ORG': 'org', 'MONEY': 'money', 'DATE': 'date', 'PERCENT': 'percentage'}
+
+# Everything besides tok2vec/transformer and ner; excluded components are never loaded
+EXCLUDED_COMPONENTS = [
+    'tagger', 'parser', 'attribute_ruler', 'lemmatizer', 'senter', 'morphologizer', 'textcat',
+]
+
+_SCALE_WORDS = {'thousand': 1e3, 'k': 1e3, 'million': 1e6, 'mm': 1e6, 'm': 1e6, 'billion': 1e9, 'bn': 1e9, 'b': 1e9}
+_NUMBER_RE = re.compile(r'(-?[\d,]*\.?\d+)\s*(thousand|million|billion|mm|bn|k|m|b)?\b', re.IGNORECASE)
+
+
+class BoundingBox(BaseModel):
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+
+
+class OcrWord(BaseModel):
+    text: str
+    bbox: BoundingBox
+
+
+class PageText(BaseModel):
+    document_id: str
+    page_number: int
+    text: str
+    words: List[OcrWord] = []
+
+
+class PageEntity(BaseModel):
+    document_id: str
+    page_number: int
+    type: str
+    text: str
+    start_char: int
+    end_char: int
+    value: Optional[float] = None
+    bbox: Optional[BoundingBox] = None
+
+
+def parse_amount(text: str) -> Optional[float]:
+    """Numeric value of a MONEY or PERCENT span: '$1.2 million' -> 1200000.0"""
+    match = _NUMBER_RE.search(text.replace('(', '-').replace(')', ''))
+    if not match:
+        return None
+    try:
+        value = float(match.group(1).replace(',', ''))
+    except ValueError:
+        return None
+    return value * _SCALE_WORDS.get((match.group(2) or '').lower(), 1)
+
+
+def word_offsets(text: str, words: Sequence[OcrWord]) -> List[Tuple[int, int]]:
+    """Character span of each OCR word in the page text, found left to right"""
+    offsets = []
+    cursor = 0
+    for word in words:
+        start = text.find(word.text, cursor)
+        if start < 0:
+            offsets.append((-1, -1))
+            continue
+        offsets.append((start, start + len(word.text)))
+        cursor = start + len(word.text)
+    return offsets
+
+
+def span_bbox(
+    start: int,
+    end: int,
+    words: Sequence[OcrWord],
+    offsets: Sequence[Tuple[int, int]]
+) -> Optional[BoundingBox]:
+    """Union of the boxes of every word overlapping [start, end)"""
+    boxes = [
+        word.bbox for word, (word_start, word_end) in zip(words, offsets)
+        if word_start >= 0 and word_start < end and word_end > start
+    ]
+    if not boxes:
+        return None
+    return BoundingBox(
+        x1=min(box.x1 for box in boxes),
+        y1=min(box.y1 for box in boxes),
+        x2=max(box.x2 for box in boxes),
+        y2=max(box.y2 for box in boxes)
+    )
+
+
+def load_pipeline(model: str = DEFAULT_MODEL):
+    import spacy
+
+    nlp = spacy.load(model, exclude=EXCLUDED_COMPONENTS)
+    logger.info("ner_model_loaded", model=model, pipes=nlp.pipe_names)
+    return nlp
+
+
+# Per-process pipeline, loaded once by the pool initializer
+_nlp = None
+
+
+def _init_worker(model: str) -> None:
+    global _nlp
+    _nlp = load_pipeline(model)
+
+
+def _extract_spans(texts: List[str], batch_size: int) -> List[List[Tuple[str, int, int, str]]]:
+    """(label, start_char, end_char, text) of every wanted entity, per text"""
+    results = []
+    for doc in _nlp.pipe(texts, batch_size=batch_size):
+        results.append([
+            (ent.label_, ent.start_char, ent.end_char, ent.text)
+            for ent in doc.ents if ent.label_ in ENTITY_LABELS
+        ])
+    return results
+
+
+class NerExtractor:
+    """
+    Batched NER over pages with an optional pool of model-holding processes
+
+    workers=0 runs the pipeline in the calling process. Pages are split into
+    one chunk per worker, capped at chunk_size pages, and every chunk runs
+    through nlp.pipe with batch_size, so one quarterly package keeps all
+    workers busy. Workers are spawned rather than forked, since the service
+    already runs threads (the name-index refresher) when the pool starts.
+    """
+
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        workers: int = 0,
+        batch_size: int = 64,
+        chunk_size: int = 256
+    ):
+        self.model = model
+        self.workers = workers
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self._executor: Optional[ProcessPoolExecutor] = None
+        if workers > 0:
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(model,)
+            )
+            # Surface a missing or broken model at startup, not on the first request
+            self._executor.submit(_extract_spans, [''], 1).result()
+        else:
+            _init_worker(model)
+
+    def _spans(self, texts: List[str]) -> List[List[Tuple[str, int, int, str]]]:
+        if self._executor is None:
+            return _extract_spans(texts, self.batch_size)
+        size = max(1, min(self.chunk_size, math.ceil(len(texts) / self.workers)))
+        chunks = [texts[i:i + size] for i in range(0, len(texts), size)]
+        results = []
+        for chunk_result in self._executor.map(_extract_spans, chunks, [self.batch_size] * len(chunks)):
+            results.extend(chunk_result)
+        return results
+
+    def extract(self, pages: Sequence[PageText], types: Optional[Sequence[str]] = None) -> Tuple[List[PageEntity], Dict[str, float]]:
+        """Entities for every page plus throughput stats"""
+        start = time.perf_counter()
+        wanted = set(types) if types else set(ENTITY_LABELS.values())
+
+        # Repeated page text (headers, boilerplate pages) is only parsed once
+        unique_texts: Dict[str, int] = {}
+        for page in pages:
+            if page.text.strip():
+                unique_texts.setdefault(page.text, len(unique_texts))
+        spans = self._spans(list(unique_texts))
+
+        entities = []
+        for page in pages:
+            if page.text not in unique_texts:
+                continue
+            offsets = word_offsets(page.text, page.words) if page.words else []
+            for label, start_char, end_char, text in spans[unique_texts[page.text]]:
+                entity_type = ENTITY_LABELS[label]
+                if entity_type not in wanted:
+                    continue
+                entities.append(PageEntity(
+                    document_id=page.document_id,
+                    page_number=page.page_number,
+                    type=entity_type,
+                    text=text,
+                    start_char=start_char,
+                    end_char=end_char,
+                    value=parse_amount(text) if entity_type in ('money', 'percentage') else None,
+                    bbox=span_bbox(start_char, end_char, page.words, offsets) if offsets else None
+                ))
+
+        seconds = time.perf_counter() - start
+        documents = len({page.document_id for page in pages})
+        stats = {
+            'pages': len(pages),
+            'unique_pages': len(unique_texts),
+            'entities': len(entities),
+            'seconds': seconds,
+            'pages_per_second': len(pages) / seconds if seconds > 0 else 0.0,
+            'docs_per_second': documents / seconds if seconds > 0 else 0.0,
+        }
+        logger.info("ner_extract_complete", **stats)
+        return entities, stats
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
@@ -0,0 +1,344 @@
+"""
+Cross-source listing entity resolution
+
+Three stages, none of which compares every pair of listings:
+
+1. Blocking: MinHash LSH over title byte trigrams, plus a
+   location + price-band key. Only listings sharing a bucket become
+   candidate pairs; buckets larger than max_block_size fall back to a
+   sorted-neighbourhood window over normalized titles.
+2. Scoring: rapidfuzz title similarity combined with location and price
+   agreement, computed pairwise over the candidate arrays.
+3. Clustering: connected components over the matched pairs.
+"""
+
+import re
+import time
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+from pydantic import BaseModel, Field
+from rapidfuzz import fuzz
+from rapidfuzz.process import cpdist
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+logger = structlog.get_logger()
+
+_SHIFT = np.uint64(32)
+
+# Words that vary between marketplaces without changing the business
+TITLE_STOPWORDS = {
+    'a', 'an', 'and', 'the', 'for', 'sale', 'of', 'in', 'with', 'business',
+    'llc', 'inc', 'co', 'company', 'opportunity', 'established', 'profitable',
+}
+
+US_STATES = {
+    'alabama': 'al', 'alaska': 'ak', 'arizona': 'az', 'arkansas': 'ar', 'california': 'ca',
+    'colorado': 'co', 'connecticut': 'ct', 'delaware': 'de', 'florida': 'fl', 'georgia': 'ga',
+    'hawaii': 'hi', 'idaho': 'id', 'illinois': 'il', 'indiana': 'in', 'iowa': 'ia',
+    'kansas': 'ks', 'kentucky': 'ky', 'louisiana': 'la', 'maine': 'me', 'maryland': 'md',
+    'massachusetts': 'ma', 'michigan': 'mi', 'minnesota': 'mn', 'mississippi': 'ms',
+    'missouri': 'mo', 'montana': 'mt', 'nebraska': 'ne', 'nevada': 'nv', 'new hampshire': 'nh',
+    'new jersey': 'nj', 'new mexico': 'nm', 'new york': 'ny', 'north carolina': 'nc',
+    'north dakota': 'nd', 'ohio': 'oh', 'oklahoma': 'ok', 'oregon': 'or', 'pennsylvania': 'pa',
+    'rhode island': 'ri', 'south carolina': 'sc', 'south dakota': 'sd', 'tennessee': 'tn',
+    'texas': 'tx', 'utah': 'ut', 'vermont': 'vt', 'virginia': 'va', 'washington': 'wa',
+    'west virginia': 'wv', 'wisconsin': 'wi', 'wyoming': 'wy', 'district of columbia': 'dc',
+}
+_STATE_CODES = set(US_STATES.values())
+
+_STATE_NAME_RE = re.compile(r'\b(' + '|'.join(sorted(US_STATES, key=len, reverse=True)) + r')\b')
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+class ResolutionConfig(BaseModel):
+    num_perm: int = Field(default=64, ge=8)
+    bands: int = Field(default=16, ge=1)
+    shingle_size: int = Field(default=3, ge=1, le=8)
+    price_band_width: float = Field(default=0.2, gt=0, description="Width of log10 price bands")
+    max_block_size: int = Field(default=200, ge=2)
+    window: int = Field(default=10, ge=1, description="Sorted-neighbourhood window for oversized blocks")
+    title_weight: float = 0.6
+    location_weight: float = 0.2
+    price_weight: float = 0.2
+    threshold: float = Field(default=0.85, ge=0, le=1)
+    min_title_score: float = Field(default=0.6, ge=0, le=1)
+    cross_source_only: bool = False
+    seed: int = 42
+    chunk_size: int = Field(default=5_000, ge=1, description="Records per MinHash chunk")
+
+
+class ResolutionResult(BaseModel):
+    labels: List[int]
+    pairs: List[Tuple[int, int, float]]
+    stats: Dict[str, float]
+
+
+def normalize_title(title: Optional[str]) -> str:
+    tokens = _NON_ALNUM.sub(' ', (title or '').lower()).split()
+    return ' '.join(token for token in tokens if token not in TITLE_STOPWORDS)
+
+
+@lru_cache(maxsize=100_000)
+def normalize_location(location: Optional[str]) -> Tuple[str, str]:
+    """('austin tx', 'tx') from 'Austin, TX' or 'Austin, Texas'; empty when unknown"""
+    text = _STATE_NAME_RE.sub(lambda match: US_STATES[match.group(1)], (location or '').lower())
+    tokens = _NON_ALNUM.sub(' ', text).split()
+    state = next((token for token in reversed(tokens) if token in _STATE_CODES), '')
+    return ' '.join(tokens), state
+
+
+def title_shingles(titles: Sequence[str], size: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Byte shingles of every title as one flat array plus per-title offsets
+
+    Each shingle is its bytes packed into a uint64, built with array shifts
+    over the concatenated titles instead of hashing grams one at a time.
+    """
+    padded = [f' {title} '.encode('utf-8').ljust(size) for title in titles]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    data = np.frombuffer(b''.join(padded) + bytes(size), dtype=np.uint8).astype(np.uint64)
+
+    codes = np.zeros(len(data) - size, dtype=np.uint64)
+    for i in range(size):
+        codes = (codes << np.uint64(8)) | data[i:len(data) - size + i]
+
+    # Keep only shingles that start and end inside the same title
+    counts = lengths - size + 1
+    title_starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    positions = np.repeat(title_starts - offsets, counts) + np.arange(counts.sum())
+    return codes[positions], offsets
+
+
+def minhash_signatures(
+    shingles: np.ndarray,
+    offsets: np.ndarray,
+    num_perm: int,
+    seed: int,
+    chunk_size: int
+) -> np.ndarray:
+    """(n, num_perm) MinHash signatures, hashed chunk by chunk with reduceat"""
+    # Multiply-shift hashing: (a * x + b) mod 2^64, top 32 bits, with odd a
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64)[:, None] | np.uint64(1)
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)[:, None]
+
+    n = len(offsets)
+    ends = np.append(offsets[1:], len(shingles))
+    signatures = np.empty((n, num_perm), dtype=np.uint32)
+    for start in range(0, n, chunk_size):
+        stop = min(start + chunk_size, n)
+        values = shingles[offsets[start]:ends[stop - 1]]
+        with np.errstate(over='ignore'):
+            hashed = (a * values[None, :] + b) >> _SHIFT
+        signatures[start:stop] = np.minimum.reduceat(hashed, offsets[start:stop] - offsets[start], axis=1).T
+    return signatures
+
+
+def lsh_band_keys(signatures: np.ndarray, bands: int) -> np.ndarray:
+    """(n, bands) bucket keys; rows of each band folded into one uint64"""
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    banded = signatures[:, :rows * bands].reshape(n, bands, rows).astype(np.uint64)
+    keys = np.zeros((n, bands), dtype=np.uint64)
+    with np.errstate(over='ignore'):
+        for r in range(rows):
+            keys = keys * np.uint64(0x100000001B3) + banded[:, :, r]
+        # Salt with the band index so equal rows in different bands differ
+        keys = keys * np.uint64(0x9E3779B97F4A7C15) + np.arange(bands, dtype=np.uint64)
+    return keys
+
+
+def _block_pairs(keys: np.ndarray, title_rank: np.ndarray, max_block_size: int, window: int) -> np.ndarray:
+    """Candidate pairs for records sharing a key; oversized blocks use a title window"""
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    boundaries = np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1
+    starts = np.concatenate(([0], boundaries))
+    sizes = np.diff(np.concatenate((starts, [len(order)])))
+
+    pairs = []
+    # Blocks of equal size share one triu index set, so pair them together
+    for size in np.unique(sizes[(sizes >= 2) & (sizes <= max_block_size)]):
+        block_starts = starts[sizes == size]
+        members = order[block_starts[:, None] + np.arange(size)]
+        left, right = np.triu_indices(size, 1)
+        pairs.append(np.stack((members[:, left].ravel(), members[:, right].ravel()), axis=1))
+
+    for start, size in zip(starts[sizes > max_block_size], sizes[sizes > max_block_size]):
+        members = order[start:start + size]
+        members = members[np.argsort(title_rank[members], kind='stable')]
+        for offset in range(1, min(window, size - 1) + 1):
+            pairs.append(np.stack((members[:-offset], members[offset:]), axis=1))
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.concatenate(pairs).astype(np.int64)
+
+
+def _unique_pairs(pairs: np.ndarray, n: int) -> np.ndarray:
+    left = np.minimum(pairs[:, 0], pairs[:, 1])
+    right = np.maximum(pairs[:, 0], pairs[:, 1])
+    codes = np.sort(left * n + right)
+    codes = codes[np.concatenate(([True], codes[1:] != codes[:-1]))]
+    return np.stack((codes // n, codes % n), axis=1)
+
+
+def price_bands(prices: np.ndarray, width: float) -> np.ndarray:
+    """Log10 price band per listing; -1 for missing or non-positive prices"""
+    bands = np.full(len(prices), -1, dtype=np.int64)
+    valid = np.isfinite(prices) & (prices > 0)
+    bands[valid] = np.floor(np.log10(prices[valid]) / width).astype(np.int64)
+    return bands
+
+
+def block_candidates(
+    titles: Sequence[str],
+    locations: Sequence[str],
+    prices: np.ndarray,
+    config: ResolutionConfig
+) -> np.ndarray:
+    """Unique (i, j) candidate pairs with i < j"""
+    n = len(titles)
+    title_rank = np.empty(n, dtype=np.int64)
+    title_rank[np.argsort(np.asarray(titles, dtype=object), kind='stable')] = np.arange(n)
+
+    # Empty titles would all share every band; they are blocked on location only
+    titled = np.flatnonzero(np.asarray(titles, dtype=object) != '')
+    pairs = []
+    if len(titled):
+        shingles, offsets = title_shingles([titles[i] for i in titled], config.shingle_size)
+        signatures = minhash_signatures(shingles, offsets, config.num_perm, config.seed, config.chunk_size)
+        band_keys = lsh_band_keys(signatures, config.bands)
+        for band in range(band_keys.shape[1]):
+            local = _block_pairs(band_keys[:, band], title_rank[titled], config.max_block_size, config.window)
+            pairs.append(titled[local])
+
+    # Location + price band catches retitled listings of the same business.
+    # Listings missing either attribute are left to the title bands.
+    _, location_codes = np.unique(np.asarray(locations, dtype=object), return_inverse=True)
+    bands = price_bands(prices, config.price_band_width)
+    known = np.flatnonzero((np.asarray(locations, dtype=object) != '') & (bands >= 0))
+    if len(known):
+        keys = location_codes[known].astype(np.int64) * (1 << 20) + bands[known] + (1 << 19)
+        local = _block_pairs(keys, title_rank[known], config.max_block_size, config.window)
+        pairs.append(known[local])
+
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    if len(pairs) == 0:
+        return pairs
+    return _unique_pairs(pairs, n)
+
+
+def score_pairs(
+    titles: Sequence[str],
+    locations: Sequence[str],
+    states: Sequence[str],
+    prices: np.ndarray,
+    pairs: np.ndarray,
+    config: ResolutionConfig
+) -> Tuple[np.ndarray, np.ndarray]:
+    """(combined score, title score) per candidate pair, all in [0, 1]"""
+    left, right = pairs[:, 0], pairs[:, 1]
+    title_array = np.asarray(titles, dtype=object)
+    title_score = cpdist(
+        title_array[left], title_array[right], scorer=fuzz.token_set_ratio, workers=-1
+    ).astype(np.float64) / 100
+
+    location_array = np.asarray(locations, dtype=object)
+    state_array = np.asarray(states, dtype=object)
+    missing = (location_array[left] == '') | (location_array[right] == '')
+    location_score = np.where(
+        missing, 0.5,
+        np.where(location_array[left] == location_array[right], 1.0,
+                 np.where((state_array[left] == state_array[right]) & (state_array[left] != ''), 0.7, 0.0))
+    )
+
+    low = np.fmin(prices[left], prices[right])
+    high = np.fmax(prices[left], prices[right])
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = low / high
+    price_score = np.where(np.isfinite(ratio) & (high > 0), np.clip(ratio, 0, 1), 0.5)
+
+    total_weight = config.title_weight + config.location_weight + config.price_weight
+    score = (
+        config.title_weight * title_score
+        + config.location_weight * location_score
+        + config.price_weight * price_score
+    ) / total_weight
+    return score, title_score
+
+
+def cluster_pairs(n: int, pairs: np.ndarray) -> np.ndarray:
+    """Cluster label per record from matched pairs (connected components)"""
+    if len(pairs) == 0:
+        return np.arange(n)
+    graph = coo_matrix((np.ones(len(pairs), dtype=np.int8), (pairs[:, 0], pairs[:, 1])), shape=(n, n))
+    _, labels = connected_components(graph, directed=False)
+    return labels
+
+
+def resolve(
+    titles: Sequence[Optional[str]],
+    locations: Sequence[Optional[str]],
+    prices: Sequence[Optional[float]],
+    sources: Optional[Sequence[Optional[str]]] = None,
+    config: Optional[ResolutionConfig] = None
+) -> ResolutionResult:
+    """Block, score and cluster listings; labels[i] is listing i's cluster"""
+    config = config or ResolutionConfig()
+    n = len(titles)
+    timings = {}
+
+    start = time.perf_counter()
+    normalized_titles = [normalize_title(title) for title in titles]
+    normalized = [normalize_location(location) for location in locations]
+    normalized_locations = [location for location, _ in normalized]
+    states = [state for _, state in normalized]
+    price_array = np.array([np.nan if price is None else price for price in prices], dtype=np.float64)
+    timings['normalize_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    candidates = block_candidates(normalized_titles, normalized_locations, price_array, config)
+    if config.cross_source_only and sources is not None and len(candidates):
+        source_array = np.asarray(sources, dtype=object)
+        candidates = candidates[source_array[candidates[:, 0]] != source_array[candidates[:, 1]]]
+    timings['blocking_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if len(candidates):
+        scores, title_scores = score_pairs(
+            normalized_titles, normalized_locations, states, price_array, candidates, config
+        )
+        matched = (scores >= config.threshold) & (title_scores >= config.min_title_score)
+    else:
+        scores = np.empty(0)
+        matched = np.empty(0, dtype=bool)
+    timings['scoring_seconds'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    labels = cluster_pairs(n, candidates[matched])
+    timings['clustering_seconds'] = time.perf_counter() - start
+
+    total_pairs = n * (n - 1) / 2
+    cluster_sizes = np.bincount(labels) if n else np.empty(0, dtype=np.int64)
+    stats = {
+        'listings': n,
+        'candidate_pairs': int(len(candidates)),
+        'pair_reduction': 1 - len(candidates) / total_pairs if total_pairs else 0.0,
+        'matched_pairs': int(matched.sum()),
+        'duplicate_clusters': int((cluster_sizes > 1).sum()),
+        **timings,
+    }
+    logger.info("entity_resolution_complete", **stats)
+
+    matched_pairs = [
+        (int(i), int(j), round(float(score), 4))
+        for (i, j), score in zip(candidates[matched], scores[matched])
+    ]
+    # Built from already-typed values; skip validating millions of labels
+    return ResolutionResult.model_construct(labels=labels.tolist(), pairs=matched_pairs, stats=stats)
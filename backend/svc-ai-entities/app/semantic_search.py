@@ -0,0 +1,325 @@
+"""
+Semantic listing search
+
+Listing text (name, industry, description, highlights) is embedded in
+batches with sentence-transformers and stored in a FAISS index keyed by an
+int64 label per listing. Small corpora live in a flat index; once enough
+vectors exist they move to an IVF index, which keeps add/remove cheap.
+askingPrice/revenue ranges are resolved against columnar arrays first and
+handed to FAISS as an IDSelector, so the vector search only visits listings
+that pass the filter. The index persists to disk and is loaded with mmap.
+"""
+
+import json
+import os
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import structlog
+
+logger = structlog.get_logger()
+
+DEFAULT_EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+DEFAULT_INDEX_DIR = os.getenv('SEARCH_INDEX_DIR', 'data/search_index')
+
+INDEX_FILE = 'listings.faiss'
+META_FILE = 'listings_meta.npz'
+
+
+class SearchHit(NamedTuple):
+    id: str
+    score: float
+    asking_price: Optional[float]
+    revenue: Optional[float]
+
+
+def listing_text(listing: Dict) -> str:
+    """Text embedded for a listing in the mock_businesses.json shape"""
+    parts = [listing.get('name'), listing.get('industry'), listing.get('description')]
+    parts.extend(listing.get('highlights') or [])
+    return '. '.join(str(part).strip() for part in parts if part)
+
+
+class ListingEncoder:
+    """Batched, normalized sentence-transformers embeddings"""
+
+    def __init__(self, model_name: str = DEFAULT_EMBEDDING_MODEL, batch_size: int = 64):
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts: Sequence[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        # Templated listings repeat text; embed each distinct string once
+        unique, inverse = np.unique(np.asarray(texts, dtype=object), return_inverse=True)
+        vectors = self.model.encode(
+            list(unique),
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.ascontiguousarray(vectors[inverse], dtype=np.float32)
+
+
+class SemanticIndex:
+    """
+    FAISS index over listing embeddings with numeric prefilters
+
+    Labels are assigned sequentially and never reused; label -> listing id
+    and the price/revenue columns are kept in arrays indexed by label.
+    Vectors are L2-normalized, so inner product is cosine similarity.
+    """
+
+    def __init__(
+        self,
+        dimension: int,
+        train_threshold: int = 20_000,
+        nprobe: int = 16,
+        exact_threshold: int = 5_000
+    ):
+        import faiss
+
+        self.dimension = dimension
+        self.train_threshold = train_threshold
+        self.nprobe = nprobe
+        self.exact_threshold = exact_threshold
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dimension))
+        self.ids: List[Optional[str]] = []
+        self.label_of: Dict[str, int] = {}
+        self.asking_price = np.zeros(0, dtype=np.float64)
+        self.revenue = np.zeros(0, dtype=np.float64)
+        self.alive = np.zeros(0, dtype=bool)
+        self._mmapped_from: Optional[str] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.label_of)
+
+    @property
+    def is_ivf(self) -> bool:
+        import faiss
+
+        return isinstance(self.index, faiss.IndexIVF)
+
+    def _grow(self, count: int) -> None:
+        self.asking_price = np.concatenate([self.asking_price, np.full(count, np.nan)])
+        self.revenue = np.concatenate([self.revenue, np.full(count, np.nan)])
+        self.alive = np.concatenate([self.alive, np.zeros(count, dtype=bool)])
+
+    def _writable(self) -> None:
+        """An mmapped index is read-only; copy it into memory before the first write"""
+        if self._mmapped_from:
+            import faiss
+
+            self.index = faiss.read_index(self._mmapped_from)
+            self._mmapped_from = None
+
+    def _train_ivf(self) -> None:
+        """Move every vector from the flat index into a freshly trained IVF index"""
+        import faiss
+
+        labels = faiss.vector_to_array(self.index.id_map).astype(np.int64)
+        vectors = self.index.reconstruct_batch(labels)
+        # ~4*sqrt(n) lists, capped so k-means sees enough points per centroid
+        nlist = max(min(int(4 * np.sqrt(len(labels))), len(labels) // 39), 1)
+        quantizer = faiss.IndexFlatIP(self.dimension)
+        ivf = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        ivf.train(vectors[np.random.default_rng(0).permutation(len(vectors))[:nlist * 256]])
+        ivf.add_with_ids(vectors, labels)
+        self.index = ivf
+        logger.info("search_index_trained", vectors=len(labels), nlist=nlist)
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        vectors: np.ndarray,
+        asking_prices: Sequence[Optional[float]],
+        revenues: Sequence[Optional[float]]
+    ) -> int:
+        """Add listings or replace the vectors of ones already indexed"""
+        with self._lock:
+            self._writable()
+            self.remove([listing_id for listing_id in ids if listing_id in self.label_of])
+
+            start = len(self.ids)
+            labels = np.arange(start, start + len(ids), dtype=np.int64)
+            self._grow(len(ids))
+            self.ids.extend(ids)
+            for listing_id, label in zip(ids, labels):
+                self.label_of[listing_id] = int(label)
+            self.asking_price[labels] = np.asarray(asking_prices, dtype=np.float64)
+            self.revenue[labels] = np.asarray(revenues, dtype=np.float64)
+            self.alive[labels] = True
+
+            self.index.add_with_ids(np.ascontiguousarray(vectors, dtype=np.float32), labels)
+            if not self.is_ivf and self.index.ntotal >= self.train_threshold:
+                self._train_ivf()
+            return len(ids)
+
+    def remove(self, ids: Sequence[str]) -> int:
+        with self._lock:
+            labels = [self.label_of.pop(listing_id) for listing_id in ids if listing_id in self.label_of]
+            if not labels:
+                return 0
+            self._writable()
+            labels = np.asarray(labels, dtype=np.int64)
+            self.index.remove_ids(labels)
+            self.alive[labels] = False
+            for label in labels:
+                self.ids[label] = None
+            return len(labels)
+
+    def _candidates(
+        self,
+        min_price: Optional[float],
+        max_price: Optional[float],
+        min_revenue: Optional[float],
+        max_revenue: Optional[float]
+    ) -> Optional[np.ndarray]:
+        """Labels passing the numeric filters, or None when nothing is filtered"""
+        bounds = [
+            (self.asking_price, min_price, max_price),
+            (self.revenue, min_revenue, max_revenue),
+        ]
+        if all(low is None and high is None for _, low, high in bounds):
+            return None
+        mask = self.alive.copy()
+        # NaN compares False, so listings missing a filtered value drop out
+        for column, low, high in bounds:
+            if low is not None:
+                mask &= column >= low
+            if high is not None:
+                mask &= column <= high
+        return np.flatnonzero(mask).astype(np.int64)
+
+    def search(
+        self,
+        query_vectors: np.ndarray,
+        top_k: int = 10,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        min_revenue: Optional[float] = None,
+        max_revenue: Optional[float] = None
+    ) -> List[List[SearchHit]]:
+        import faiss
+
+        with self._lock:
+            candidates = self._candidates(min_price, max_price, min_revenue, max_revenue)
+            if candidates is not None and len(candidates) == 0:
+                return [[] for _ in range(len(query_vectors))]
+
+            params = None
+            selector = None
+            if self.is_ivf:
+                nprobe = self.nprobe
+                # A narrow filter leaves few vectors per list; probing every
+                # list keeps recall exact for about the cost of a flat scan
+                if candidates is not None and len(candidates) <= self.exact_threshold:
+                    nprobe = self.index.nlist
+                params = faiss.SearchParametersIVF(nprobe=nprobe)
+            elif candidates is not None:
+                params = faiss.SearchParameters()
+            if candidates is not None:
+                selector = faiss.IDSelectorBatch(candidates)
+                params.sel = selector
+
+            k = min(top_k, len(self) if candidates is None else len(candidates))
+            if k == 0:
+                return [[] for _ in range(len(query_vectors))]
+            scores, labels = self.index.search(
+                np.ascontiguousarray(query_vectors, dtype=np.float32), k, params=params
+            )
+
+            results = []
+            for row_scores, row_labels in zip(scores, labels):
+                hits = []
+                for score, label in zip(row_scores, row_labels):
+                    if label < 0:
+                        continue
+                    hits.append(SearchHit(
+                        id=self.ids[label],
+                        score=float(score),
+                        asking_price=None if np.isnan(self.asking_price[label]) else float(self.asking_price[label]),
+                        revenue=None if np.isnan(self.revenue[label]) else float(self.revenue[label])
+                    ))
+                results.append(hits)
+            return results
+
+    def save(self, directory: str = DEFAULT_INDEX_DIR) -> None:
+        """Write index and metadata next to each other, replacing both atomically"""
+        import faiss
+
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            index_tmp = os.path.join(directory, INDEX_FILE + '.tmp')
+            meta_tmp = os.path.join(directory, META_FILE + '.tmp')
+            faiss.write_index(self.index, index_tmp)
+            with open(meta_tmp, 'wb') as f:
+                np.savez(
+                    f,
+                    ids=np.asarray(['' if listing_id is None else listing_id for listing_id in self.ids], dtype=object),
+                    asking_price=self.asking_price,
+                    revenue=self.revenue,
+                    alive=self.alive,
+                    config=np.asarray(json.dumps({
+                        'dimension': self.dimension,
+                        'train_threshold': self.train_threshold,
+                        'nprobe': self.nprobe,
+                        'exact_threshold': self.exact_threshold,
+                    }))
+                )
+            os.replace(index_tmp, os.path.join(directory, INDEX_FILE))
+            os.replace(meta_tmp, os.path.join(directory, META_FILE))
+        logger.info("search_index_saved", directory=directory, listings=len(self))
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_INDEX_DIR, mmap: bool = True) -> 'SemanticIndex':
+        import faiss
+
+        with np.load(os.path.join(directory, META_FILE), allow_pickle=True) as meta:
+            config = json.loads(str(meta['config']))
+            index = cls(**config)
+            index.alive = meta['alive']
+            index.asking_price = meta['asking_price']
+            index.revenue = meta['revenue']
+            index.ids = [
+                listing_id if alive else None
+                for listing_id, alive in zip(meta['ids'].tolist(), index.alive)
+            ]
+        index.label_of = {
+            listing_id: label for label, listing_id in enumerate(index.ids) if listing_id is not None
+        }
+        path = os.path.join(directory, INDEX_FILE)
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY if mmap else 0
+        index.index = faiss.read_index(path, flags)
+        index._mmapped_from = path if mmap else None
+        logger.info("search_index_loaded", directory=directory, listings=len(index), mmap=mmap)
+        return index
+
+
+class ListingSearch:
+    """Encoder plus index, the unit the API works with"""
+
+    def __init__(self, encoder: ListingEncoder, index: Optional[SemanticIndex] = None):
+        self.encoder = encoder
+        self.index = index or SemanticIndex(encoder.dimension)
+
+    def upsert(self, listings: Sequence[Dict]) -> int:
+        if not listings:
+            return 0
+        vectors = self.encoder.encode([listing_text(listing) for listing in listings])
+        return self.index.upsert(
+            [str(listing['id']) for listing in listings],
+            vectors,
+            [listing.get('askingPrice') for listing in listings],
+            [listing.get('revenue') for listing in listings]
+        )
+
+    def search(self, queries: Sequence[str], top_k: int = 10, **filters) -> List[List[SearchHit]]:
+        return self.index.search(self.encoder.encode(queries), top_k=top_k, **filters)
@@ -0,0 +1,215 @@
+"""
+KPI anomaly detection
+
+Two cheap detectors run over the whole (series, periods) panel at once, each
+comparing a value to the trailing window before it:
+
+- rolling z-score, from cumulative sums of centered values and their squares
+- rolling IQR fences, from a sort of every window along the last axis
+
+Only points in the most recent periods that either detector flags are
+escalated to a heavier per-series model: pyod's ECOD over value and
+period-over-period change, or a Prophet forecast of the flagged period from
+the history before it. Series chunks are sized so the (series, periods,
+window) IQR intermediates stay within a memory budget.
+"""
+
+import logging
+import warnings
+from typing import Dict, List, Literal, NamedTuple, Optional
+
+import numpy as np
+import structlog
+from pydantic import BaseModel, Field
+
+from app.kpi_panel import KpiPanel
+
+logger = structlog.get_logger()
+
+Escalation = Literal['none', 'pyod', 'prophet']
+
+
+class DetectorConfig(BaseModel):
+    # Trailing periods each value is compared against
+    window: int = Field(default=8, ge=2)
+    # Observed values the window needs before a point can be flagged
+    min_periods: int = Field(default=4, ge=2)
+    z_threshold: float = 3.0
+    # Tukey fence multiplier; 3.0 marks "far out" values
+    iqr_k: float = 3.0
+    # Spreads below this fraction of the series level are raised to it, so
+    # flat series don't flag every small wobble
+    min_relative_spread: float = 0.01
+    # Only flags in the last recent_periods columns are reported; None keeps all
+    recent_periods: Optional[int] = Field(default=1, ge=1)
+    memory_budget_mb: float = 256.0
+
+
+class EscalationConfig(BaseModel):
+    method: Escalation = 'pyod'
+    # Share of a series' points ECOD treats as outliers
+    contamination: float = Field(default=0.1, gt=0, le=0.5)
+    # Prophet prediction interval a value must fall outside of
+    interval_width: float = Field(default=0.99, gt=0, lt=1)
+    # Prophet fits cost about a second each; the rest stay unconfirmed
+    max_series: int = Field(default=200, ge=0)
+
+
+class Flags(NamedTuple):
+    rows: np.ndarray       # (flags,) series row in the panel
+    columns: np.ndarray    # (flags,) period column in the panel
+    zscore: np.ndarray     # (flags,)
+    iqr_score: np.ndarray  # (flags,) distance past the nearer fence, in IQRs
+
+
+def _spread_floor(spread: np.ndarray, level: np.ndarray, config: DetectorConfig) -> np.ndarray:
+    floor = np.maximum(config.min_relative_spread * np.abs(level), np.finfo(np.float64).tiny)
+    return np.where(np.isnan(spread), spread, np.maximum(spread, floor))
+
+
+def rolling_zscore(values: np.ndarray, config: DetectorConfig) -> np.ndarray:
+    """Z-score of each value against the trailing window; NaN when unscored"""
+    num_series, num_periods = values.shape
+    observed = ~np.isnan(values)
+    # Center each series first so the sum-of-squares variance doesn't cancel
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        center = np.nan_to_num(np.nanmean(values, axis=1, keepdims=True))
+    centered = np.where(observed, values - center, 0.0)
+
+    def trailing_sum(x: np.ndarray) -> np.ndarray:
+        cumulative = np.zeros((num_series, num_periods + 1))
+        np.cumsum(x, axis=1, out=cumulative[:, 1:])
+        end = np.arange(num_periods)
+        return cumulative[:, end] - cumulative[:, np.maximum(end - config.window, 0)]
+
+    count = trailing_sum(observed.astype(np.float64))
+    total = trailing_sum(centered)
+    squares = trailing_sum(centered * centered)
+    enough = count >= config.min_periods
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(enough, total / count, np.nan)
+        variance = np.maximum(squares / count - mean * mean, 0.0) * count / (count - 1)
+    std = _spread_floor(np.sqrt(variance), mean + center, config)
+    return np.where(observed, (centered - mean) / std, np.nan)
+
+
+def rolling_iqr_score(values: np.ndarray, config: DetectorConfig) -> np.ndarray:
+    """Distance of each value past its trailing window's IQR fences, in IQRs"""
+    num_series, num_periods = values.shape
+    window = config.window
+    cell_bytes = num_periods * window * 8 * 3
+    chunk = max(1, int(config.memory_budget_mb * 1024 * 1024 // max(cell_bytes, 1)))
+
+    scores = np.full(values.shape, np.nan)
+    for start in range(0, num_series, chunk):
+        block = values[start:start + chunk]
+        padded = np.hstack([np.full((len(block), window), np.nan), block])
+        # windows[:, t] covers block[:, t - window:t]; NaN sorts last
+        windows = np.sort(np.lib.stride_tricks.sliding_window_view(padded, window, axis=1)[:, :num_periods], axis=-1)
+        count = (~np.isnan(windows)).sum(axis=-1)
+
+        def quantile(q: float) -> np.ndarray:
+            position = q * np.maximum(count - 1, 0)
+            low = np.floor(position).astype(np.int64)
+            high = np.minimum(low + 1, np.maximum(count - 1, 0))
+            low_value = np.take_along_axis(windows, low[..., None], axis=-1)[..., 0]
+            high_value = np.take_along_axis(windows, high[..., None], axis=-1)[..., 0]
+            return low_value + (position - low) * (high_value - low_value)
+
+        q1, median, q3 = quantile(0.25), quantile(0.5), quantile(0.75)
+        iqr = _spread_floor(q3 - q1, median, config)
+        with np.errstate(invalid='ignore'):
+            outside = np.maximum(block - q3, q1 - block).clip(min=0.0) / iqr
+        scores[start:start + chunk] = np.where(count >= config.min_periods, outside, np.nan)
+    return scores
+
+
+def detect(panel: KpiPanel, config: DetectorConfig) -> Flags:
+    """Points either rolling detector flags, limited to the recent periods"""
+    values = panel.values
+    num_periods = values.shape[1]
+    first_column = 0 if config.recent_periods is None else max(num_periods - config.recent_periods, 0)
+
+    zscore = rolling_zscore(values, config)
+    iqr_score = rolling_iqr_score(values, config)
+    with np.errstate(invalid='ignore'):
+        flagged = (np.abs(zscore) >= config.z_threshold) | (iqr_score >= config.iqr_k)
+    flagged[:, :first_column] = False
+
+    rows, columns = np.nonzero(flagged)
+    return Flags(rows, columns, zscore[rows, columns], iqr_score[rows, columns])
+
+
+def _ecod_confirm(series: np.ndarray, columns: List[int], config: EscalationConfig) -> Dict[int, float]:
+    from pyod.models.ecod import ECOD
+
+    observed = np.flatnonzero(~np.isnan(series))
+    values = series[observed]
+    change = np.diff(values, prepend=values[0])
+    model = ECOD(contamination=config.contamination)
+    model.fit(np.column_stack([values, change]))
+    position = {column: i for i, column in enumerate(observed)}
+    # Positive when the point scores above ECOD's outlier threshold
+    return {
+        column: float(model.decision_scores_[position[column]] - model.threshold_)
+        for column in columns
+    }
+
+
+def _prophet_confirm(panel: KpiPanel, series: np.ndarray, columns: List[int], config: EscalationConfig) -> Dict[int, float]:
+    import pandas as pd
+    from prophet import Prophet
+
+    # cmdstanpy logs two INFO lines per fit and resets its level on first use
+    logging.getLogger('cmdstanpy').disabled = True
+    dates = pd.to_datetime([panel.period_start(column) for column in range(len(series))])
+    results = {}
+    for column in columns:
+        history = np.flatnonzero(~np.isnan(series[:column]))
+        if len(history) < 2:
+            continue
+        model = Prophet(interval_width=config.interval_width, weekly_seasonality=False, daily_seasonality=False)
+        model.fit(pd.DataFrame({'ds': dates[history], 'y': series[history]}))
+        forecast = model.predict(pd.DataFrame({'ds': dates[[column]]})).iloc[0]
+        value = series[column]
+        # Positive when the value falls outside the prediction interval, in interval widths
+        width = max(forecast['yhat_upper'] - forecast['yhat_lower'], np.finfo(np.float64).tiny)
+        results[column] = float(max(value - forecast['yhat_upper'], forecast['yhat_lower'] - value) / width)
+    return results
+
+
+def escalate(panel: KpiPanel, flags: Flags, config: EscalationConfig) -> np.ndarray:
+    """
+    Heavier-model score per flag: positive confirms, non-positive rejects,
+    NaN when the flag was not escalated
+    """
+    scores = np.full(len(flags.rows), np.nan)
+    if config.method == 'none' or len(flags.rows) == 0:
+        return scores
+
+    order = np.argsort(flags.rows, kind='stable')
+    groups = np.split(order, np.flatnonzero(np.diff(flags.rows[order])) + 1)
+    members_of = {int(flags.rows[group[0]]): group for group in groups}
+    series_rows = np.array(list(members_of), dtype=np.int64)
+    if len(series_rows) > config.max_series:
+        # Escalate the series with the strongest cheap-detector evidence first
+        strength = np.fmax(np.abs(flags.zscore), flags.iqr_score)
+        best = np.full(panel.values.shape[0], -np.inf)
+        np.maximum.at(best, flags.rows, np.nan_to_num(strength, nan=-np.inf))
+        series_rows = series_rows[np.argsort(-best[series_rows], kind='stable')[:config.max_series]]
+
+    for row in series_rows:
+        members = members_of[int(row)]
+        columns = [int(column) for column in flags.columns[members]]
+        try:
+            if config.method == 'pyod':
+                confirmed = _ecod_confirm(panel.values[row], columns, config)
+            else:
+                confirmed = _prophet_confirm(panel, panel.values[row], columns, config)
+        except Exception as e:
+            logger.error("anomaly_escalation_error", series=panel.keys[row], error=str(e))
+            continue
+        for member, column in zip(members, columns):
+            scores[member] = confirmed.get(column, np.nan)
+    return scores
@@ -0,0 +1,411 @@
+"""
+Covenant compliance over KPI histories
+
+Covenant tests ("net_debt / ttm(ebitda) <= 3.5") and derived-KPI
+calculation methods ("gross_profit / revenue") are parsed once into Python
+code objects. Parsing walks the AST against a whitelist: numbers, KPI
+codes, arithmetic, a handful of rolling functions and, for covenants, one
+comparison. KPI codes then evaluate to (entities, periods) arrays, so one
+evaluation of a compiled formula covers every entity and period at once.
+
+Breaches in the most recent periods become covenant_review work items; an
+open item for the same covenant, entity and period is not duplicated.
+"""
+
+import ast
+import json
+from functools import lru_cache
+from typing import Callable, Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+from pydantic import BaseModel
+
+from app.db import get_client
+from app.kpi_panel import KpiPanel
+
+logger = structlog.get_logger()
+
+# Values of the priority enum in the catalog schema
+Priority = Literal['low', 'medium', 'high', 'urgent']
+
+_PERIODS_PER_YEAR = {'month': 12, 'quarter': 4}
+
+_COMPARISONS: Dict[type, Tuple[str, Callable]] = {
+    ast.Lt: ('<', np.less),
+    ast.LtE: ('<=', np.less_equal),
+    ast.Gt: ('>', np.greater),
+    ast.GtE: ('>=', np.greater_equal),
+}
+_COMPARE_BY_SYMBOL = dict(_COMPARISONS.values())
+
+MAX_FORMULA_LENGTH = 2000
+
+_BINARY_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Pow)
+_UNARY_OPS = (ast.UAdd, ast.USub)
+
+# Function name -> number of trailing integer window arguments it accepts
+_FUNCTION_WINDOWS = {
+    'abs': 0,
+    'min': 0,
+    'max': 0,
+    'ttm': 0,
+    'lag': 1,
+    'rolling_sum': 1,
+    'rolling_avg': 1,
+}
+
+
+class FormulaError(ValueError):
+    pass
+
+
+class KpiDefinition(BaseModel):
+    id: str
+    code: str
+    # kpis.calculation_method; empty for KPIs that are reported, not derived
+    calculation_method: Optional[str] = None
+
+
+class Covenant(BaseModel):
+    id: str
+    name: str
+    # One comparison, e.g. "net_debt / ttm(ebitda) <= 3.5"
+    formula: str
+    # Entities the covenant applies to; None applies it to every entity
+    entity_ids: Optional[List[str]] = None
+    priority: Priority = 'high'
+
+
+class CompiledFormula(NamedTuple):
+    text: str
+    kpis: Tuple[str, ...]
+    metric: object               # code object for the left-hand side
+    limit: Optional[object]      # code object for the right-hand side
+    operator: Optional[str]
+
+
+class KpiCube(NamedTuple):
+    entities: List[Tuple[str, str]]  # (entity_id, entity_type)
+    arrays: Dict[str, np.ndarray]    # KPI code -> (entities, periods)
+    panel: KpiPanel
+
+
+class CovenantEvaluation(NamedTuple):
+    metric: np.ndarray  # (entities, periods)
+    limit: np.ndarray   # (entities, periods)
+    passed: np.ndarray  # (entities, periods) bool
+    tested: np.ndarray  # (entities, periods) bool, False where inputs are missing
+
+
+class _Compiler(ast.NodeTransformer):
+    """Rejects anything off the whitelist and routes calls to the function table"""
+
+    def __init__(self):
+        self.kpis: List[str] = []
+
+    def generic_visit(self, node):
+        raise FormulaError(f"Unsupported syntax: {type(node).__name__}")
+
+    def visit_Expression(self, node):
+        node.body = self.visit(node.body)
+        return node
+
+    def visit_Constant(self, node):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise FormulaError(f"Unsupported constant: {node.value!r}")
+        # Floats only: integer arithmetic like 7**7**8 never overflows, it
+        # just grows without bound
+        try:
+            return ast.copy_location(ast.Constant(value=float(node.value)), node)
+        except OverflowError:
+            raise FormulaError(f"Constant out of range: {node.value}") from None
+
+    def visit_Name(self, node):
+        if node.id.startswith('__'):
+            raise FormulaError(f"Invalid KPI code: {node.id}")
+        if node.id not in self.kpis:
+            self.kpis.append(node.id)
+        return ast.copy_location(ast.Name(id=node.id, ctx=ast.Load()), node)
+
+    def visit_BinOp(self, node):
+        if not isinstance(node.op, _BINARY_OPS):
+            raise FormulaError(f"Unsupported operator: {type(node.op).__name__}")
+        node.left, node.right = self.visit(node.left), self.visit(node.right)
+        if isinstance(node.op, ast.Pow):
+            # np.power overflows to inf where float ** raises
+            return ast.copy_location(
+                ast.Call(func=ast.Name(id='__fn_pow', ctx=ast.Load()), args=[node.left, node.right], keywords=[]),
+                node
+            )
+        return node
+
+    def visit_UnaryOp(self, node):
+        if not isinstance(node.op, _UNARY_OPS):
+            raise FormulaError(f"Unsupported operator: {type(node.op).__name__}")
+        node.operand = self.visit(node.operand)
+        return node
+
+    def visit_Call(self, node):
+        if not isinstance(node.func, ast.Name) or node.keywords:
+            raise FormulaError("Only plain function calls with positional arguments are supported")
+        name = node.func.id
+        # kpi('net-debt') references a code that isn't a valid identifier
+        if name == 'kpi':
+            if len(node.args) != 1 or not isinstance(node.args[0], ast.Constant) or not isinstance(node.args[0].value, str):
+                raise FormulaError("kpi() takes one KPI code string")
+            return self.visit_Name(ast.copy_location(ast.Name(id=node.args[0].value, ctx=ast.Load()), node))
+        if name not in _FUNCTION_WINDOWS:
+            raise FormulaError(f"Unknown function: {name}")
+
+        windows = _FUNCTION_WINDOWS[name]
+        values = node.args[:len(node.args) - windows] if windows else node.args
+        window_args = node.args[len(values):]
+        if not values or (name not in ('min', 'max') and len(values) != 1):
+            raise FormulaError(f"Wrong number of arguments to {name}()")
+        for arg in window_args:
+            if not isinstance(arg, ast.Constant) or isinstance(arg.value, bool) or not isinstance(arg.value, int) or arg.value < 1:
+                raise FormulaError(f"{name}() window must be a positive integer")
+        node.func = ast.copy_location(ast.Name(id=f'__fn_{name}', ctx=ast.Load()), node.func)
+        node.args = [self.visit(arg) for arg in values] + window_args
+        return node
+
+
+def _compile_expression(node: ast.expr, text: str, compiler: _Compiler):
+    expression = ast.fix_missing_locations(compiler.visit(ast.Expression(body=node)))
+    return compile(expression, f'<formula: {text}>', 'eval')
+
+
+@lru_cache(maxsize=4096)
+def compile_formula(text: str, comparison: bool = False) -> CompiledFormula:
+    """
+    Parse and compile a formula once; comparison=True requires a covenant
+    test "<metric> <op> <limit>", otherwise a plain numeric expression
+    """
+    if len(text) > MAX_FORMULA_LENGTH:
+        raise FormulaError(f"Formula longer than {MAX_FORMULA_LENGTH} characters")
+    try:
+        return _compile_formula(text, comparison)
+    except (RecursionError, MemoryError):
+        # Deep nesting within the length limit still exhausts the parser or compiler
+        raise FormulaError(f"Formula nested too deeply: {text[:50]!r}...") from None
+
+
+def _compile_formula(text: str, comparison: bool) -> CompiledFormula:
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        raise FormulaError(f"Invalid formula {text!r}: {e.msg}") from None
+
+    compiler = _Compiler()
+    body = tree.body
+    if isinstance(body, ast.Compare):
+        if not comparison:
+            raise FormulaError(f"Comparison not allowed in a calculation: {text!r}")
+        if len(body.ops) != 1 or type(body.ops[0]) not in _COMPARISONS:
+            raise FormulaError(f"Covenant must be a single <, <=, > or >= comparison: {text!r}")
+        return CompiledFormula(
+            text=text,
+            metric=_compile_expression(body.left, text, compiler),
+            limit=_compile_expression(body.comparators[0], text, compiler),
+            operator=_COMPARISONS[type(body.ops[0])][0],
+            kpis=tuple(compiler.kpis)
+        )
+    if comparison:
+        raise FormulaError(f"Covenant must compare a metric to a limit: {text!r}")
+    return CompiledFormula(
+        text=text, metric=_compile_expression(body, text, compiler), limit=None, operator=None, kpis=tuple(compiler.kpis)
+    )
+
+
+def _rolling_sum(x: np.ndarray, window: int) -> np.ndarray:
+    """Trailing sum over window periods; NaN unless every period is present"""
+    x = np.broadcast_to(x, np.broadcast_shapes(np.shape(x), (1, 1))).astype(np.float64)
+    missing = np.isnan(x)
+    cumulative = np.zeros(x.shape[:-1] + (x.shape[-1] + 1,))
+    np.cumsum(np.where(missing, 0.0, x), axis=-1, out=cumulative[..., 1:])
+    gaps = np.zeros_like(cumulative)
+    np.cumsum(missing, axis=-1, out=gaps[..., 1:])
+    end = np.arange(1, x.shape[-1] + 1)
+    start = end - window
+    valid = start >= 0
+    start = np.maximum(start, 0)
+    total = cumulative[..., end] - cumulative[..., start]
+    complete = (gaps[..., end] - gaps[..., start] == 0) & valid
+    return np.where(complete, total, np.nan)
+
+
+def _lag(x: np.ndarray, periods: int = 1) -> np.ndarray:
+    x = np.broadcast_to(x, np.broadcast_shapes(np.shape(x), (1, 1))).astype(np.float64)
+    shifted = np.full(x.shape, np.nan)
+    if periods < x.shape[-1]:
+        shifted[..., periods:] = x[..., :-periods]
+    return shifted
+
+
+def _functions(freq: str) -> Dict[str, Callable]:
+    per_year = _PERIODS_PER_YEAR[freq]
+    return {
+        '__fn_abs': np.abs,
+        '__fn_pow': np.power,
+        '__fn_min': lambda *args: np.minimum.reduce(np.broadcast_arrays(*args)),
+        '__fn_max': lambda *args: np.maximum.reduce(np.broadcast_arrays(*args)),
+        '__fn_ttm': lambda x: _rolling_sum(x, per_year),
+        '__fn_lag': _lag,
+        '__fn_rolling_sum': _rolling_sum,
+        '__fn_rolling_avg': lambda x, window: _rolling_sum(x, window) / window,
+    }
+
+
+def evaluate(code, cube: KpiCube) -> np.ndarray:
+    """(entities, periods) result of one compiled expression"""
+    shape = (len(cube.entities), cube.panel.values.shape[1])
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        result = eval(code, {'__builtins__': {}, **_functions(cube.panel.freq)}, cube.arrays)
+    return np.broadcast_to(np.asarray(result, dtype=np.float64), shape)
+
+
+def build_cube(panel: KpiPanel, codes_by_id: Optional[Dict[str, str]] = None) -> KpiCube:
+    """
+    Regroup a panel's (entity, KPI) rows into one (entities, periods) array
+    per KPI code; ids without a code are used as the code
+    """
+    codes_by_id = codes_by_id or {}
+    entity_rows: Dict[Tuple[str, str], int] = {}
+    entity_index = np.array([
+        entity_rows.setdefault((key.entity_id, key.entity_type), len(entity_rows)) for key in panel.keys
+    ], dtype=np.int64)
+    codes = [codes_by_id.get(key.kpi_id, key.kpi_id) for key in panel.keys]
+
+    num_periods = panel.values.shape[1]
+    arrays: Dict[str, np.ndarray] = {}
+    for code in dict.fromkeys(codes):
+        arrays[code] = np.full((len(entity_rows), num_periods), np.nan)
+    for row, code in enumerate(codes):
+        arrays[code][entity_index[row]] = panel.values[row]
+    return KpiCube(list(entity_rows), arrays, panel)
+
+
+def add_derived_kpis(cube: KpiCube, definitions: Sequence[KpiDefinition], strict: bool = True) -> List[str]:
+    """
+    Evaluate calculation methods into the cube, dependencies first; reported
+    values win where both exist. Returns the codes that were derived.
+
+    kpis.calculation_method is free text, so with strict=False a method that
+    isn't a formula (e.g. "Revenue less COGS") is skipped and its KPI stays
+    reported-only instead of failing the whole batch.
+    """
+    formulas = {}
+    for definition in definitions:
+        if not definition.calculation_method or not definition.calculation_method.strip():
+            continue
+        try:
+            formula = compile_formula(definition.calculation_method)
+        except FormulaError as e:
+            if strict:
+                raise
+            logger.warning("kpi_calculation_skipped", kpi=definition.code, error=str(e))
+            continue
+        # "a = a * 2" can't be derived from itself; treat a as reported
+        if definition.code in formula.kpis:
+            logger.warning("kpi_calculation_self_reference", kpi=definition.code)
+            continue
+        formulas[definition.code] = formula
+    shape = (len(cube.entities), cube.panel.values.shape[1])
+    derived, visiting = [], set()
+
+    def resolve(code: str) -> None:
+        if code in derived or code not in formulas:
+            return
+        if code in visiting:
+            raise FormulaError(f"Circular KPI calculation involving {code}")
+        visiting.add(code)
+        for dependency in formulas[code].kpis:
+            resolve(dependency)
+        visiting.discard(code)
+        missing = [name for name in formulas[code].kpis if name not in cube.arrays]
+        computed = (
+            np.full(shape, np.nan) if missing else evaluate(formulas[code].metric, cube)
+        )
+        reported = cube.arrays.get(code)
+        cube.arrays[code] = computed.copy() if reported is None else np.where(np.isnan(reported), computed, reported)
+        derived.append(code)
+
+    for code in formulas:
+        resolve(code)
+    return derived
+
+
+def evaluate_covenant(covenant: Covenant, cube: KpiCube) -> CovenantEvaluation:
+    formula = compile_formula(covenant.formula, comparison=True)
+    shape = (len(cube.entities), cube.panel.values.shape[1])
+    if any(code not in cube.arrays for code in formula.kpis):
+        nan = np.full(shape, np.nan)
+        return CovenantEvaluation(nan, nan, np.zeros(shape, dtype=bool), np.zeros(shape, dtype=bool))
+
+    metric = evaluate(formula.metric, cube)
+    limit = evaluate(formula.limit, cube)
+    tested = ~np.isnan(metric) & ~np.isnan(limit)
+    if covenant.entity_ids is not None:
+        applies = set(covenant.entity_ids)
+        tested &= np.array([entity_id in applies for entity_id, _ in cube.entities], dtype=bool)[:, None]
+    with np.errstate(invalid='ignore'):
+        passed = _COMPARE_BY_SYMBOL[formula.operator](metric, limit) & tested
+    return CovenantEvaluation(metric, limit, passed, tested)
+
+
+def headroom(metric: np.ndarray, limit: np.ndarray, operator: str) -> np.ndarray:
+    """
+    Distance from the limit as a fraction of it; negative when breached and
+    NaN where undefined (a zero limit or an infinite metric)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        room = (limit - metric) if operator in ('<', '<=') else (metric - limit)
+        room = room / np.abs(limit)
+    return np.where(np.isfinite(room), room, np.nan)
+
+
+class PostgresWorkItemWriter:
+    """Raises covenant_review work items in bulk"""
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.db = get_client(dsn)
+
+    def write(self, tenant_id: str, items: Sequence[Dict]) -> int:
+        """Insert items, skipping any with an open twin; returns rows inserted"""
+        from psycopg2.extras import execute_values
+
+        rows = [
+            (tenant_id, item['title'], item['description'], item['priority'],
+             item['entity_id'], item['entity_type'], json.dumps(item['metadata']))
+            for item in items
+        ]
+        if not rows:
+            return 0
+        inserted = 0
+        with self.db.transaction() as conn, conn.cursor() as cur:
+            # One statement per page; each page is checked against open items
+            for start in range(0, len(rows), 1000):
+                execute_values(
+                    cur,
+                    """
+                    INSERT INTO work_items
+                        (tenant_id, type, title, description, priority, related_entity_id, related_entity_type, metadata)
+                    SELECT v.tenant_id::uuid, 'covenant_review', v.title, v.description, v.priority::priority,
+                           v.entity_id::uuid, v.entity_type, v.metadata::jsonb
+                    FROM (VALUES %s) AS v(tenant_id, title, description, priority, entity_id, entity_type, metadata)
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM work_items w
+                        WHERE w.type = 'covenant_review'
+                          AND w.status NOT IN ('completed', 'cancelled')
+                          AND w.related_entity_id = v.entity_id::uuid
+                          AND w.metadata->>'covenant_id' = v.metadata::jsonb->>'covenant_id'
+                          AND w.metadata->>'period' = v.metadata::jsonb->>'period'
+                    )
+                    """,
+                    rows[start:start + 1000],
+                    page_size=1000
+                )
+                inserted += cur.rowcount
+        logger.info("covenant_work_items_written", candidates=len(rows), inserted=inserted)
+        return inserted
@@ -0,0 +1,96 @@
+"""
+Postgres access shared by the svc-ai-risk readers and writers
+
+Sync endpoints run in FastAPI's threadpool, so concurrent requests must not
+share one connection. Every call checks a connection out of a per-DSN pool
+for one transaction and returns it afterwards; callers beyond the pool size
+wait for a free connection.
+"""
+
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import structlog
+
+logger = structlog.get_logger()
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '4'))
+
+
+def default_dsn() -> str:
+    return (
+        f"host={os.getenv('DB_HOST', 'localhost')} "
+        f"port={os.getenv('DB_PORT', '5432')} "
+        f"dbname={os.getenv('DB_NAME', 'acquismart')} "
+        f"user={os.getenv('DB_USER', 'acquismart')} "
+        f"password={os.getenv('DB_PASSWORD', 'changeme')}"
+    )
+
+
+class PostgresClient:
+    """Connection pool opened on first use, handing out one transaction at a time"""
+
+    def __init__(self, dsn: Optional[str] = None, pool_size: int = POOL_SIZE):
+        import psycopg2
+
+        self.dsn = dsn or default_dsn()
+        self.pool_size = pool_size
+        self._psycopg2 = psycopg2
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+
+                self._pool = ThreadedConnectionPool(0, self.pool_size, self.dsn)
+            return self._pool
+
+    @contextmanager
+    def transaction(self) -> Iterator[Any]:
+        """A pooled connection, committed on success and rolled back on error"""
+        with self._slots:
+            pool = self._get_pool()
+            conn = pool.getconn()
+            broken = False
+            try:
+                with conn:
+                    yield conn
+            except Exception:
+                # Don't hand a connection in an unknown state to the next caller
+                broken = True
+                raise
+            finally:
+                pool.putconn(conn, close=broken or bool(conn.closed))
+
+    def fetch_all(self, query: str, params: Sequence[Any] = (), itersize: int = 50_000) -> List[tuple]:
+        """
+        Rows of a large query through a server-side cursor
+
+        Rows arrive itersize at a time, so only the returned list grows with
+        the result; a client-side cursor would also hold all of it in libpq.
+        Each call declares its own cursor, so names never clash.
+        """
+        with self.transaction() as conn:
+            with conn.cursor(name=f"risk_{uuid.uuid4().hex}") as cur:
+                cur.itersize = itersize
+                cur.execute(query, params)
+                return list(cur)
+
+
+_clients: Dict[str, PostgresClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(dsn: Optional[str] = None) -> PostgresClient:
+    """The process-wide client for dsn (default: the DB_* environment)"""
+    dsn = dsn or default_dsn()
+    with _clients_lock:
+        if dsn not in _clients:
+            _clients[dsn] = PostgresClient(dsn)
+        return _clients[dsn]
@@ -0,0 +1,351 @@
+"""
+Batch KPI forecasting across a process pool
+
+Every series in a KPI panel is forecast with Prophet or auto-ARIMA. Fits are
+fanned out to a pool of worker processes, each of which imports the model
+libraries once and fits one series at a time, so thousands of series per
+tenant keep every core busy.
+
+A forecast depends only on the series' observed values, where they start,
+and the model settings, so results are cached under a hash of exactly that.
+A series whose data hasn't changed since the last batch skips the fit; only
+series with new or corrected points are refit. Every forecast in the batch,
+cached or refit, is written back to kpi_forecasts in one bulk upsert.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+from pydantic import BaseModel, Field
+
+from app.db import get_client
+from app.kpi_panel import KpiPanel, SeriesKey
+
+logger = structlog.get_logger()
+
+DEFAULT_CACHE_DIR = os.getenv('FORECAST_CACHE_DIR', 'data')
+CACHE_FILE = 'forecast_cache.npz'
+
+ForecastMethod = Literal['prophet', 'arima']
+
+_SEASONAL_PERIODS = {'month': 12, 'quarter': 4}
+
+# Part of every series hash; bump it when fitting changes so cached results are refit
+FIT_VERSION = '2'
+
+
+class ForecastConfig(BaseModel):
+    method: ForecastMethod = 'prophet'
+    # Periods forecast past each series' last observation
+    horizon: int = Field(default=4, ge=1, le=60)
+    interval_width: float = Field(default=0.8, gt=0, lt=1)
+    # Series with fewer observed values are skipped
+    min_observations: int = Field(default=6, ge=3)
+
+
+class SeriesForecast(NamedTuple):
+    key: SeriesKey
+    series_hash: str
+    periods: List[date]
+    forecast: np.ndarray  # (horizon, 3) value, lower, upper
+    cached: bool
+
+
+class FitTask(NamedTuple):
+    series_hash: str
+    method: ForecastMethod
+    seasonal_period: int
+    interval_width: float
+    dates: np.ndarray    # datetime64[D] period starts of the observed values
+    values: np.ndarray
+    observed: np.ndarray  # bool, which periods of the span have a value
+    future: np.ndarray   # datetime64[D] period starts to forecast
+
+
+def series_hash(values: np.ndarray, first_period: int, freq: str, config: ForecastConfig) -> str:
+    """Hash of one series' observed span and the settings that shape its forecast"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f'{FIT_VERSION}|{config.method}|{config.horizon}|{config.interval_width}|{freq}|{first_period}|'.encode())
+    digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def _fit_prophet(task: FitTask) -> np.ndarray:
+    import pandas as pd
+    from prophet import Prophet
+
+    model = Prophet(interval_width=task.interval_width, weekly_seasonality=False, daily_seasonality=False)
+    model.fit(pd.DataFrame({'ds': pd.to_datetime(task.dates[task.observed]), 'y': task.values[task.observed]}))
+    forecast = model.predict(pd.DataFrame({'ds': pd.to_datetime(task.future)}))
+    return forecast[['yhat', 'yhat_lower', 'yhat_upper']].to_numpy(dtype=np.float64)
+
+
+def _fit_arima(task: FitTask) -> np.ndarray:
+    import pmdarima as pm
+
+    # ARIMA needs an evenly spaced series; interior gaps are interpolated
+    positions = np.arange(len(task.values))
+    values = np.interp(positions, positions[task.observed], task.values[task.observed])
+    seasonal = len(values) >= 2 * task.seasonal_period
+    model = pm.auto_arima(
+        values,
+        seasonal=seasonal,
+        m=task.seasonal_period if seasonal else 1,
+        # The default OCSB test fails outright on a few years of quarterly data
+        seasonal_test='ch',
+        # A few years of KPI history can't support higher orders, and the
+        # smaller search space cuts fit time several-fold
+        max_p=2,
+        max_q=2,
+        max_P=1,
+        max_Q=1,
+        suppress_warnings=True,
+        error_action='ignore'
+    )
+    forecast, interval = model.predict(n_periods=len(task.future), return_conf_int=True, alpha=1.0 - task.interval_width)
+    return np.column_stack([forecast, interval])
+
+
+def _init_worker() -> None:
+    # cmdstanpy logs two INFO lines per fit and resets its level on first use
+    logging.getLogger('cmdstanpy').disabled = True
+
+
+def _fit_series(task: FitTask) -> Tuple[str, Optional[np.ndarray], Optional[str]]:
+    observed = task.values[task.observed]
+    if np.ptp(observed) == 0:
+        # auto_arima picks ARIMA(0,0,0) without an intercept for a flat
+        # series and forecasts 0, so a constant stays constant without a fit
+        return task.series_hash, np.full((len(task.future), 3), observed[0], dtype=np.float64), None
+    try:
+        fit = _fit_prophet if task.method == 'prophet' else _fit_arima
+        with warnings.catch_warnings():
+            # Convergence warnings on short series would flood the worker logs
+            warnings.simplefilter('ignore')
+            return task.series_hash, fit(task), None
+    except Exception as e:
+        return task.series_hash, None, str(e)
+
+
+class ForecastCache:
+    """Forecasts by series hash, least recently used evicted first"""
+
+    def __init__(self, max_entries: int = 200_000):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[str, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            forecast = self._entries.get(key)
+            if forecast is not None:
+                self._entries.move_to_end(key)
+            return forecast
+
+    def put(self, key: str, forecast: np.ndarray) -> None:
+        with self._lock:
+            self._entries[key] = forecast
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self, directory: str = DEFAULT_CACHE_DIR) -> None:
+        """Write the cache to one file, replaced atomically"""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            keys = list(self._entries)
+            forecasts = list(self._entries.values())
+        lengths = np.array([len(forecast) for forecast in forecasts], dtype=np.int64)
+        # Concurrent batches may save at once, so each writes its own temp file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=CACHE_FILE + '.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(
+                    f,
+                    keys=np.array(keys, dtype='U32'),
+                    lengths=lengths,
+                    forecasts=np.concatenate(forecasts) if forecasts else np.zeros((0, 3))
+                )
+            os.replace(tmp_path, os.path.join(directory, CACHE_FILE))
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        logger.info("forecast_cache_saved", directory=directory, entries=len(keys))
+
+    @classmethod
+    def load(cls, directory: str = DEFAULT_CACHE_DIR, max_entries: int = 200_000) -> 'ForecastCache':
+        cache = cls(max_entries)
+        with np.load(os.path.join(directory, CACHE_FILE)) as data:
+            offsets = np.concatenate([[0], np.cumsum(data['lengths'])])
+            forecasts = data['forecasts']
+            for i, key in enumerate(data['keys']):
+                cache.put(str(key), forecasts[offsets[i]:offsets[i + 1]])
+        logger.info("forecast_cache_loaded", directory=directory, entries=len(cache))
+        return cache
+
+
+class Forecaster:
+    """
+    Batch forecaster with an optional pool of worker processes
+
+    workers=0 fits in the calling process.
+    """
+
+    def __init__(self, workers: int = 0, cache: Optional[ForecastCache] = None):
+        self.workers = workers
+        self.cache = cache if cache is not None else ForecastCache()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        if workers > 0:
+            # Spawned, not forked: the API process has threads (and possibly
+            # held locks) that a forked worker would inherit mid-flight
+            self._executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+        else:
+            _init_worker()
+
+    def _tasks(self, panel: KpiPanel, config: ForecastConfig) -> Tuple[List[Tuple[int, FitTask]], int]:
+        """(row, task) per forecastable series, and how many were too short"""
+        values = panel.values
+        observed = ~np.isnan(values)
+        counts = observed.sum(axis=1)
+        period_starts = np.array(
+            [panel.period_start(column) for column in range(values.shape[1] + config.horizon)],
+            dtype='datetime64[D]'
+        )
+
+        tasks = []
+        for row in np.flatnonzero(counts >= config.min_observations):
+            columns = np.flatnonzero(observed[row])
+            first, last = columns[0], columns[-1] + 1
+            span = values[row, first:last]
+            tasks.append((int(row), FitTask(
+                series_hash=series_hash(span, panel.first_period + first, panel.freq, config),
+                method=config.method,
+                seasonal_period=_SEASONAL_PERIODS[panel.freq],
+                interval_width=config.interval_width,
+                dates=period_starts[first:last],
+                values=span,
+                observed=observed[row, first:last],
+                future=period_starts[last:last + config.horizon]
+            )))
+        return tasks, int((counts < config.min_observations).sum())
+
+    def _fit(self, tasks: List[FitTask]) -> List[Tuple[str, Optional[np.ndarray], Optional[str]]]:
+        if self._executor is None:
+            return [_fit_series(task) for task in tasks]
+        # A few chunks per worker keeps the pool balanced when fit times vary
+        chunksize = max(1, len(tasks) // (self.workers * 4))
+        return list(self._executor.map(_fit_series, tasks, chunksize=chunksize))
+
+    def forecast(self, panel: KpiPanel, config: ForecastConfig) -> Tuple[List[SeriesForecast], Dict[str, float]]:
+        """Forecasts for every series with enough history, plus batch stats"""
+        start = time.perf_counter()
+        tasks, too_short = self._tasks(panel, config)
+
+        cached = {}
+        pending: Dict[str, FitTask] = {}
+        for _, task in tasks:
+            forecast = self.cache.get(task.series_hash)
+            if forecast is not None:
+                cached[task.series_hash] = forecast
+            else:
+                # Identical series (e.g. a KPI copied across entities) fit once
+                pending.setdefault(task.series_hash, task)
+
+        fitted, failed = {}, 0
+        for key, forecast, error in self._fit(list(pending.values())):
+            if forecast is None:
+                failed += 1
+                logger.error("forecast_fit_error", series_hash=key, error=error)
+                continue
+            fitted[key] = forecast
+            self.cache.put(key, forecast)
+
+        results = []
+        for row, task in tasks:
+            forecast = cached.get(task.series_hash)
+            was_cached = forecast is not None
+            if forecast is None:
+                forecast = fitted.get(task.series_hash)
+            if forecast is None:
+                continue
+            results.append(SeriesForecast(
+                key=panel.keys[row],
+                series_hash=task.series_hash,
+                periods=[day.item() for day in task.future],
+                forecast=forecast,
+                cached=was_cached
+            ))
+
+        stats = {
+            'series': len(panel.keys),
+            'forecast': len(results),
+            'cached': sum(1 for _, task in tasks if task.series_hash in cached),
+            'fitted': len(fitted),
+            'failed': failed,
+            'too_short': too_short,
+            'seconds': time.perf_counter() - start,
+        }
+        logger.info("forecast_batch_complete", method=config.method, **stats)
+        return results, stats
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+class PostgresForecastWriter:
+    """Bulk upserts into kpi_forecasts"""
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.db = get_client(dsn)
+
+    def write(self, tenant_id: str, method: ForecastMethod, forecasts: Sequence[SeriesForecast]) -> int:
+        from psycopg2.extras import execute_values
+
+        rows = [
+            (tenant_id, forecast.key.kpi_id, forecast.key.entity_id, forecast.key.entity_type,
+             period, float(value), float(lower), float(upper), method, forecast.series_hash)
+            for forecast in forecasts
+            for period, (value, lower, upper) in zip(forecast.periods, forecast.forecast)
+        ]
+        if not rows:
+            return 0
+        with self.db.transaction() as conn, conn.cursor() as cur:
+            execute_values(
+                cur,
+                """
+                INSERT INTO kpi_forecasts
+                    (tenant_id, kpi_id, entity_id, entity_type, date, value, lower_bound, upper_bound, model, series_hash)
+                VALUES %s
+                ON CONFLICT (kpi_id, entity_id, date, model) DO UPDATE SET
+                    value = EXCLUDED.value,
+                    lower_bound = EXCLUDED.lower_bound,
+                    upper_bound = EXCLUDED.upper_bound,
+                    series_hash = EXCLUDED.series_hash,
+                    created_at = CURRENT_TIMESTAMP
+                """,
+                rows,
+                page_size=5000
+            )
+        logger.info("kpi_forecasts_written", rows=len(rows))
+        return len(rows)
@@ -0,0 +1,140 @@
+"""
+KPI histories as dense arrays
+
+kpi_values rows are pivoted into one (series, periods) float array, where a
+series is one (entity, KPI) pair and periods are calendar months or
+quarters between the earliest and latest date. Periods with no value are
+NaN; when a period has several values the latest date wins. Detectors and
+forecasters then work across every series at once instead of per row.
+"""
+
+from datetime import date
+from typing import Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+from pydantic import BaseModel
+
+from app.db import get_client
+logger = structlog.get_logger()
+
+Frequency = Literal['month', 'quarter']
+
+_MONTHS_PER_PERIOD = {'month': 1, 'quarter': 3}
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+class KpiValue(BaseModel):
+    kpi_id: str
+    entity_id: str
+    entity_type: str = 'portfolio_company'
+    date: date
+    value: Optional[float] = None
+
+
+class SeriesKey(NamedTuple):
+    entity_id: str
+    entity_type: str
+    kpi_id: str
+
+
+class KpiPanel(NamedTuple):
+    keys: List[SeriesKey]
+    values: np.ndarray  # (series, periods), NaN where missing
+    first_period: int   # periods since 1970-01 of column 0
+    freq: Frequency
+
+    def period_start(self, column: int) -> date:
+        month = (self.first_period + column) * _MONTHS_PER_PERIOD[self.freq]
+        return date(1970 + month // 12, month % 12 + 1, 1)
+
+    def period_index(self, day: date) -> int:
+        """Column of the period containing day (may fall outside the panel)"""
+        return int(_periods(np.array([day], dtype='datetime64[D]'), self.freq)[0]) - self.first_period
+
+
+def _periods(days: np.ndarray, freq: Frequency) -> np.ndarray:
+    """Periods since 1970-01 for an array of datetime64 days"""
+    return days.astype('datetime64[M]').astype(np.int64) // _MONTHS_PER_PERIOD[freq]
+
+
+def build_panel(
+    rows: Sequence[Tuple[str, str, str, date, Optional[float]]],
+    freq: Frequency = 'quarter'
+) -> KpiPanel:
+    """Panel from (kpi_id, entity_id, entity_type, date, value) rows"""
+    if not rows:
+        return KpiPanel([], np.zeros((0, 0)), 0, freq)
+
+    series_codes: Dict[Tuple[str, str, str], int] = {}
+    codes = np.fromiter(
+        (series_codes.setdefault((entity_id, entity_type, kpi_id), len(series_codes))
+         for kpi_id, entity_id, entity_type, _, _ in rows),
+        dtype=np.int64,
+        count=len(rows)
+    )
+    # Ordinals convert far faster than date objects through np.array
+    days = (
+        np.fromiter((row[3].toordinal() for row in rows), dtype=np.int64, count=len(rows)) - _EPOCH_ORDINAL
+    ).astype('datetime64[D]')
+    values = np.fromiter((np.nan if row[4] is None else row[4] for row in rows), dtype=np.float64, count=len(rows))
+
+    periods = _periods(days, freq)
+    first_period = int(periods.min())
+    num_periods = int(periods.max()) - first_period + 1
+    cells = codes * num_periods + (periods - first_period)
+
+    # Latest date per cell wins: sort by date, then keep each cell's last row
+    order = np.argsort(days, kind='stable')[::-1]
+    cells, first = np.unique(cells[order], return_index=True)
+    panel = np.full(len(series_codes) * num_periods, np.nan)
+    panel[cells] = values[order][first]
+
+    logger.info("kpi_panel_built", rows=len(rows), series=len(series_codes), periods=num_periods, freq=freq)
+    return KpiPanel([SeriesKey(*key) for key in series_codes], panel.reshape(len(series_codes), num_periods), first_period, freq)
+
+
+def rows_from_values(values: Sequence[KpiValue]) -> List[Tuple[str, str, str, date, Optional[float]]]:
+    return [(value.kpi_id, value.entity_id, value.entity_type, value.date, value.value) for value in values]
+
+
+class PostgresKpiSource:
+    """Reads kpi_values histories"""
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.db = get_client(dsn)
+
+    def fetch(
+        self,
+        tenant_id: Optional[str] = None,
+        kpi_ids: Optional[Sequence[str]] = None,
+        entity_ids: Optional[Sequence[str]] = None
+    ) -> List[Tuple[str, str, str, date, Optional[float]]]:
+        conditions, params = [], []
+        if tenant_id is not None:
+            conditions.append("tenant_id = %s")
+            params.append(tenant_id)
+        if kpi_ids:
+            conditions.append("kpi_id = ANY(%s::uuid[])")
+            params.append(list(kpi_ids))
+        if entity_ids:
+            conditions.append("entity_id = ANY(%s::uuid[])")
+            params.append(list(entity_ids))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return self.db.fetch_all(
+            f"""
+            SELECT kpi_id::text, entity_id::text, entity_type, date, value::float
+            FROM kpi_values
+            {where}
+            """,
+            params
+        )
+
+    def fetch_definitions(self, tenant_id: Optional[str] = None) -> List[Tuple[str, str, Optional[str]]]:
+        """(id, code, calculation_method) for every KPI"""
+        with self.db.transaction() as conn, conn.cursor() as cur:
+            if tenant_id is None:
+                cur.execute("SELECT id::text, code, calculation_method FROM kpis")
+            else:
+                cur.execute("SELECT id::text, code, calculation_method FROM kpis WHERE tenant_id = %s", (tenant_id,))
+            return cur.fetchall()
@@ -0,0 +1,512 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict
+import os
+import threading
+import time
+import numpy as np
+import structlog
+from datetime import date, datetime
+
+from app.anomaly import DetectorConfig, EscalationConfig, detect, escalate
+from app.covenants import (
+    Covenant, FormulaError, KpiDefinition, PostgresWorkItemWriter,
+    add_derived_kpis, build_cube, compile_formula, evaluate_covenant, headroom,
+)
+from app.forecasting import (
+    CACHE_FILE, DEFAULT_CACHE_DIR, ForecastCache, ForecastConfig, Forecaster, PostgresForecastWriter,
+)
+from app.kpi_panel import Frequency, KpiValue, PostgresKpiSource, build_panel, rows_from_values
+from app.rollups import DEFAULT_ROLLUP_DIR, Level, PostgresRollupSource, RollupFreq, RollupService
+
+# Initialize logger
+logger = structlog.get_logger()
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="AcquiSmart AI Risk Service",
+    description="KPI anomaly detection and risk monitoring service",
+    version="1.0.0"
+)
+
+# CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Request/Response models
+class AnomalyScanRequest(BaseModel):
+    # Inline histories; when omitted they are read from kpi_values
+    values: Optional[List[KpiValue]] = None
+    tenant_id: Optional[str] = None
+    kpi_ids: Optional[List[str]] = None
+    entity_ids: Optional[List[str]] = None
+    freq: Frequency = "quarter"
+    detector: DetectorConfig = Field(default_factory=DetectorConfig)
+    escalation: EscalationConfig = Field(default_factory=EscalationConfig)
+
+class KpiAnomaly(BaseModel):
+    entity_id: str
+    entity_type: str
+    kpi_id: str
+    period: date
+    value: float
+    zscore: Optional[float] = None
+    iqr_score: Optional[float] = None
+    escalation_score: Optional[float] = None
+    # None when the anomaly was not escalated
+    confirmed: Optional[bool] = None
+
+class AnomalyScanResponse(BaseModel):
+    anomalies: List[KpiAnomaly]
+    stats: Dict[str, float]
+
+class ForecastRequest(BaseModel):
+    # Inline histories; when omitted they are read from kpi_values
+    values: Optional[List[KpiValue]] = None
+    tenant_id: Optional[str] = None
+    kpi_ids: Optional[List[str]] = None
+    entity_ids: Optional[List[str]] = None
+    freq: Frequency = "quarter"
+    config: ForecastConfig = Field(default_factory=ForecastConfig)
+    # Upsert the batch's forecasts into kpi_forecasts; needs tenant_id
+    write: bool = True
+
+class ForecastPoint(BaseModel):
+    period: date
+    value: float
+    lower: float
+    upper: float
+
+class KpiForecast(BaseModel):
+    entity_id: str
+    entity_type: str
+    kpi_id: str
+    model: str
+    series_hash: str
+    cached: bool
+    points: List[ForecastPoint]
+
+class ForecastResponse(BaseModel):
+    forecasts: List[KpiForecast]
+    stats: Dict[str, float]
+
+class CovenantRequest(BaseModel):
+    covenants: List[Covenant]
+    # Inline histories; when omitted they are read from kpi_values
+    values: Optional[List[KpiValue]] = None
+    # KPI codes and calculation methods; read from kpis when omitted with a tenant_id
+    kpis: Optional[List[KpiDefinition]] = None
+    tenant_id: Optional[str] = None
+    entity_ids: Optional[List[str]] = None
+    freq: Frequency = "quarter"
+    # Results (and work items) cover the last report_periods periods
+    report_periods: int = Field(default=1, ge=1)
+    include_passing: bool = False
+    # Raise covenant_review work items for breaches; needs tenant_id
+    raise_work_items: bool = True
+
+class CovenantResult(BaseModel):
+    covenant_id: str
+    entity_id: str
+    entity_type: str
+    period: date
+    metric: float
+    limit: float
+    operator: str
+    passed: bool
+    headroom: Optional[float] = None
+
+class CovenantResponse(BaseModel):
+    results: List[CovenantResult]
+    stats: Dict[str, float]
+
+class RollupQueryRequest(BaseModel):
+    tenant_id: str
+    level: Level = "company"
+    freq: RollupFreq = "quarter"
+    kpi_ids: Optional[List[str]] = None
+    # Fund ids at the fund level, portfolio company ids at the company level
+    ids: Optional[List[str]] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+class RollupCell(BaseModel):
+    id: str
+    kpi_id: str
+    period: date
+    sum: float
+    count: int
+    min: float
+    max: float
+    mean: float
+
+class RollupQueryResponse(BaseModel):
+    cells: List[RollupCell]
+    watermark: Optional[datetime] = None
+
+class RollupRefreshRequest(BaseModel):
+    tenant_id: str
+    # Rebuild from every row instead of only rows created since the watermark
+    full: bool = False
+
+
+def _optional(value: float) -> Optional[float]:
+    # None for NaN and +-inf alike; neither survives JSON or jsonb
+    return float(value) if np.isfinite(value) else None
+
+
+# kpi_values reader, created on first use so the service starts without a database
+kpi_source: Optional[PostgresKpiSource] = None
+
+
+def _kpi_source() -> PostgresKpiSource:
+    global kpi_source
+    if kpi_source is None:
+        kpi_source = PostgresKpiSource()
+    return kpi_source
+
+
+def _kpi_rows(
+    values: Optional[List[KpiValue]],
+    tenant_id: Optional[str],
+    kpi_ids: Optional[List[str]] = None,
+    entity_ids: Optional[List[str]] = None
+):
+    if values is not None:
+        return rows_from_values(values)
+    return _kpi_source().fetch(tenant_id, kpi_ids, entity_ids)
+
+
+# covenant_review work item writer, created on first use
+work_item_writer: Optional[PostgresWorkItemWriter] = None
+
+
+# Forecast worker pool and fitted-forecast cache, kept across batches
+forecaster: Optional[Forecaster] = None
+forecast_writer: Optional[PostgresForecastWriter] = None
+
+
+@app.on_event("startup")
+async def start_forecaster():
+    global forecaster
+    if os.getenv("FORECASTING_ENABLED", "true").lower() != "true":
+        return
+    cache = None
+    try:
+        if os.path.exists(os.path.join(DEFAULT_CACHE_DIR, CACHE_FILE)):
+            cache = ForecastCache.load(DEFAULT_CACHE_DIR)
+    except Exception as e:
+        logger.error("forecast_cache_load_error", error=str(e))
+    try:
+        forecaster = Forecaster(workers=int(os.getenv("FORECAST_WORKERS", "4")), cache=cache)
+    except Exception as e:
+        logger.error("forecaster_start_error", error=str(e))
+
+
+@app.on_event("shutdown")
+async def stop_forecaster():
+    if forecaster is not None:
+        forecaster.close()
+
+
+# Rollup cubes per tenant; refreshed in the background when enabled
+rollups = RollupService(DEFAULT_ROLLUP_DIR)
+
+
+@app.on_event("startup")
+async def start_rollups():
+    if os.getenv("ROLLUPS_ENABLED", "true").lower() != "true":
+        return
+    try:
+        rollups.source = PostgresRollupSource()
+        rollups.interval_seconds = float(os.getenv("ROLLUP_REFRESH_SECONDS", "300"))
+        threading.Thread(target=rollups.run_forever, daemon=True).start()
+        logger.info("rollups_started", tenants=len(rollups.tenants()), interval=rollups.interval_seconds)
+    except Exception as e:
+        logger.error("rollups_start_error", error=str(e))
+
+
+@app.on_event("shutdown")
+async def stop_rollups():
+    rollups.stop()
+
+
+# Health check
+@app.get("/health")
+async def health_check():
+    return {
+        "status": "healthy",
+        "service": "svc-ai-risk",
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# KPI anomaly scan endpoint
+@app.post("/anomalies/scan", response_model=AnomalyScanResponse)
+def scan_anomalies(request: AnomalyScanRequest):
+    """
+    Flag KPI values that break from their trailing history across every
+    series at once, then confirm the flags with pyod or Prophet
+    """
+    try:
+        start = time.perf_counter()
+        rows = _kpi_rows(request.values, request.tenant_id, request.kpi_ids, request.entity_ids)
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        panel = build_panel(rows, request.freq)
+        flags = detect(panel, request.detector)
+        detect_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        scores = escalate(panel, flags, request.escalation)
+        escalate_seconds = time.perf_counter() - start
+
+        anomalies = []
+        for i, (row, column) in enumerate(zip(flags.rows, flags.columns)):
+            key = panel.keys[row]
+            anomalies.append(KpiAnomaly(
+                entity_id=key.entity_id,
+                entity_type=key.entity_type,
+                kpi_id=key.kpi_id,
+                period=panel.period_start(int(column)),
+                value=float(panel.values[row, column]),
+                zscore=_optional(flags.zscore[i]),
+                iqr_score=_optional(flags.iqr_score[i]),
+                escalation_score=_optional(scores[i]),
+                confirmed=None if np.isnan(scores[i]) else bool(scores[i] > 0)
+            ))
+        logger.info(
+            "anomaly_scan_complete",
+            series=len(panel.keys),
+            periods=panel.values.shape[1],
+            flagged=len(anomalies),
+            escalated=int((~np.isnan(scores)).sum())
+        )
+        return AnomalyScanResponse(
+            anomalies=anomalies,
+            stats={
+                "series": len(panel.keys),
+                "load_seconds": load_seconds,
+                "detect_seconds": detect_seconds,
+                "escalate_seconds": escalate_seconds,
+            }
+        )
+    except Exception as e:
+        logger.error("anomaly_scan_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Batch KPI forecasting endpoint
+@app.post("/forecasts/batch", response_model=ForecastResponse)
+def forecast_batch(request: ForecastRequest):
+    """
+    Forecast every KPI series in the batch; series whose history hasn't
+    changed come from the cache, the rest are fit across the worker pool
+    """
+    global forecast_writer
+    if forecaster is None:
+        raise HTTPException(status_code=503, detail="Forecasting not enabled")
+    try:
+        rows = _kpi_rows(request.values, request.tenant_id, request.kpi_ids, request.entity_ids)
+        panel = build_panel(rows, request.freq)
+        results, stats = forecaster.forecast(panel, request.config)
+
+        if stats["fitted"]:
+            forecaster.cache.save(DEFAULT_CACHE_DIR)
+        written = 0
+        if request.write and request.tenant_id is not None:
+            if forecast_writer is None:
+                forecast_writer = PostgresForecastWriter()
+            # Cache hits are written too: the cache is keyed by series data
+            # alone, so a hit may have been fit for another entity or tenant
+            written = forecast_writer.write(request.tenant_id, request.config.method, results)
+
+        forecasts = [
+            KpiForecast(
+                entity_id=result.key.entity_id,
+                entity_type=result.key.entity_type,
+                kpi_id=result.key.kpi_id,
+                model=request.config.method,
+                series_hash=result.series_hash,
+                cached=result.cached,
+                points=[
+                    ForecastPoint(period=period, value=value, lower=lower, upper=upper)
+                    for period, (value, lower, upper) in zip(result.periods, result.forecast.tolist())
+                ]
+            )
+            for result in results
+        ]
+        return ForecastResponse(forecasts=forecasts, stats={**stats, "written": written})
+    except Exception as e:
+        logger.error("forecast_batch_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Covenant compliance endpoint
+@app.post("/covenants/evaluate", response_model=CovenantResponse)
+def evaluate_covenants(request: CovenantRequest):
+    """
+    Test every covenant for every entity and period, and raise
+    covenant_review work items for breaches in the reported periods
+    """
+    global work_item_writer
+    try:
+        # Surface formula errors before touching the database
+        for covenant in request.covenants:
+            compile_formula(covenant.formula, comparison=True)
+        definitions = request.kpis
+        if definitions is not None:
+            for definition in definitions:
+                if definition.calculation_method and definition.calculation_method.strip():
+                    compile_formula(definition.calculation_method)
+    except FormulaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        start = time.perf_counter()
+        rows = _kpi_rows(request.values, request.tenant_id, entity_ids=request.entity_ids)
+        if definitions is None and request.tenant_id is not None:
+            definitions = [
+                KpiDefinition(id=kpi_id, code=code, calculation_method=calculation_method)
+                for kpi_id, code, calculation_method in _kpi_source().fetch_definitions(request.tenant_id)
+            ]
+        definitions = definitions or []
+        cube = build_cube(build_panel(rows, request.freq), {definition.id: definition.code for definition in definitions})
+        load_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        # Only inline definitions fail the request; stored ones may be prose
+        derived = add_derived_kpis(cube, definitions, strict=request.kpis is not None)
+        num_periods = cube.panel.values.shape[1]
+        first_column = max(num_periods - request.report_periods, 0)
+
+        results, work_items = [], []
+        for covenant in request.covenants:
+            evaluation = evaluate_covenant(covenant, cube)
+            operator = compile_formula(covenant.formula, comparison=True).operator
+            reported = evaluation.tested[:, first_column:]
+            if not request.include_passing:
+                reported = reported & ~evaluation.passed[:, first_column:]
+            entity_rows, columns = np.nonzero(reported)
+            columns = columns + first_column
+            room = headroom(evaluation.metric[entity_rows, columns], evaluation.limit[entity_rows, columns], operator)
+            for entity_row, column, entity_room in zip(entity_rows, columns, room):
+                entity_id, entity_type = cube.entities[entity_row]
+                result = CovenantResult(
+                    covenant_id=covenant.id,
+                    entity_id=entity_id,
+                    entity_type=entity_type,
+                    period=cube.panel.period_start(int(column)),
+                    metric=float(evaluation.metric[entity_row, column]),
+                    limit=float(evaluation.limit[entity_row, column]),
+                    operator=operator,
+                    passed=bool(evaluation.passed[entity_row, column]),
+                    headroom=_optional(entity_room)
+                )
+                results.append(result)
+                if not result.passed:
+                    work_items.append({
+                        "title": f"Covenant breach: {covenant.name}",
+                        "description": (
+                            f"{covenant.formula} failed for {result.period.isoformat()}: "
+                            f"{result.metric:.4g} against a limit of {result.limit:.4g}"
+                        ),
+                        "priority": covenant.priority,
+                        "entity_id": entity_id,
+                        "entity_type": entity_type,
+                        "metadata": {
+                            "covenant_id": covenant.id,
+                            "formula": covenant.formula,
+                            "period": result.period.isoformat(),
+                            "metric": _optional(result.metric),
+                            "limit": _optional(result.limit),
+                            "headroom": result.headroom,
+                        },
+                    })
+        evaluate_seconds = time.perf_counter() - start
+
+        raised = 0
+        if request.raise_work_items and request.tenant_id is not None and work_items:
+            if work_item_writer is None:
+                work_item_writer = PostgresWorkItemWriter()
+            raised = work_item_writer.write(request.tenant_id, work_items)
+
+        logger.info(
+            "covenants_evaluated",
+            covenants=len(request.covenants),
+            entities=len(cube.entities),
+            periods=num_periods,
+            derived=len(derived),
+            breaches=len(work_items)
+        )
+        return CovenantResponse(
+            results=results,
+            stats={
+                "entities": len(cube.entities),
+                "periods": num_periods,
+                "breaches": len(work_items),
+                "work_items": raised,
+                "load_seconds": load_seconds,
+                "evaluate_seconds": evaluate_seconds,
+            }
+        )
+    except FormulaError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error("covenant_evaluation_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# KPI rollup query endpoint
+@app.post("/rollups/query", response_model=RollupQueryResponse)
+def query_rollups(request: RollupQueryRequest):
+    """
+    Sum, count, min, max and mean of KPI values per fund or portfolio
+    company and period, read from the memory-mapped rollup cubes
+    """
+    try:
+        store = rollups.store(request.tenant_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="tenant_id must be a UUID")
+    try:
+        cells = store.query(request.level, request.freq, request.kpi_ids, request.ids, request.start, request.end)
+        return RollupQueryResponse(cells=cells, watermark=store.generation.watermark)
+    except Exception as e:
+        logger.error("rollup_query_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# KPI rollup refresh endpoint
+@app.post("/rollups/refresh")
+def refresh_rollups(request: RollupRefreshRequest):
+    """Aggregate kpi_values rows created since the last refresh into the tenant's cubes"""
+    if rollups.source is None:
+        raise HTTPException(status_code=503, detail="Rollups not enabled")
+    try:
+        rollups.store(request.tenant_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="tenant_id must be a UUID")
+    try:
+        start = time.perf_counter()
+        rows = rollups.refresh(request.tenant_id, full=request.full)
+        generation = rollups.store(request.tenant_id).generation
+        return {
+            "status": "refreshed",
+            "rows": rows,
+            "watermark": generation.watermark,
+            "seconds": time.perf_counter() - start,
+        }
+    except Exception as e:
+        logger.error("rollup_refresh_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8004)
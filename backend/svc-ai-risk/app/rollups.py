@@ -0,0 +1,481 @@
+"""
+Pre-aggregated KPI rollups on memory-mapped files
+
+Portfolio-company kpi_values rows are aggregated into sum, count, min and
+max per (company, KPI) and per (fund, KPI), by month and by quarter. Each of
+those 16 cubes is a (rows, periods) .npy file, and queries read them through
+np.load(mmap_mode='r'), so a dashboard query touches only the pages it
+slices and never the raw rows.
+
+Refreshes are incremental on created_at, the inserting transaction's start
+time, so a row can commit after rows created later were already applied.
+Each refresh re-reads a trailing overlap window behind the watermark and
+skips the row ids it already applied there; only a transaction open longer
+than the window slips past. New rows are aggregated into (company, KPI,
+month) deltas and merged into the company month cube; the quarter and fund
+cubes are re-derived from it. Refreshes of a store are serialized, and each
+writes a new generation directory, with its watermark and applied ids,
+before swapping the CURRENT pointer, so readers never see a half-applied
+refresh and a crash leaves the previous generation's state intact. Edits to
+existing rows don't move created_at; a full rebuild picks them up.
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, Literal, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+
+from app.db import get_client
+
+logger = structlog.get_logger()
+
+DEFAULT_ROLLUP_DIR = os.getenv('ROLLUP_DIR', 'data/rollups')
+CURRENT_FILE = 'CURRENT'
+# How far behind the watermark each refresh looks for late-committing rows
+OVERLAP_SECONDS = float(os.getenv('ROLLUP_OVERLAP_SECONDS', '3600'))
+
+Level = Literal['company', 'fund']
+RollupFreq = Literal['month', 'quarter']
+
+LEVELS = ('company', 'fund')
+FREQS = ('month', 'quarter')
+STATS = ('sum', 'count', 'min', 'max')
+
+
+class RollupRow(NamedTuple):
+    id: str
+    kpi_id: str
+    entity_id: str
+    fund_id: Optional[str]
+    date: date
+    value: Optional[float]
+    created_at: datetime
+
+
+class Cube(NamedTuple):
+    stats: Dict[str, np.ndarray]  # stat -> (rows, periods)
+
+
+def _empty(rows: int, periods: int) -> Dict[str, np.ndarray]:
+    return {
+        'sum': np.zeros((rows, periods)),
+        'count': np.zeros((rows, periods), dtype=np.int64),
+        'min': np.full((rows, periods), np.nan),
+        'max': np.full((rows, periods), np.nan),
+    }
+
+
+def _merge_into(target: Dict[str, np.ndarray], source: Dict[str, np.ndarray], rows, columns) -> None:
+    """Combine source cells into target[rows, columns] in place"""
+    region = np.ix_(rows, columns) if not isinstance(rows, slice) else (rows, columns)
+    target['sum'][region] += source['sum']
+    target['count'][region] += source['count']
+    target['min'][region] = np.fmin(target['min'][region], source['min'])
+    target['max'][region] = np.fmax(target['max'][region], source['max'])
+
+
+def _reduce_rows(stats: Dict[str, np.ndarray], groups: np.ndarray, num_groups: int) -> Dict[str, np.ndarray]:
+    """Aggregate rows sharing a group index; rows with group -1 are dropped"""
+    result = _empty(num_groups, stats['sum'].shape[1])
+    keep = np.flatnonzero(groups >= 0)
+    if len(keep) == 0:
+        return result
+    order = keep[np.argsort(groups[keep], kind='stable')]
+    sorted_groups = groups[order]
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(sorted_groups)) + 1])
+    targets = sorted_groups[starts]
+    result['sum'][targets] = np.add.reduceat(stats['sum'][order], starts, axis=0)
+    result['count'][targets] = np.add.reduceat(stats['count'][order], starts, axis=0)
+    result['min'][targets] = np.fmin.reduceat(stats['min'][order], starts, axis=0)
+    result['max'][targets] = np.fmax.reduceat(stats['max'][order], starts, axis=0)
+    return result
+
+
+def _reduce_columns(stats: Dict[str, np.ndarray], first_month: int) -> Dict[str, np.ndarray]:
+    """Month cube to quarter cube"""
+    num_months = stats['sum'].shape[1]
+    if num_months == 0:
+        return {stat: values.copy() for stat, values in stats.items()}
+    quarters = (first_month + np.arange(num_months)) // 3
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(quarters)) + 1])
+    return {
+        'sum': np.add.reduceat(stats['sum'], starts, axis=1),
+        'count': np.add.reduceat(stats['count'], starts, axis=1),
+        'min': np.fmin.reduceat(stats['min'], starts, axis=1),
+        'max': np.fmax.reduceat(stats['max'], starts, axis=1),
+    }
+
+
+class RollupGeneration:
+    """One immutable on-disk generation of every cube, opened read-only"""
+
+    def __init__(self, directory: str, meta: Dict, cubes: Dict[Tuple[str, str], Cube]):
+        self.directory = directory
+        self.meta = meta
+        self.cubes = cubes
+        self.companies: List[str] = meta['companies']
+        self.funds: List[str] = meta['funds']
+        self.kpis: List[str] = meta['kpis']
+        self.first_month: int = meta['first_month']
+        self.num_months: int = meta['num_months']
+        # (company or fund id, kpi id) -> row, per level
+        self.row_of: Dict[str, Dict[Tuple[str, str], int]] = {
+            level: {
+                (ids[group], self.kpis[kpi]): row
+                for row, (group, kpi) in enumerate(meta[f'{level}_rows'])
+            }
+            for level, ids in (('company', self.companies), ('fund', self.funds))
+        }
+
+    @property
+    def watermark(self) -> Optional[datetime]:
+        value = self.meta.get('watermark')
+        return datetime.fromisoformat(value) if value else None
+
+    @property
+    def recent(self) -> Dict[str, str]:
+        """Ids of applied rows inside the overlap window -> created_at"""
+        return self.meta.get('recent', {})
+
+    def first_period(self, freq: RollupFreq) -> int:
+        return self.first_month if freq == 'month' else self.first_month // 3
+
+    @classmethod
+    def open(cls, directory: str) -> 'RollupGeneration':
+        with open(os.path.join(directory, 'meta.json')) as f:
+            meta = json.load(f)
+        cubes = {
+            (level, freq): Cube({
+                stat: np.load(os.path.join(directory, f'{level}_{freq}_{stat}.npy'), mmap_mode='r')
+                for stat in STATS
+            })
+            for level in LEVELS for freq in FREQS
+        }
+        return cls(directory, meta, cubes)
+
+    @classmethod
+    def empty(cls) -> 'RollupGeneration':
+        meta = {
+            'companies': [], 'company_funds': [], 'funds': [], 'kpis': [],
+            'company_rows': [], 'fund_rows': [], 'first_month': 0, 'num_months': 0, 'watermark': None, 'recent': {},
+        }
+        cubes = {(level, freq): Cube(_empty(0, 0)) for level in LEVELS for freq in FREQS}
+        return cls('', meta, cubes)
+
+
+def _period_start(period: int, freq: RollupFreq) -> date:
+    month = period * (1 if freq == 'month' else 3)
+    return date(1970 + month // 12, month % 12 + 1, 1)
+
+
+def _month_index(day: date) -> int:
+    return (day.year - 1970) * 12 + day.month - 1
+
+
+class RollupStore:
+    """
+    Per-tenant rollup cubes in directory/gen-<n>/, with CURRENT naming the
+    generation queries read
+    """
+
+    def __init__(self, directory: str, overlap_seconds: float = OVERLAP_SECONDS):
+        self.directory = directory
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self._refresh_lock = threading.Lock()
+        current = os.path.join(directory, CURRENT_FILE)
+        if os.path.exists(current):
+            with open(current) as f:
+                self.generation = RollupGeneration.open(os.path.join(directory, f.read().strip()))
+        else:
+            self.generation = RollupGeneration.empty()
+
+    def refresh(self, fetch: Callable[[Optional[datetime]], Sequence[RollupRow]], full: bool = False) -> int:
+        """
+        Apply fetch(since), the rows created after since, to the current
+        generation. The fetch runs under the refresh lock, so a concurrent
+        refresh can't apply rows read against a watermark it has moved.
+        """
+        with self._refresh_lock:
+            base = RollupGeneration.empty() if full else self.generation
+            since = base.watermark - self.overlap if base.watermark else None
+            return self._apply(base, fetch(since), full)
+
+    def apply(self, rows: Sequence[RollupRow], full: bool = False) -> int:
+        """
+        Merge rows into a new generation and make it current; full=True
+        rebuilds from rows alone. Returns the number of rows aggregated.
+        """
+        with self._refresh_lock:
+            return self._apply(RollupGeneration.empty() if full else self.generation, rows, full)
+
+    def _apply(self, base: RollupGeneration, rows: Sequence[RollupRow], full: bool) -> int:
+        start = time.perf_counter()
+        # Rows in the overlap window that an earlier refresh already applied
+        recent = dict(base.recent)
+        rows = [row for row in rows if row.id not in recent]
+        latest = max(filter(None, [base.watermark] + [row.created_at for row in rows]), default=None)
+        for row in rows:
+            recent[row.id] = row.created_at.isoformat()
+        if latest is not None:
+            cutoff = latest - self.overlap
+            recent = {id_: at for id_, at in recent.items() if datetime.fromisoformat(at) > cutoff}
+        rows = [row for row in rows if row.value is not None]
+
+        # Dimensions only grow; a company's fund follows its latest row
+        companies = list(base.companies)
+        company_funds = list(base.meta['company_funds'])
+        kpis = list(base.kpis)
+        company_index = {company: i for i, company in enumerate(companies)}
+        kpi_index = {kpi: i for i, kpi in enumerate(kpis)}
+        series = {tuple(pair): row for row, pair in enumerate(base.meta['company_rows'])}
+        series_rows = [tuple(pair) for pair in base.meta['company_rows']]
+
+        delta_series = np.empty(len(rows), dtype=np.int64)
+        delta_months = np.empty(len(rows), dtype=np.int64)
+        values = np.empty(len(rows))
+        for i, row in enumerate(rows):
+            company = company_index.get(row.entity_id)
+            if company is None:
+                company = company_index[row.entity_id] = len(companies)
+                companies.append(row.entity_id)
+                company_funds.append(row.fund_id)
+            else:
+                company_funds[company] = row.fund_id
+            kpi = kpi_index.setdefault(row.kpi_id, len(kpi_index))
+            if kpi == len(kpis):
+                kpis.append(row.kpi_id)
+            key = (company, kpi)
+            if key not in series:
+                series[key] = len(series_rows)
+                series_rows.append(key)
+            delta_series[i] = series[key]
+            delta_months[i] = _month_index(row.date)
+            values[i] = row.value
+
+        # Month span covering the old cube and the new rows
+        if base.num_months:
+            first_month, last_month = base.first_month, base.first_month + base.num_months - 1
+        else:
+            first_month, last_month = (int(delta_months.min()), int(delta_months.max())) if len(rows) else (0, -1)
+        if len(rows):
+            first_month = min(first_month, int(delta_months.min()))
+            last_month = max(last_month, int(delta_months.max()))
+        num_months = last_month - first_month + 1
+
+        company_month = _empty(len(series_rows), num_months)
+        if base.num_months:
+            old = base.cubes[('company', 'month')].stats
+            offset = base.first_month - first_month
+            _merge_into(
+                company_month,
+                {stat: np.asarray(old[stat]) for stat in STATS},
+                slice(0, len(base.meta['company_rows'])),
+                slice(offset, offset + base.num_months)
+            )
+        if len(rows):
+            cells = delta_series * num_months + (delta_months - first_month)
+            flat = {stat: company_month[stat].reshape(-1) for stat in STATS}
+            np.add.at(flat['sum'], cells, values)
+            np.add.at(flat['count'], cells, 1)
+            np.fmin.at(flat['min'], cells, values)
+            np.fmax.at(flat['max'], cells, values)
+
+        # Fund rows are (fund, kpi) pairs of the company rows' funds
+        funds: List[str] = []
+        fund_index: Dict[str, int] = {}
+        fund_series: Dict[Tuple[int, int], int] = {}
+        fund_rows: List[Tuple[int, int]] = []
+        company_to_fund_row = np.full(len(series_rows), -1, dtype=np.int64)
+        for row, (company, kpi) in enumerate(series_rows):
+            fund_id = company_funds[company]
+            if fund_id is None:
+                continue
+            fund = fund_index.setdefault(fund_id, len(fund_index))
+            if fund == len(funds):
+                funds.append(fund_id)
+            key = (fund, kpi)
+            if key not in fund_series:
+                fund_series[key] = len(fund_rows)
+                fund_rows.append(key)
+            company_to_fund_row[row] = fund_series[key]
+        fund_month = _reduce_rows(company_month, company_to_fund_row, len(fund_rows))
+
+        cubes = {
+            ('company', 'month'): company_month,
+            ('company', 'quarter'): _reduce_columns(company_month, first_month),
+            ('fund', 'month'): fund_month,
+            ('fund', 'quarter'): _reduce_columns(fund_month, first_month),
+        }
+        meta = {
+            'companies': companies,
+            'company_funds': company_funds,
+            'funds': funds,
+            'kpis': kpis,
+            'company_rows': [list(pair) for pair in series_rows],
+            'fund_rows': [list(pair) for pair in fund_rows],
+            'first_month': first_month if num_months > 0 else 0,
+            'num_months': max(num_months, 0),
+            'watermark': latest.isoformat() if latest else None,
+            'recent': recent,
+        }
+        self.generation = self._write(meta, cubes)
+        logger.info(
+            "rollups_refreshed",
+            directory=self.directory,
+            rows=len(rows),
+            full=full,
+            company_rows=len(series_rows),
+            fund_rows=len(fund_rows),
+            months=meta['num_months'],
+            seconds=round(time.perf_counter() - start, 3)
+        )
+        return len(rows)
+
+    def _write(self, meta: Dict, cubes: Dict[Tuple[str, str], Dict[str, np.ndarray]]) -> RollupGeneration:
+        os.makedirs(self.directory, exist_ok=True)
+        name = f'gen-{uuid.uuid4().hex[:12]}'
+        directory = os.path.join(self.directory, name)
+        os.makedirs(directory)
+        for (level, freq), stats in cubes.items():
+            for stat in STATS:
+                np.save(os.path.join(directory, f'{level}_{freq}_{stat}.npy'), stats[stat])
+        with open(os.path.join(directory, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+        tmp_path = os.path.join(self.directory, CURRENT_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write(name)
+        os.replace(tmp_path, os.path.join(self.directory, CURRENT_FILE))
+
+        # Open mappings of older generations stay valid after their files are unlinked
+        for entry in os.listdir(self.directory):
+            if entry.startswith('gen-') and entry != name:
+                shutil.rmtree(os.path.join(self.directory, entry), ignore_errors=True)
+        return RollupGeneration.open(directory)
+
+    def query(
+        self,
+        level: Level,
+        freq: RollupFreq,
+        kpi_ids: Optional[Sequence[str]] = None,
+        ids: Optional[Sequence[str]] = None,
+        start: Optional[date] = None,
+        end: Optional[date] = None
+    ) -> List[Dict]:
+        """Rollup cells for the given funds/companies and KPIs between start and end"""
+        generation = self.generation
+        row_of = generation.row_of[level]
+        if ids is not None and kpi_ids is not None:
+            keys = [(group, kpi) for group in ids for kpi in kpi_ids if (group, kpi) in row_of]
+        else:
+            wanted_ids = None if ids is None else set(ids)
+            wanted_kpis = None if kpi_ids is None else set(kpi_ids)
+            keys = [
+                key for key in row_of
+                if (wanted_ids is None or key[0] in wanted_ids) and (wanted_kpis is None or key[1] in wanted_kpis)
+            ]
+        stats = generation.cubes[(level, freq)].stats
+        num_periods = stats['sum'].shape[1]
+        if not keys or num_periods == 0:
+            return []
+
+        first_period = generation.first_period(freq)
+        per_period = 1 if freq == 'month' else 3
+        first_column = 0 if start is None else max(_month_index(start) // per_period - first_period, 0)
+        last_column = num_periods if end is None else min(_month_index(end) // per_period - first_period + 1, num_periods)
+        if first_column >= last_column:
+            return []
+
+        rows = np.array([row_of[key] for key in keys], dtype=np.int64)
+        order = np.argsort(rows)
+        # Reading sorted rows keeps the memory-mapped access sequential
+        block = {stat: np.asarray(stats[stat][rows[order], first_column:last_column]) for stat in STATS}
+
+        results = []
+        for position, index in enumerate(order):
+            group, kpi = keys[index]
+            for column in np.flatnonzero(block['count'][position]):
+                count = int(block['count'][position, column])
+                total = float(block['sum'][position, column])
+                results.append({
+                    'id': group,
+                    'kpi_id': kpi,
+                    'period': _period_start(first_period + first_column + int(column), freq),
+                    'sum': total,
+                    'count': count,
+                    'min': float(block['min'][position, column]),
+                    'max': float(block['max'][position, column]),
+                    'mean': total / count,
+                })
+        return results
+
+
+class PostgresRollupSource:
+    """Reads portfolio-company kpi_values rows by created_at"""
+
+    def __init__(self, dsn: Optional[str] = None):
+        self.db = get_client(dsn)
+
+    def fetch(self, tenant_id: str, after: Optional[datetime]) -> List[RollupRow]:
+        """Rows created after after (every row when None)"""
+        rows = self.db.fetch_all(
+            """
+            SELECT kv.id::text, kv.kpi_id::text, kv.entity_id::text, pc.fund_id::text, kv.date, kv.value::float,
+                   kv.created_at
+            FROM kpi_values kv
+            LEFT JOIN portfolio_companies pc ON pc.id = kv.entity_id
+            WHERE kv.tenant_id = %s
+              AND kv.entity_type = 'portfolio_company'
+              AND kv.created_at > %s
+            """,
+            (tenant_id, after or datetime(1970, 1, 1))
+        )
+        return [RollupRow(*row) for row in rows]
+
+
+class RollupService:
+    """Rollup stores per tenant under root, refreshed from Postgres"""
+
+    def __init__(self, root: str = DEFAULT_ROLLUP_DIR, source: Optional[PostgresRollupSource] = None,
+                 interval_seconds: float = 300.0):
+        self.root = root
+        self.source = source
+        self.interval_seconds = interval_seconds
+        self._stores: Dict[str, RollupStore] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def store(self, tenant_id: str) -> RollupStore:
+        # Tenant ids name directories, so only canonical UUIDs are accepted
+        tenant_id = str(uuid.UUID(tenant_id))
+        with self._lock:
+            if tenant_id not in self._stores:
+                self._stores[tenant_id] = RollupStore(os.path.join(self.root, tenant_id))
+            return self._stores[tenant_id]
+
+    def tenants(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return [entry for entry in os.listdir(self.root) if os.path.exists(os.path.join(self.root, entry, CURRENT_FILE))]
+
+    def refresh(self, tenant_id: str, full: bool = False) -> int:
+        return self.store(tenant_id).refresh(lambda since: self.source.fetch(tenant_id, since), full=full)
+
+    def run_forever(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            for tenant_id in self.tenants():
+                try:
+                    self.refresh(tenant_id)
+                except Exception as e:
+                    # Keep serving the current generation
+                    logger.error("rollup_refresh_error", tenant_id=tenant_id, error=str(e))
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,40 @@
+"""
+Batch forecasting of constant KPI series
+"""
+
+from datetime import date
+
+import numpy as np
+import pytest
+
+from app.forecasting import ForecastConfig, Forecaster
+from app.kpi_panel import build_panel
+
+
+def constant_rows(value, quarters=12):
+    return [
+        ('revenue', 'company-1', 'company', date(2021 + q // 4, 3 * (q % 4) + 1, 1), value)
+        for q in range(quarters)
+    ]
+
+
+@pytest.mark.parametrize('method', ['arima', 'prophet'])
+@pytest.mark.parametrize('value', [5.0, 1000.0])
+def test_constant_series_forecasts_its_value(method, value):
+    panel = build_panel(constant_rows(value), 'quarter')
+    forecaster = Forecaster(workers=0)
+    results, stats = forecaster.forecast(panel, ForecastConfig(method=method, horizon=3))
+
+    assert stats['failed'] == 0
+    [result] = results
+    np.testing.assert_array_equal(result.forecast, np.full((3, 3), value))
+
+
+def test_constant_series_is_cached():
+    panel = build_panel(constant_rows(5.0), 'quarter')
+    forecaster = Forecaster(workers=0)
+    forecaster.forecast(panel, ForecastConfig(method='arima'))
+    results, stats = forecaster.forecast(panel, ForecastConfig(method='arima'))
+
+    assert stats['cached'] == 1 and stats['fitted'] == 0
+    assert results[0].cached
@@ -0,0 +1,230 @@
+"""
+Geo-indexed property comparables
+
+Active properties are snapshotted from Postgres into columnar arrays with
+one KD-tree per property_type. Points are stored as unit vectors on the
+sphere: straight-line (chord) distance there orders points exactly like
+haversine distance and converts back to it in closed form, while the
+KD-tree query is several times cheaper than a haversine BallTree. A lookup
+asks the subject's tree for a few times k nearest neighbours, drops those
+outside the bedrooms/sqft bands, and widens the search only when too few
+survive. Rebuilds build a whole new snapshot off to the side and swap it
+in with one assignment, so lookups never wait on a rebuild.
+"""
+
+import os
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+import structlog
+from pydantic import BaseModel
+from scipy.spatial import cKDTree
+
+logger = structlog.get_logger()
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+class PropertyRecord(NamedTuple):
+    id: str
+    property_type: str
+    bedrooms: int
+    bathrooms: float
+    sqft: int
+    latitude: float
+    longitude: float
+    list_price: Optional[float]
+    last_sale_price: Optional[float]
+
+
+class CompsQuery(BaseModel):
+    latitude: float
+    longitude: float
+    property_type: str
+    bedrooms: Optional[int] = None
+    sqft: Optional[float] = None
+    k: int = 10
+    # Bedrooms within +-bedrooms_band, sqft within +-sqft_band (relative)
+    bedrooms_band: int = 1
+    sqft_band: float = 0.25
+    radius_km: Optional[float] = None
+    exclude_id: Optional[str] = None
+
+
+class PropertyComp(NamedTuple):
+    row: int
+    distance_km: float
+
+
+def unit_vectors(latitude: np.ndarray, longitude: np.ndarray) -> np.ndarray:
+    """(n, 3) points on the unit sphere for degrees latitude/longitude"""
+    lat, lon = np.radians(latitude), np.radians(longitude)
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2.0 * np.arcsin(np.minimum(chord / 2.0, 1.0)) * EARTH_RADIUS_KM
+
+
+def km_to_chord(km: float) -> float:
+    return 2.0 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2.0)
+
+
+class PropertySnapshot:
+    """Immutable columnar snapshot with a KD-tree per property_type"""
+
+    def __init__(self, records: Sequence[PropertyRecord]):
+        self.ids = [record.id for record in records]
+        self.row_of = {record_id: row for row, record_id in enumerate(self.ids)}
+        self.property_type = np.array([record.property_type for record in records], dtype=object)
+        self.bedrooms = np.array([record.bedrooms for record in records], dtype=np.int64)
+        self.bathrooms = np.array([record.bathrooms for record in records], dtype=np.float64)
+        self.sqft = np.array([record.sqft for record in records], dtype=np.float64)
+        self.latitude = np.array([record.latitude for record in records], dtype=np.float64)
+        self.longitude = np.array([record.longitude for record in records], dtype=np.float64)
+        self.list_price = np.array([record.list_price for record in records], dtype=np.float64)
+        self.last_sale_price = np.array([record.last_sale_price for record in records], dtype=np.float64)
+
+        points = unit_vectors(self.latitude, self.longitude)
+        self.trees: Dict[str, object] = {}
+        self.tree_rows: Dict[str, np.ndarray] = {}
+        for property_type in np.unique(self.property_type):
+            rows = np.flatnonzero(self.property_type == property_type)
+            self.tree_rows[property_type] = rows
+            self.trees[property_type] = cKDTree(points[rows])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _in_bands(self, rows: np.ndarray, query: CompsQuery) -> np.ndarray:
+        keep = np.ones(len(rows), dtype=bool)
+        if query.bedrooms is not None:
+            keep &= np.abs(self.bedrooms[rows] - query.bedrooms) <= query.bedrooms_band
+        if query.sqft is not None:
+            keep &= np.abs(self.sqft[rows] - query.sqft) <= query.sqft_band * query.sqft
+        if query.exclude_id is not None:
+            keep &= rows != self.row_of.get(query.exclude_id, -1)
+        return keep
+
+    def nearest(self, query: CompsQuery, oversample: int = 4) -> List[PropertyComp]:
+        """Up to k closest comps in the subject's type and bands, closest first"""
+        tree = self.trees.get(query.property_type)
+        if tree is None or query.k <= 0:
+            return []
+        tree_rows = self.tree_rows[query.property_type]
+        point = unit_vectors(np.array([query.latitude]), np.array([query.longitude]))[0]
+        radius = np.inf if query.radius_km is None else km_to_chord(query.radius_km)
+
+        fetch = min(query.k * oversample + 1, len(tree_rows))
+        while True:
+            distances, found = tree.query(point, k=fetch, distance_upper_bound=radius)
+            distances, found = np.atleast_1d(distances), np.atleast_1d(found)
+            # Neighbours beyond the radius come back as inf / len(tree_rows)
+            within = found < len(tree_rows)
+            distances, rows = distances[within], tree_rows[found[within]]
+            keep = self._in_bands(rows, query)
+            exhausted = fetch >= len(tree_rows) or len(rows) < fetch
+            survivors = int(keep.sum())
+            if survivors >= query.k or exhausted:
+                break
+            # Size the next round from the band survival rate seen so far
+            needed = fetch * 2 * query.k / max(survivors, 1)
+            fetch = min(int(max(needed, fetch * 2)), len(tree_rows))
+
+        selected = np.flatnonzero(keep)[:query.k]
+        distances_km = chord_to_km(distances[selected])
+        return [PropertyComp(int(rows[i]), float(d)) for i, d in zip(selected, distances_km)]
+
+    def describe(self, comp: PropertyComp) -> Dict:
+        """property_valuations.comparables entry for one comp"""
+        row = comp.row
+        price = self.last_sale_price[row] if not np.isnan(self.last_sale_price[row]) else self.list_price[row]
+        return {
+            'property_id': self.ids[row],
+            'distance_km': round(comp.distance_km, 3),
+            'property_type': self.property_type[row],
+            'bedrooms': int(self.bedrooms[row]),
+            'bathrooms': float(self.bathrooms[row]),
+            'sqft': int(self.sqft[row]),
+            'list_price': None if np.isnan(self.list_price[row]) else float(self.list_price[row]),
+            'last_sale_price': None if np.isnan(self.last_sale_price[row]) else float(self.last_sale_price[row]),
+            'price_per_sqft': None if np.isnan(price) or self.sqft[row] <= 0 else float(price / self.sqft[row]),
+        }
+
+
+class PostgresPropertySource:
+    """Reads the active properties snapshot"""
+
+    QUERY = """
+        SELECT id::text, property_type::text, bedrooms, bathrooms::float, sqft,
+               latitude::float, longitude::float, list_price::float, last_sale_price::float
+        FROM properties
+        WHERE status = 'active'
+    """
+
+    def __init__(self, dsn: Optional[str] = None):
+        import psycopg2
+
+        self.dsn = dsn or (
+            f"host={os.getenv('DB_HOST', 'localhost')} "
+            f"port={os.getenv('DB_PORT', '5432')} "
+            f"dbname={os.getenv('DB_NAME', 'acquismart')} "
+            f"user={os.getenv('DB_USER', 'acquismart')} "
+            f"password={os.getenv('DB_PASSWORD', 'changeme')}"
+        )
+        self._psycopg2 = psycopg2
+        self._conn = None
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self._psycopg2.connect(self.dsn)
+            self._conn.autocommit = True
+        return self._conn
+
+    def fetch(self) -> List[PropertyRecord]:
+        # The whole snapshot is built into one index, so it is fetched in one go
+        with self._connection().cursor() as cur:
+            cur.execute(self.QUERY)
+            return [PropertyRecord(*row) for row in cur]
+
+
+class PropertyCompsIndex:
+    """Holds the current snapshot; rebuild() swaps in a new one"""
+
+    def __init__(self, source: Optional[PostgresPropertySource] = None, interval_seconds: float = 300.0):
+        self.source = source
+        self.interval_seconds = interval_seconds
+        self.snapshot = PropertySnapshot([])
+        self._rebuild_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def load(self, records: Sequence[PropertyRecord]) -> None:
+        start = time.perf_counter()
+        snapshot = PropertySnapshot(records)
+        # Readers hold on to whichever snapshot they started with
+        self.snapshot = snapshot
+        logger.info("property_comps_loaded", properties=len(snapshot),
+                    seconds=round(time.perf_counter() - start, 3))
+
+    def rebuild(self) -> int:
+        with self._rebuild_lock:
+            self.load(self.source.fetch())
+            return len(self.snapshot)
+
+    def nearest(self, queries: Sequence[CompsQuery]) -> List[List[Dict]]:
+        # One snapshot for the whole batch, even if a rebuild lands mid-way
+        snapshot = self.snapshot
+        return [[snapshot.describe(comp) for comp in snapshot.nearest(query)] for query in queries]
+
+    def run_forever(self) -> None:
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.rebuild()
+            except Exception as e:
+                # Keep serving the previous snapshot
+                logger.error("property_comps_rebuild_error", error=str(e))
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,249 @@
+"""
+Comparable-company valuation
+
+Listing and company financials are held column-wise: one float array per
+metric and per multiple (askingPrice over revenue, EBITDA and cash flow).
+Comparables are the k nearest rows in a standardized feature space (size,
+margins, plus a one-hot industry block that puts different industries a
+fixed distance apart), found for a whole batch of targets with one KD-tree
+query. Each
+target's value is the similarity-weighted median multiple of its comps
+applied to its own metric, per multiple, then averaged across multiples.
+"""
+
+import threading
+import warnings
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import structlog
+from pydantic import BaseModel
+from scipy.spatial import cKDTree
+
+logger = structlog.get_logger()
+
+METRICS = ('revenue', 'ebitda', 'cash_flow')
+MULTIPLES = {'ev_revenue': 'revenue', 'ev_ebitda': 'ebitda', 'ev_cash_flow': 'cash_flow'}
+
+
+class CompsConfig(BaseModel):
+    k: int = 10
+    # Distance between comps in different industries, in standard deviations;
+    # a missing industry sits halfway between all of them
+    industry_penalty: float = 1.5
+    # Relative weights of log revenue, log EBITDA, EBITDA margin, cash-flow margin
+    feature_weights: Tuple[float, float, float, float] = (1.0, 1.0, 0.5, 0.5)
+    # Multiples outside these bounds are treated as data errors
+    max_multiple: float = 100.0
+
+
+class CompanyFinancials(BaseModel):
+    id: str
+    name: Optional[str] = None
+    industry: Optional[str] = None
+    revenue: Optional[float] = None
+    ebitda: Optional[float] = None
+    cash_flow: Optional[float] = None
+    asking_price: Optional[float] = None
+
+
+class CompsResult(NamedTuple):
+    comp_rows: np.ndarray          # (targets, k) row into the index, -1 when empty
+    similarity: np.ndarray         # (targets, k) in (0, 1]
+    implied: Dict[str, np.ndarray]  # multiple -> (targets,) implied value
+    low: np.ndarray                # (targets,) 25th percentile of implied values
+    high: np.ndarray               # (targets,) 75th percentile of implied values
+    value: np.ndarray              # (targets,) mean of the available implied values
+
+
+def _column(records: Sequence[CompanyFinancials], field: str) -> np.ndarray:
+    return np.array([getattr(record, field) for record in records], dtype=np.float64)
+
+
+def feature_matrix(revenue: np.ndarray, ebitda: np.ndarray, cash_flow: np.ndarray) -> np.ndarray:
+    """Raw similarity features; missing values stay NaN until standardized"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        positive_revenue = np.where(revenue > 0, revenue, np.nan)
+        return np.column_stack([
+            np.log1p(positive_revenue),
+            np.sign(ebitda) * np.log1p(np.abs(ebitda)),
+            np.clip(ebitda / positive_revenue, -1.0, 1.0),
+            np.clip(cash_flow / positive_revenue, -1.0, 1.0),
+        ])
+
+
+def weighted_quantile(values: np.ndarray, weights: np.ndarray, q: float) -> np.ndarray:
+    """Row-wise weighted quantile ignoring NaN values; NaN for empty rows"""
+    if values.shape[1] == 0:
+        return np.full(len(values), np.nan)
+    weights = np.where(np.isnan(values), 0.0, weights)
+    order = np.argsort(values, axis=1)  # NaN sorts last
+    sorted_values = np.take_along_axis(values, order, axis=1)
+    cumulative = np.cumsum(np.take_along_axis(weights, order, axis=1), axis=1)
+    total = cumulative[:, -1:]
+    position = (cumulative < q * total).sum(axis=1).clip(max=values.shape[1] - 1)
+    result = sorted_values[np.arange(len(values)), position]
+    return np.where(total[:, 0] > 0, result, np.nan)
+
+
+class CompsIndex:
+    """Columnar comparable set, replaced wholesale by load()"""
+
+    def __init__(self, config: Optional[CompsConfig] = None):
+        self.config = config or CompsConfig()
+        self._lock = threading.RLock()
+        self.load([])
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def load(self, records: Sequence[CompanyFinancials]) -> None:
+        ids = [record.id for record in records]
+        names = [record.name for record in records]
+        industries = [(record.industry or '').strip().lower() for record in records]
+        industry_codes: Dict[str, int] = {}
+        codes = np.array([
+            industry_codes.setdefault(value, len(industry_codes)) if value else -1 for value in industries
+        ], dtype=np.int64)
+
+        metrics = {metric: _column(records, metric) for metric in METRICS}
+        price = _column(records, 'asking_price')
+        multiples = {}
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for multiple, metric in MULTIPLES.items():
+                ratio = price / metrics[metric]
+                valid = (metrics[metric] > 0) & (ratio > 0) & (ratio <= self.config.max_multiple)
+                multiples[multiple] = np.where(valid, ratio, np.nan)
+
+        raw = feature_matrix(metrics['revenue'], metrics['ebitda'], metrics['cash_flow'])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            mean = np.nan_to_num(np.nanmean(raw, axis=0))
+            std = np.nanstd(raw, axis=0)
+        std = np.where(np.nan_to_num(std) > 0, std, 1.0)
+        features = self._standardize(raw, mean, std)
+
+        with self._lock:
+            self.ids, self.names = ids, names
+            self.industry_codes, self.codes = industry_codes, codes
+            self.metrics, self.price, self.multiples = metrics, price, multiples
+            self.mean, self.std = mean, std
+            self.row_of = {record_id: row for row, record_id in enumerate(ids)}
+            # Only rows with at least one usable multiple can serve as comps
+            usable = np.zeros(len(ids), dtype=bool)
+            for values in multiples.values():
+                usable |= ~np.isnan(values)
+            self.usable_rows = np.flatnonzero(usable)
+            points = np.hstack([features, self._industry_block(codes)])[self.usable_rows]
+            self.tree = cKDTree(points) if len(points) else None
+        logger.info("comps_index_loaded", comps=len(ids), usable=len(self.usable_rows))
+
+    def _standardize(self, raw: np.ndarray, mean: np.ndarray, std: np.ndarray) -> np.ndarray:
+        # Missing features sit at the mean so they add no distance
+        standardized = np.nan_to_num((raw - mean) / std)
+        return standardized * np.asarray(self.config.feature_weights)
+
+    def _industry_block(self, codes: np.ndarray) -> np.ndarray:
+        """
+        One-hot industry columns scaled so two different industries sit
+        industry_penalty apart; rows without a known industry are all zero
+        """
+        block = np.zeros((len(codes), len(self.industry_codes)))
+        known = np.flatnonzero(codes >= 0)
+        block[known, codes[known]] = self.config.industry_penalty / np.sqrt(2.0)
+        return block
+
+    def nearest(
+        self,
+        targets: Sequence[CompanyFinancials],
+        k: int,
+        exclude_self: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, similarity) of the k nearest usable comps per target, closest first"""
+        revenue, ebitda, cash_flow = (_column(targets, metric) for metric in METRICS)
+        codes = np.array([
+            self.industry_codes.get((target.industry or '').strip().lower(), -1) for target in targets
+        ], dtype=np.int64)
+        query = np.hstack([
+            self._standardize(feature_matrix(revenue, ebitda, cash_flow), self.mean, self.std),
+            self._industry_block(codes),
+        ])
+
+        k = min(k, len(self.usable_rows))
+        rows = np.full((len(targets), k), -1, dtype=np.int64)
+        if k == 0 or len(targets) == 0:
+            return rows, np.zeros(rows.shape)
+
+        # A target that is itself in the index must not be its own comp, so
+        # ask for one extra neighbour and drop the target's own row
+        extra = 1 if exclude_self and len(self.usable_rows) > k else 0
+        distances, found = self.tree.query(query, k=k + extra, workers=-1)
+        distances = distances.reshape(len(targets), -1)
+        found = self.usable_rows[found.reshape(len(targets), -1)]
+        if extra:
+            self_rows = np.array([self.row_of.get(target.id, -1) for target in targets], dtype=np.int64)
+            keep = np.argsort(found == self_rows[:, None], axis=1, kind='stable')[:, :k]
+            found = np.take_along_axis(found, keep, axis=1)
+            distances = np.take_along_axis(distances, keep, axis=1)
+
+        rows[:] = found
+        similarity = 1.0 / (1.0 + distances)
+        return rows, similarity
+
+    def value(self, targets: Sequence[CompanyFinancials], k: Optional[int] = None, exclude_self: bool = True) -> CompsResult:
+        """Multiple-based valuations for a batch of targets"""
+        with self._lock:
+            rows, similarity = self.nearest(targets, k or self.config.k, exclude_self=exclude_self)
+            safe_rows = np.maximum(rows, 0)
+
+            implied = {}
+            for multiple, metric in MULTIPLES.items():
+                comp_multiples = self.multiples[multiple][safe_rows] if len(self) else np.full(rows.shape, np.nan)
+                comp_multiples = np.where(rows >= 0, comp_multiples, np.nan)
+                target_metric = _column(targets, metric)
+                median_multiple = weighted_quantile(comp_multiples, similarity, 0.5)
+                implied[multiple] = np.where(target_metric > 0, median_multiple * target_metric, np.nan)
+
+            stacked = np.column_stack(list(implied.values())) if targets else np.zeros((0, len(MULTIPLES)))
+            # Targets without any usable multiple come out as NaN
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                value = np.nanmean(stacked, axis=1)
+                low = np.nanpercentile(stacked, 25, axis=1)
+                high = np.nanpercentile(stacked, 75, axis=1)
+            return CompsResult(rows, similarity, implied, low, high, value)
+
+    def comparable(self, row: int) -> Dict:
+        """valuation_comparables-shaped view of one comp"""
+        return {
+            'company_id': self.ids[row],
+            'name': self.names[row],
+            'metrics': {
+                'revenue': _none_if_nan(self.metrics['revenue'][row]),
+                'ebitda': _none_if_nan(self.metrics['ebitda'][row]),
+                'cash_flow': _none_if_nan(self.metrics['cash_flow'][row]),
+                'asking_price': _none_if_nan(self.price[row]),
+                **{multiple: _none_if_nan(values[row]) for multiple, values in self.multiples.items()},
+            },
+        }
+
+
+def _none_if_nan(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+def records_from_listings(listings: Sequence[Dict]) -> List[CompanyFinancials]:
+    """CompanyFinancials from listings in the mock_businesses.json shape"""
+    records = []
+    for listing in listings:
+        financials = listing.get('financials') or {}
+        records.append(CompanyFinancials(
+            id=str(listing['id']),
+            name=listing.get('name'),
+            industry=listing.get('industry'),
+            revenue=listing.get('revenue'),
+            ebitda=listing.get('ebitda'),
+            cash_flow=listing.get('cashFlow', financials.get('cashFlow')),
+            asking_price=listing.get('askingPrice')
+        ))
+    return records
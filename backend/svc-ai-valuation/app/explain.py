@@ -0,0 +1,103 @@
+"""
+Driver attribution for property valuations
+
+Exact mode uses a SHAP TreeExplainer, built once per model version and
+cached, on the whole batch in one call. Fast mode asks XGBoost for
+approximate (Saabas) contributions, which is a single tree walk per row,
+and keeps only the top-N drivers by absolute contribution. Both return the
+driver_attribution shape stored on property_valuations.
+"""
+
+import threading
+from typing import Dict, List, Literal, NamedTuple, Optional
+
+import numpy as np
+import structlog
+
+from app.property_model import FEATURE_NAMES, ModelRegistry
+
+logger = structlog.get_logger()
+
+ExplainMode = Literal['none', 'fast', 'exact']
+
+
+class Attribution(NamedTuple):
+    contributions: np.ndarray  # (rows, features)
+    base_value: np.ndarray     # (rows,)
+
+
+class ExplainerCache:
+    """TreeExplainer per model version; building one walks every tree"""
+
+    def __init__(self, registry: ModelRegistry):
+        self.registry = registry
+        self._explainers: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def get(self, version: str):
+        with self._lock:
+            if version not in self._explainers:
+                import shap
+
+                self._explainers[version] = shap.TreeExplainer(self.registry.get(version))
+                logger.info("tree_explainer_built", version=version)
+            return self._explainers[version]
+
+    def exact(self, version: str, features: np.ndarray) -> Attribution:
+        explainer = self.get(version)
+        contributions = np.asarray(explainer.shap_values(features), dtype=np.float64)
+        base_value = np.broadcast_to(np.asarray(explainer.expected_value, dtype=np.float64), (len(features),))
+        return Attribution(contributions, base_value)
+
+    def fast(self, version: str, features: np.ndarray) -> Attribution:
+        import xgboost as xgb
+
+        booster = self.registry.get(version)
+        # Last column is the bias (expected value) term
+        contributions = booster.predict(
+            xgb.DMatrix(features, feature_names=FEATURE_NAMES),
+            pred_contribs=True,
+            approx_contribs=True
+        ).astype(np.float64)
+        return Attribution(contributions[:, :-1], contributions[:, -1])
+
+    def explain(self, version: str, features: np.ndarray, mode: ExplainMode) -> Optional[Attribution]:
+        if mode == 'none' or len(features) == 0:
+            return None
+        if mode == 'fast':
+            return self.fast(version, features)
+        return self.exact(version, features)
+
+
+def top_drivers(
+    attribution: Attribution,
+    features: np.ndarray,
+    top_n: Optional[int] = None
+) -> List[Dict]:
+    """driver_attribution JSON per row, drivers ordered by |contribution|"""
+    contributions = attribution.contributions
+    num_features = contributions.shape[1]
+    top_n = num_features if top_n is None else min(top_n, num_features)
+
+    magnitude = np.abs(contributions)
+    if top_n < num_features:
+        top = np.argpartition(-magnitude, top_n - 1, axis=1)[:, :top_n]
+    else:
+        top = np.tile(np.arange(num_features), (len(contributions), 1))
+    order = np.argsort(-np.take_along_axis(magnitude, top, axis=1), axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+
+    results = []
+    for row in range(len(contributions)):
+        results.append({
+            'base_value': float(attribution.base_value[row]),
+            'drivers': [
+                {
+                    'feature': FEATURE_NAMES[column],
+                    'value': None if np.isnan(features[row, column]) else float(features[row, column]),
+                    'contribution': float(contributions[row, column]),
+                }
+                for column in top[row]
+            ],
+        })
+    return results
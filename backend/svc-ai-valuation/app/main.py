@@ -0,0 +1,357 @@
+from fastapi import FastAPI, HTTPException
+from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Literal
+import json
+import os
+import threading
+import time
+import numpy as np
+import structlog
+from datetime import datetime
+
+from app.comparables import CompsQuery, PostgresPropertySource, PropertyCompsIndex
+from app.comps import CompanyFinancials, CompsIndex, records_from_listings
+from app.explain import ExplainerCache, ExplainMode, top_drivers
+from app.property_model import ModelRegistry, PropertyFeatures, feature_matrix
+from app.dcf import DcfAssumptions, Scenario, Volatility, blend, run_dcf, summarize
+
+# Initialize logger
+logger = structlog.get_logger()
+
+# Initialize FastAPI app
+app = FastAPI(
+    title="AcquiSmart AI Valuation Service",
+    description="Comparable-company and multiple-based valuation service",
+    version="1.0.0"
+)
+
+# CORS middleware
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+# Request/Response models
+class LoadCompsRequest(BaseModel):
+    companies: List[CompanyFinancials]
+
+class CompsValuationRequest(BaseModel):
+    targets: List[CompanyFinancials]
+    k: Optional[int] = Field(default=None, ge=1, le=100)
+    exclude_self: bool = True
+
+class ValuationComparable(BaseModel):
+    company_id: str
+    name: Optional[str] = None
+    metrics: Dict[str, Any]
+    similarity_score: float
+
+class CompsValuation(BaseModel):
+    entity_id: str
+    method: str = "market_comps"
+    value: Optional[float] = None
+    low: Optional[float] = None
+    high: Optional[float] = None
+    implied: Dict[str, Optional[float]]
+    comparables: List[ValuationComparable]
+
+class CompsValuationResponse(BaseModel):
+    valuations: List[CompsValuation]
+
+class DcfRequest(BaseModel):
+    entities: List[DcfAssumptions]
+    scenarios: List[Scenario] = Field(default_factory=lambda: [Scenario()])
+    method: Literal["income_dcf", "hybrid"] = "income_dcf"
+    # Weight of the DCF in a hybrid valuation; the rest is market comps
+    hybrid_weight: float = Field(default=0.5, ge=0, le=1)
+    draws: int = Field(default=10000, ge=0, le=200000)
+    volatility: Volatility = Field(default_factory=Volatility)
+    quantiles: List[float] = Field(default_factory=lambda: [5, 25, 50, 75, 95])
+    seed: Optional[int] = None
+
+class ScenarioValuation(BaseModel):
+    scenario_id: Optional[str] = None
+    scenario: str
+    base: float
+    mean: float
+    percentiles: Dict[str, float]
+
+class DcfValuation(BaseModel):
+    entity_id: str
+    method: str
+    scenarios: List[ScenarioValuation]
+
+class DcfResponse(BaseModel):
+    valuations: List[DcfValuation]
+    stats: Dict[str, float]
+
+class PropertyValuationRequest(BaseModel):
+    properties: List[PropertyFeatures]
+    model_version: Optional[str] = None
+    explain: ExplainMode = "fast"
+    # Drivers kept per property; None keeps every feature
+    top_n: Optional[int] = Field(default=5, ge=1)
+
+class PropertyValuation(BaseModel):
+    property_id: str
+    estimated_value: float
+    model_version: str
+    driver_attribution: Optional[Dict[str, Any]] = None
+
+class PropertyValuationResponse(BaseModel):
+    valuations: List[PropertyValuation]
+    stats: Dict[str, float]
+
+class PropertyCompsRequest(BaseModel):
+    queries: List[CompsQuery]
+
+class PropertyCompsResponse(BaseModel):
+    # property_valuations.comparables per query, closest first
+    comparables: List[List[Dict[str, Any]]]
+    stats: Dict[str, float]
+
+
+def _optional(value: float) -> Optional[float]:
+    return None if np.isnan(value) else float(value)
+
+
+# Comparable set, seeded from COMPS_FILE (listings in the mock_businesses.json shape)
+comps_index = CompsIndex()
+
+
+@app.on_event("startup")
+async def load_comps():
+    comps_file = os.getenv("COMPS_FILE")
+    if not comps_file or not os.path.exists(comps_file):
+        return
+    try:
+        with open(comps_file) as f:
+            comps_index.load(records_from_listings(json.load(f)))
+    except Exception as e:
+        logger.error("comps_load_error", error=str(e))
+
+
+# Property models and their SHAP explainers, both cached per model version
+model_registry = ModelRegistry()
+explainer_cache = ExplainerCache(model_registry)
+
+
+@app.on_event("startup")
+async def warm_property_model():
+    version = model_registry.default_version()
+    if version is None:
+        return
+    try:
+        # Pay model load and explainer construction before the first request
+        explainer_cache.get(version)
+    except Exception as e:
+        logger.error("property_model_load_error", version=version, error=str(e))
+
+
+# Geo index over active properties, rebuilt from Postgres in the background
+property_comps = PropertyCompsIndex()
+
+
+@app.on_event("startup")
+async def load_property_comps():
+    if os.getenv("PROPERTY_COMPS_ENABLED", "true").lower() != "true":
+        return
+    try:
+        property_comps.source = PostgresPropertySource()
+        property_comps.interval_seconds = float(os.getenv("PROPERTY_COMPS_REFRESH_SECONDS", "300"))
+        property_comps.rebuild()
+    except Exception as e:
+        # Serve the other endpoints anyway; the refresher retries the rebuild
+        logger.error("property_comps_load_error", error=str(e))
+    if property_comps.source is not None:
+        threading.Thread(target=property_comps.run_forever, daemon=True).start()
+
+
+@app.on_event("shutdown")
+async def stop_property_comps_refresher():
+    property_comps.stop()
+
+
+# Health check
+@app.get("/health")
+async def health_check():
+    return {
+        "status": "healthy",
+        "service": "svc-ai-valuation",
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+# Comparable set management
+@app.post("/comps/index")
+def load_comps_index(request: LoadCompsRequest):
+    """
+    Replace the comparable set with the given company/listing financials
+    """
+    try:
+        comps_index.load(request.companies)
+        return {"comps": len(comps_index), "usable": len(comps_index.usable_rows)}
+    except Exception as e:
+        logger.error("comps_index_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Market comps valuation endpoint
+@app.post("/valuations/comps", response_model=CompsValuationResponse)
+def value_by_comps(request: CompsValuationRequest):
+    """
+    Value a batch of targets from the multiples of their nearest comparables
+    """
+    try:
+        logger.info("value_by_comps", targets=len(request.targets))
+        result = comps_index.value(request.targets, k=request.k, exclude_self=request.exclude_self)
+        valuations = []
+        for i, target in enumerate(request.targets):
+            valuations.append(CompsValuation(
+                entity_id=target.id,
+                value=_optional(result.value[i]),
+                low=_optional(result.low[i]),
+                high=_optional(result.high[i]),
+                implied={multiple: _optional(values[i]) for multiple, values in result.implied.items()},
+                comparables=[
+                    ValuationComparable(**comps_index.comparable(row), similarity_score=round(float(similarity), 4))
+                    for row, similarity in zip(result.comp_rows[i], result.similarity[i]) if row >= 0
+                ]
+            ))
+        return CompsValuationResponse(valuations=valuations)
+    except Exception as e:
+        logger.error("comps_valuation_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# DCF / scenario valuation endpoint
+@app.post("/valuations/dcf", response_model=DcfResponse)
+def value_by_dcf(request: DcfRequest):
+    """
+    Monte Carlo DCF for every entity under every scenario; hybrid blends
+    in the market comps value
+    """
+    try:
+        start = time.perf_counter()
+        logger.info(
+            "value_by_dcf",
+            entities=len(request.entities),
+            scenarios=len(request.scenarios),
+            draws=request.draws
+        )
+        result = run_dcf(
+            request.entities,
+            request.scenarios,
+            draws=request.draws,
+            volatility=request.volatility,
+            quantiles=request.quantiles,
+            seed=request.seed,
+            memory_budget_mb=float(os.getenv("DCF_MEMORY_BUDGET_MB", "256"))
+        )
+        if request.method == "hybrid":
+            comps = comps_index.value([
+                CompanyFinancials(
+                    id=entity.entity_id,
+                    revenue=entity.revenue,
+                    ebitda=entity.revenue * entity.ebitda_margin
+                )
+                for entity in request.entities
+            ])
+            result = blend(result, comps.value, request.hybrid_weight)
+
+        valuations = [
+            DcfValuation(
+                entity_id=entity.entity_id,
+                method=request.method,
+                scenarios=[
+                    ScenarioValuation(scenario_id=scenario.id, scenario=scenario.name, **summary)
+                    for scenario, summary in zip(request.scenarios, entity_summaries)
+                ]
+            )
+            for entity, entity_summaries in zip(request.entities, summarize(result, request.quantiles))
+        ]
+        return DcfResponse(valuations=valuations, stats={"seconds": time.perf_counter() - start})
+    except Exception as e:
+        logger.error("dcf_valuation_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Property valuation endpoint
+@app.post("/valuations/property", response_model=PropertyValuationResponse)
+def value_properties(request: PropertyValuationRequest):
+    """
+    Model valuations for a batch of properties with SHAP driver attribution;
+    explain="fast" returns approximate top-N drivers, "exact" full TreeSHAP
+    """
+    version = request.model_version or model_registry.default_version()
+    if version is None:
+        raise HTTPException(status_code=503, detail="No property model available")
+    try:
+        logger.info("value_properties", properties=len(request.properties), version=version, explain=request.explain)
+        features = feature_matrix(request.properties)
+
+        start = time.perf_counter()
+        predictions = model_registry.predict(version, features)
+        predict_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        attribution = explainer_cache.explain(version, features, request.explain)
+        drivers = top_drivers(attribution, features, request.top_n) if attribution else [None] * len(features)
+        explain_seconds = time.perf_counter() - start
+
+        valuations = [
+            PropertyValuation(
+                property_id=prop.id,
+                estimated_value=float(prediction),
+                model_version=version,
+                driver_attribution=driver_attribution
+            )
+            for prop, prediction, driver_attribution in zip(request.properties, predictions, drivers)
+        ]
+        return PropertyValuationResponse(
+            valuations=valuations,
+            stats={"predict_seconds": predict_seconds, "explain_seconds": explain_seconds}
+        )
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except Exception as e:
+        logger.error("property_valuation_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Property comparables endpoints
+@app.post("/comparables/properties", response_model=PropertyCompsResponse)
+def find_property_comps(request: PropertyCompsRequest):
+    """
+    Nearest active properties of the same type within the bedrooms/sqft bands
+    """
+    try:
+        start = time.perf_counter()
+        comparables = property_comps.nearest(request.queries)
+        return PropertyCompsResponse(
+            comparables=comparables,
+            stats={"seconds": time.perf_counter() - start, "properties": len(property_comps.snapshot)}
+        )
+    except Exception as e:
+        logger.error("property_comps_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/comparables/properties/rebuild")
+def rebuild_property_comps():
+    """
+    Rebuild the geo index from a fresh Postgres snapshot
+    """
+    if property_comps.source is None:
+        raise HTTPException(status_code=503, detail="Property comparables source not configured")
+    try:
+        return {"properties": property_comps.rebuild()}
+    except Exception as e:
+        logger.error("property_comps_rebuild_error", error=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host="0.0.0.0", port=8003)
@@ -0,0 +1,110 @@
+"""
+Property valuation models
+
+XGBoost regressors saved as MODEL_DIR/property_value_<version>.json, loaded
+on first use and kept per version. Features come straight from the
+properties table.
+"""
+
+import os
+import re
+import threading
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import structlog
+from pydantic import BaseModel
+
+logger = structlog.get_logger()
+
+DEFAULT_MODEL_DIR = os.getenv('MODEL_DIR', 'models')
+MODEL_FILE_RE = re.compile(r'^property_value_(?P<version>.+)\.json$')
+
+PROPERTY_TYPES = ('single_family', 'condo', 'townhouse', 'multi_family', 'land', 'commercial')
+
+FEATURE_NAMES = [
+    'bedrooms', 'bathrooms', 'sqft', 'lot_size', 'age',
+    'latitude', 'longitude',
+    *[f'property_type_{property_type}' for property_type in PROPERTY_TYPES],
+]
+
+
+class PropertyFeatures(BaseModel):
+    id: str
+    property_type: str
+    bedrooms: int
+    bathrooms: float
+    sqft: int
+    lot_size: Optional[int] = None
+    year_built: Optional[int] = None
+    latitude: float
+    longitude: float
+
+
+def feature_matrix(properties: Sequence[PropertyFeatures], as_of_year: Optional[int] = None) -> np.ndarray:
+    """One row per property in FEATURE_NAMES order; missing values are NaN"""
+    as_of_year = as_of_year or date.today().year
+    matrix = np.full((len(properties), len(FEATURE_NAMES)), np.nan, dtype=np.float32)
+    type_offset = FEATURE_NAMES.index(f'property_type_{PROPERTY_TYPES[0]}')
+    for row, prop in enumerate(properties):
+        matrix[row, :7] = (
+            prop.bedrooms,
+            prop.bathrooms,
+            prop.sqft,
+            np.nan if prop.lot_size is None else prop.lot_size,
+            np.nan if prop.year_built is None else as_of_year - prop.year_built,
+            prop.latitude,
+            prop.longitude,
+        )
+        matrix[row, type_offset:] = 0.0
+        if prop.property_type in PROPERTY_TYPES:
+            matrix[row, type_offset + PROPERTY_TYPES.index(prop.property_type)] = 1.0
+    return matrix
+
+
+class ModelRegistry:
+    """Loads each model version once; the newest file is the default version"""
+
+    def __init__(self, model_dir: str = DEFAULT_MODEL_DIR):
+        self.model_dir = model_dir
+        self._models: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self.model_dir):
+            return []
+        files = [
+            (os.path.getmtime(os.path.join(self.model_dir, name)), match.group('version'))
+            for name in os.listdir(self.model_dir)
+            for match in [MODEL_FILE_RE.match(name)] if match
+        ]
+        return [version for _, version in sorted(files)]
+
+    def default_version(self) -> Optional[str]:
+        configured = os.getenv('PROPERTY_MODEL_VERSION')
+        if configured:
+            return configured
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def get(self, version: str):
+        with self._lock:
+            if version not in self._models:
+                import xgboost as xgb
+
+                path = os.path.join(self.model_dir, f'property_value_{version}.json')
+                if not os.path.exists(path):
+                    raise KeyError(f"Unknown model version: {version}")
+                booster = xgb.Booster()
+                booster.load_model(path)
+                booster.feature_names = FEATURE_NAMES
+                self._models[version] = booster
+                logger.info("property_model_loaded", version=version)
+            return self._models[version]
+
+    def predict(self, version: str, features: np.ndarray) -> np.ndarray:
+        import xgboost as xgb
+
+        booster = self.get(version)
+        return booster.predict(xgb.DMatrix(features, feature_names=FEATURE_NAMES))
@@ -253,6 +253,22 @@ CREATE TABLE kpi_values (
   as_of DATE
 );
 
+CREATE TABLE kpi_forecasts (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  tenant_id UUID NOT NULL REFERENCES tenants(id),
+  kpi_id UUID NOT NULL REFERENCES kpis(id),
+  entity_id UUID NOT NULL,
+  entity_type VARCHAR(100) NOT NULL,
+  date DATE NOT NULL,
+  value NUMERIC(20, 4),
+  lower_bound NUMERIC(20, 4),
+  upper_bound NUMERIC(20, 4),
+  model VARCHAR(50) NOT NULL,
+  series_hash VARCHAR(64) NOT NULL, -- hash of the history the forecast was fit on
+  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE(kpi_id, entity_id, date, model)
+);
+
 -- Valuation
 
 CREATE TABLE valuations (
@@ -347,6 +363,7 @@ CREATE INDEX idx_extracted_fields_key ON extracted_fields(key);
 CREATE INDEX idx_kpi_values_entity ON kpi_values(entity_id, entity_type);
 CREATE INDEX idx_kpi_values_date ON kpi_values(date DESC);
 CREATE INDEX idx_kpi_values_kpi_date ON kpi_values(kpi_id, date DESC);
+CREATE INDEX idx_kpi_forecasts_entity ON kpi_forecasts(entity_id, entity_type);
 
 CREATE INDEX idx_valuations_entity ON valuations(entity_id, entity_type);
 CREATE INDEX idx_valuations_status ON valuations(status);
@@ -368,6 +385,7 @@ ALTER TABLE funds ENABLE ROW LEVEL SECURITY;
 ALTER TABLE portfolio_companies ENABLE ROW LEVEL SECURITY;
 ALTER TABLE documents ENABLE ROW LEVEL SECURITY;
 ALTER TABLE kpi_values ENABLE ROW LEVEL SECURITY;
+ALTER TABLE kpi_forecasts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE valuations ENABLE ROW LEVEL SECURITY;
 ALTER TABLE work_items ENABLE ROW LEVEL SECURITY;
 ALTER TABLE audit_events ENABLE ROW LEVEL SECURITY;
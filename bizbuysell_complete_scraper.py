@@ -20,17 +20,24 @@ from selenium.webdriver.chrome.options import Options
 from bs4 import BeautifulSoup
 import json
 import csv
-import requests
 import os
 import time
 from datetime import datetime
 from urllib.parse import urljoin
 
+from ml.http_cache import DEFAULT_CACHE_DIR, HttpCache
+
 class BizBuySellScraper:
-    def __init__(self, download_images=True, headless=True):
-        """Initialize the scraper"""
+    def __init__(self, download_images=True, headless=True, cache_dir=DEFAULT_CACHE_DIR, offline=False):
+        """Initialize the scraper
+
+        Images are fetched through an on-disk HTTP cache, so unchanged ones
+        are revalidated rather than re-downloaded; offline=True replays
+        them from the cache without touching the network.
+        """
         self.download_images = download_images
         self.headless = headless
+        self.http_cache = HttpCache(cache_dir, offline=offline)
         self.listings = []
         
         # Create directories
@@ -71,19 +78,19 @@ class BizBuySellScraper:
             elif url.startswith('/'):
                 url = 'https://www.bizbuysell.com' + url
             
-            response = requests.get(url, timeout=10, headers={
+            response = self.http_cache.get(url, timeout=10, headers={
                 'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
             })
             
-            if response.status_code == 200:
-                filepath = os.path.join('images', filename)
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                print(f"✓ Downloaded: {filename}")
+            filepath = os.path.join('images', filename)
+            if response.from_cache and os.path.exists(filepath):
+                print(f"✓ Unchanged: {filename}")
                 return filepath
-            else:
-                print(f"✗ Failed to download {filename}: Status {response.status_code}")
-                return None
+            
+            with open(filepath, 'wb') as f:
+                f.write(response.content)
+            print(f"✓ Downloaded: {filename}")
+            return filepath
                 
         except Exception as e:
             print(f"✗ Error downloading {filename}: {e}")
@@ -12,16 +12,24 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from bs4 import BeautifulSoup
 import json
 import csv
-import requests
 import os
 import time
+import re
 from datetime import datetime
 
+from ml.http_cache import DEFAULT_CACHE_DIR, HttpCache
+
 class BizBuySellScraperV2:
-    def __init__(self, download_images=True, headless=False):
-        """Initialize the scraper"""
+    def __init__(self, download_images=True, headless=False, cache_dir=DEFAULT_CACHE_DIR, offline=False):
+        """Initialize the scraper
+
+        Images are fetched through an on-disk HTTP cache, so unchanged ones
+        are revalidated rather than re-downloaded; offline=True replays
+        them from the cache without touching the network.
+        """
         self.download_images = download_images
         self.headless = headless
+        self.http_cache = HttpCache(cache_dir, offline=offline)
         self.listings = []
 
         # Create directories
@@ -67,19 +75,19 @@ class BizBuySellScraperV2:
             elif url.startswith('/'):
                 url = 'https://www.bizbuysell.com' + url
 
-            response = requests.get(url, timeout=10, headers={
+            response = self.http_cache.get(url, timeout=10, headers={
                 'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36'
             })
 
-            if response.status_code == 200:
-                filepath = os.path.join('images', filename)
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
-                print(f"  ✓ Downloaded: {filename}")
+            filepath = os.path.join('images', filename)
+            if response.from_cache and os.path.exists(filepath):
+                print(f"  ✓ Unchanged: {filename}")
                 return filepath
-            else:
-                print(f"  ✗ Failed to download {filename}: Status {response.status_code}")
-                return None
+
+            with open(filepath, 'wb') as f:
+                f.write(response.content)
+            print(f"  ✓ Downloaded: {filename}")
+            return filepath
 
         except Exception as e:
             print(f"  ✗ Error downloading {filename}: {e}")
@@ -160,6 +168,108 @@ class BizBuySellScraperV2:
 
         return listing_urls
 
+    @staticmethod
+    def parse_listing_page(html, url, idx):
+        """Parse listing fields from a detail page's HTML"""
+        soup = BeautifulSoup(html, 'html.parser')
+
+        listing = {
+            'id': str(idx),
+            'url': url,
+            'scraped_at': datetime.now().isoformat()
+        }
+
+        # Extract title - try multiple approaches
+        title_selectors = ['h1', '.business-title', '.listing-title', '[class*="title"]']
+        for selector in title_selectors:
+            title = soup.select_one(selector)
+            if title and title.get_text(strip=True):
+                listing['title'] = title.get_text(strip=True)
+                break
+
+        # Extract all text content and look for patterns
+        page_text = soup.get_text()
+
+        # Look for price patterns
+        price_patterns = [
+            r'\$[\d,]+(?:\.\d{2})?(?:\s*(?:Million|M|K))?',
+            r'Asking Price:?\s*\$?([\d,]+)',
+            r'Price:?\s*\$?([\d,]+)'
+        ]
+        for pattern in price_patterns:
+            match = re.search(pattern, page_text, re.IGNORECASE)
+            if match:
+                listing['price'] = match.group(0)
+                break
+
+        # Look for revenue
+        revenue_patterns = [
+            r'Revenue:?\s*\$?([\d,]+(?:\.\d+)?(?:\s*(?:Million|M|K))?)',
+            r'Gross Revenue:?\s*\$?([\d,]+)'
+        ]
+        for pattern in revenue_patterns:
+            match = re.search(pattern, page_text, re.IGNORECASE)
+            if match:
+                listing['revenue'] = match.group(0)
+                break
+
+        # Look for cash flow
+        cf_patterns = [
+            r'Cash Flow:?\s*\$?([\d,]+(?:\.\d+)?(?:\s*(?:Million|M|K))?)',
+            r'SDE:?\s*\$?([\d,]+)',
+            r'EBITDA:?\s*\$?([\d,]+)'
+        ]
+        for pattern in cf_patterns:
+            match = re.search(pattern, page_text, re.IGNORECASE)
+            if match:
+                listing['cash_flow'] = match.group(0)
+                break
+
+        # Extract location
+        location_patterns = [
+            r'Location:?\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*,\s*[A-Z]{2})',
+            r'([A-Z][a-z]+,\s*[A-Z]{2})'
+        ]
+        for pattern in location_patterns:
+            match = re.search(pattern, page_text)
+            if match:
+                listing['location'] = match.group(1)
+                break
+
+        # Extract description
+        desc_selectors = ['.description', '.business-description', '[class*="description"]', 'p']
+        for selector in desc_selectors:
+            desc = soup.select_one(selector)
+            if desc:
+                desc_text = desc.get_text(strip=True)
+                if len(desc_text) > 100:  # Only if substantial
+                    listing['description'] = desc_text[:500]
+                    break
+
+        # Extract images
+        images = soup.find_all('img')
+        image_urls = []
+
+        for img in images[:5]:
+            img_url = img.get('src') or img.get('data-src') or img.get('data-lazy-src')
+            if img_url and 'logo' not in img_url.lower() and img_url.startswith('http'):
+                image_urls.append(img_url)
+
+        listing['image_urls'] = image_urls
+
+        # Extract industry/category
+        category_patterns = [
+            r'Category:?\s*([A-Za-z\s&-]+)',
+            r'Industry:?\s*([A-Za-z\s&-]+)'
+        ]
+        for pattern in category_patterns:
+            match = re.search(pattern, page_text, re.IGNORECASE)
+            if match:
+                listing['industry'] = match.group(1).strip()
+                break
+
+        return listing
+
     def scrape_listing_detail(self, url, idx):
         """Scrape details from a single listing page"""
         print(f"\n[{idx}] Scraping: {url}")
@@ -173,112 +283,19 @@ class BizBuySellScraperV2:
             # Save screenshot
             driver.save_screenshot(f'output/listing_{idx}_screenshot.png')
 
-            soup = BeautifulSoup(driver.page_source, 'html.parser')
-
-            listing = {
-                'id': str(idx),
-                'url': url,
-                'scraped_at': datetime.now().isoformat()
-            }
-
-            # Extract title - try multiple approaches
-            title_selectors = ['h1', '.business-title', '.listing-title', '[class*="title"]']
-            for selector in title_selectors:
-                title = soup.select_one(selector)
-                if title and title.get_text(strip=True):
-                    listing['title'] = title.get_text(strip=True)
-                    break
-
-            # Extract all text content and look for patterns
-            page_text = soup.get_text()
-
-            # Look for price patterns
-            import re
-            price_patterns = [
-                r'\$[\d,]+(?:\.\d{2})?(?:\s*(?:Million|M|K))?',
-                r'Asking Price:?\s*\$?([\d,]+)',
-                r'Price:?\s*\$?([\d,]+)'
-            ]
-            for pattern in price_patterns:
-                match = re.search(pattern, page_text, re.IGNORECASE)
-                if match:
-                    listing['price'] = match.group(0)
-                    break
-
-            # Look for revenue
-            revenue_patterns = [
-                r'Revenue:?\s*\$?([\d,]+(?:\.\d+)?(?:\s*(?:Million|M|K))?)',
-                r'Gross Revenue:?\s*\$?([\d,]+)'
-            ]
-            for pattern in revenue_patterns:
-                match = re.search(pattern, page_text, re.IGNORECASE)
-                if match:
-                    listing['revenue'] = match.group(0)
-                    break
-
-            # Look for cash flow
-            cf_patterns = [
-                r'Cash Flow:?\s*\$?([\d,]+(?:\.\d+)?(?:\s*(?:Million|M|K))?)',
-                r'SDE:?\s*\$?([\d,]+)',
-                r'EBITDA:?\s*\$?([\d,]+)'
-            ]
-            for pattern in cf_patterns:
-                match = re.search(pattern, page_text, re.IGNORECASE)
-                if match:
-                    listing['cash_flow'] = match.group(0)
-                    break
-
-            # Extract location
-            location_patterns = [
-                r'Location:?\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*,\s*[A-Z]{2})',
-                r'([A-Z][a-z]+,\s*[A-Z]{2})'
-            ]
-            for pattern in location_patterns:
-                match = re.search(pattern, page_text)
-                if match:
-                    listing['location'] = match.group(1)
-                    break
+            listing = self.parse_listing_page(driver.page_source, url, idx)
+            image_urls = listing['image_urls']
 
-            # Extract description
-            desc_selectors = ['.description', '.business-description', '[class*="description"]', 'p']
-            for selector in desc_selectors:
-                desc = soup.select_one(selector)
-                if desc:
-                    desc_text = desc.get_text(strip=True)
-                    if len(desc_text) > 100:  # Only if substantial
-                        listing['description'] = desc_text[:500]
-                        break
-
-            # Extract images
-            images = soup.find_all('img')
-            image_urls = []
+            # Download images
             local_images = []
-
-            for img_idx, img in enumerate(images[:5]):
-                img_url = img.get('src') or img.get('data-src') or img.get('data-lazy-src')
-                if img_url and 'logo' not in img_url.lower() and img_url.startswith('http'):
-                    image_urls.append(img_url)
-
-                    if self.download_images and img_idx < 3:  # Download first 3
-                        img_filename = f"listing_{idx}_img_{img_idx+1}.jpg"
-                        local_path = self.download_image(img_url, img_filename)
-                        if local_path:
-                            local_images.append(local_path)
-
-            listing['image_urls'] = image_urls
+            if self.download_images:
+                for img_idx, img_url in enumerate(image_urls[:3]):  # Download first 3
+                    img_filename = f"listing_{idx}_img_{img_idx+1}.jpg"
+                    local_path = self.download_image(img_url, img_filename)
+                    if local_path:
+                        local_images.append(local_path)
             listing['local_images'] = local_images
 
-            # Extract industry/category
-            category_patterns = [
-                r'Category:?\s*([A-Za-z\s&-]+)',
-                r'Industry:?\s*([A-Za-z\s&-]+)'
-            ]
-            for pattern in category_patterns:
-                match = re.search(pattern, page_text, re.IGNORECASE)
-                if match:
-                    listing['industry'] = match.group(1).strip()
-                    break
-
             print(f"  ✓ Title: {listing.get('title', 'N/A')[:50]}")
             print(f"  ✓ Price: {listing.get('price', 'N/A')}")
             print(f"  ✓ Location: {listing.get('location', 'N/A')}")
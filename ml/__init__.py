@@ -0,0 +1,6 @@
+"""
+Listing scrapers, parsers and the multi-source crawler
+
+Modules import each other relative to this package, so run them from the
+repository root, e.g. python -m ml.crawler or python -m ml.clearlyacquired_scraper
+"""
@@ -1,90 +1,339 @@
 """
 API-based scraper for ClearlyAcquired - captures network requests
+
+Loads the listings page once in Chrome, reads the JSON bodies of the
+listing API calls through CDP Network.getResponseBody, then replays the
+other pages of those calls over a pooled HTTP session without
+rendering anything.
 """
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.desired_capabilities import DesiredCapabilities
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+import base64
+import copy
 import json
+import math
 import time
 import logging
 
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .embedded_state import extract_listings_from_html, find_listing_records
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Query/body parameters used for pagination, and how they advance
+PAGE_PARAMS = ('page', 'pageNumber', 'page_number', 'currentPage')
+OFFSET_PARAMS = ('offset', 'skip', 'start', 'from')
+SIZE_PARAMS = ('limit', 'pageSize', 'page_size', 'per_page', 'perPage', 'size', 'take')
+TOTAL_KEYS = ('total', 'totalCount', 'total_count', 'totalItems', 'total_items', 'count')
 
-def scrape_clearlyacquired_api():
-    """Scrape using network interception"""
+# Request headers worth carrying over when replaying an API call
+REPLAY_HEADERS = ('authorization', 'x-api-key', 'x-auth-token', 'x-requested-with', 'content-type', 'accept')
+
+
+def is_listing_call(url: str) -> bool:
+    return 'api' in url or 'listing' in url.lower()
+
+
+def find_total(payload: Any, returned: int = 0) -> Optional[int]:
+    """
+    Total record count advertised by a paginated payload, if any
+
+    Many APIs use 'count' for the size of the page rather than the whole
+    result, so it only counts as a total when it exceeds the returned records.
+    """
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            for key in TOTAL_KEYS:
+                value = node.get(key)
+                if isinstance(value, int) and not isinstance(value, bool):
+                    if key == 'count' and value <= returned:
+                        continue
+                    return value
+            stack.extend(value for value in node.values() if isinstance(value, dict))
+    return None
+
+
+def harvest_api_responses(driver) -> List[Dict]:
+    """Collect listing API calls and their JSON bodies from the performance log"""
+    requests_by_id: Dict[str, Dict] = {}
+    api_calls = []
+
+    for log in driver.get_log('performance'):
+        message = json.loads(log['message'])['message']
+        params = message.get('params', {})
+
+        if message['method'] == 'Network.requestWillBeSent':
+            request = params['request']
+            requests_by_id[params['requestId']] = {
+                'method': request.get('method', 'GET'),
+                'headers': request.get('headers', {}),
+                'post_data': request.get('postData'),
+            }
+
+        # Look for Network responses
+        elif message['method'] == 'Network.responseReceived':
+            response = params['response']
+            response_url = response['url']
+
+            # Filter for API calls
+            if not is_listing_call(response_url):
+                continue
+
+            call = {
+                'request_id': params['requestId'],
+                'url': response_url,
+                'status': response['status'],
+                'type': response['mimeType'],
+            }
+            call.update(requests_by_id.get(params['requestId'], {}))
+            api_calls.append(call)
+            logger.info(f"Found API call: {response_url}")
+
+    for call in api_calls:
+        if 'json' not in call['type']:
+            continue
+        try:
+            result = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': call['request_id']})
+        except Exception as e:
+            # Bodies are evicted for redirects and some cached responses
+            logger.debug(f"No body for {call['url']}: {e}")
+            continue
+        body = result['body']
+        if result.get('base64Encoded'):
+            body = base64.b64decode(body).decode('utf-8')
+        try:
+            call['payload'] = json.loads(body)
+        except json.JSONDecodeError:
+            continue
+
+    return api_calls
+
+
+def build_session(cookies: List[Dict], pool_size: int = 8) -> requests.Session:
+    """HTTP session with a connection pool, retries and the browser's cookies"""
+    session = requests.Session()
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    for cookie in cookies:
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+    return session
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _pagination(params: Dict[str, Any]) -> Optional[Tuple[str, str, int]]:
+    """(param, kind, current value) for the pagination parameter in params"""
+    # 'start' and 'from' often hold dates or opaque cursors rather than offsets
+    for kind, keys in (('page', PAGE_PARAMS), ('offset', OFFSET_PARAMS)):
+        for key in keys:
+            value = _as_int(params.get(key))
+            if value is not None:
+                return key, kind, value
+    return None
+
+
+def _request_params(call: Dict) -> Tuple[Dict[str, Any], bool]:
+    """Paging parameters of a call and whether they live in a JSON body"""
+    if call.get('method', 'GET').upper() != 'GET' and call.get('post_data'):
+        try:
+            body = json.loads(call['post_data'])
+            if isinstance(body, dict):
+                return body, True
+        except json.JSONDecodeError:
+            pass
+    params: Dict[str, Any] = {}
+    for key, value in parse_qsl(urlparse(call['url']).query, keep_blank_values=True):
+        params.setdefault(key, value)
+    return params, False
 
-    # Enable performance logging
-    caps = DesiredCapabilities.CHROME
-    caps['goog:loggingPrefs'] = {'performance': 'ALL'}
+
+def _fetch_page(session: requests.Session, call: Dict, overrides: Dict[str, Any]) -> Any:
+    """Replay call with the paging parameters in overrides changed"""
+    headers = {k: v for k, v in call.get('headers', {}).items() if k.lower() in REPLAY_HEADERS}
+    params, in_body = _request_params(call)
+    if in_body:
+        body = copy.deepcopy(params)
+        body.update(overrides)
+        response = session.request(call['method'], call['url'], json=body, headers=headers, timeout=30)
+    else:
+        # Rebuilt from the pairs so repeated parameters (status=a&status=b) survive
+        parts = urlparse(call['url'])
+        pairs = [
+            (key, overrides.get(key, value))
+            for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        ]
+        pairs.extend((key, value) for key, value in overrides.items() if key not in params)
+        response = session.get(urlunparse(parts._replace(query=urlencode(pairs))), headers=headers, timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def replay_pagination(
+    session: requests.Session,
+    call: Dict,
+    max_pages: int = 200,
+    workers: int = 4
+) -> List[Dict]:
+    """
+    Every page of a captured listing API call, in order
+
+    The captured call may be any page, so the pages before it are fetched
+    too; max_pages bounds the pages fetched besides the captured one.
+    """
+    captured = find_listing_records(call.get('payload'))
+    params, _ = _request_params(call)
+    pagination = _pagination(params)
+    if not captured or pagination is None:
+        return captured
+
+    key, kind, current = pagination
+    page_size = len(captured)
+    for size_key in SIZE_PARAMS:
+        if _as_int(params.get(size_key)):
+            page_size = _as_int(params[size_key])
+            break
+
+    if kind == 'page':
+        # Pages count from 1 unless the captured call shows they start at 0
+        first = 0 if current == 0 else 1
+        before = [(page, page_size) for page in range(first, current)]
+        position = (current - first) * page_size
+        step = 1
+    else:
+        # Offsets needn't be page-aligned; the first page then only
+        # contributes the records up to the captured offset
+        before = [(offset, page_size) for offset in range(current - page_size, 0, -page_size)][::-1]
+        head = current - page_size * len(before)
+        if head > 0:
+            before.insert(0, (0, head))
+        position = current
+        step = page_size
+
+    def fetch(value: int) -> List[Dict]:
+        return find_listing_records(_fetch_page(session, call, {key: value}))
+
+    def fetch_all(values: List[int]) -> List[List[Dict]]:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(fetch, values))
+
+    before = before[-max_pages:] if max_pages else []
+    records = []
+    for (_, take), page in zip(before, fetch_all([value for value, _ in before])):
+        records.extend(page[:take])
+    records.extend(captured)
+    budget = max_pages - len(before)
+
+    total = find_total(call['payload'], returned=len(captured))
+    if total is not None:
+        # Page count is known up front, so fetch the rest concurrently
+        remaining = min(math.ceil(max(total - position - len(captured), 0) / page_size), budget)
+        for page in fetch_all([current + index * step for index in range(1, remaining + 1)]):
+            records.extend(page)
+        return records
+
+    if len(captured) < page_size:
+        return records
+    for index in range(1, budget + 1):
+        page = fetch(current + index * step)
+        records.extend(page)
+        if len(page) < page_size:
+            break
+    return records
+
+
+def scrape_clearlyacquired_api(url: str = "https://app.clearlyacquired.com/listings", wait_seconds: int = 10):
+    """Scrape using network interception"""
 
     chrome_options = Options()
     chrome_options.add_argument("--headless=new")
     chrome_options.add_argument("--no-sandbox")
     chrome_options.add_argument("--disable-dev-shm-usage")
 
-    driver = webdriver.Chrome(options=chrome_options, desired_capabilities=caps)
+    # Enable performance logging
+    chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    driver = webdriver.Chrome(options=chrome_options)
 
     try:
-        url = "https://app.clearlyacquired.com/listings"
         logger.info(f"Loading {url}")
         driver.get(url)
 
         # Wait for page to load
-        time.sleep(10)
+        time.sleep(wait_seconds)
 
-        # Get network logs
-        logs = driver.get_log('performance')
+        # Get network logs and response bodies
+        api_calls = harvest_api_responses(driver)
+        cookies = driver.get_cookies()
 
-        api_calls = []
-        for log in logs:
-            message = json.loads(log['message'])['message']
-
-            # Look for Network responses
-            if message['method'] == 'Network.responseReceived':
-                response_url = message['params']['response']['url']
-
-                # Filter for API calls
-                if 'api' in response_url or 'listing' in response_url.lower():
-                    api_calls.append({
-                        'url': response_url,
-                        'status': message['params']['response']['status'],
-                        'type': message['params']['response']['mimeType']
-                    })
-                    logger.info(f"Found API call: {response_url}")
+        # Try to extract data from page
+        page_source = driver.page_source
+    finally:
+        driver.quit()
 
-        # Save API calls
-        with open('clearlyacquired_api_calls.json', 'w') as f:
-            json.dump(api_calls, f, indent=2)
+    logger.info(f"Found {len(api_calls)} API calls")
 
-        logger.info(f"Found {len(api_calls)} API calls")
+    # Save API calls (without bodies)
+    with open('clearlyacquired_api_calls.json', 'w') as f:
+        json.dump([{k: v for k, v in call.items() if k != 'payload'} for call in api_calls], f, indent=2)
 
-        # Try to extract data from page
-        page_source = driver.page_source
+    # Replay paginated listing calls over plain HTTP; no further rendering
+    session = build_session(cookies)
+    listings = []
+    for call in api_calls:
+        if not find_listing_records(call.get('payload')):
+            continue
+        try:
+            records = replay_pagination(session, call)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error replaying {call['url']}: {e}")
+            records = find_listing_records(call['payload'])
+        logger.info(f"Harvested {len(records)} listings from {call['url']}")
+        listings.extend(records)
 
-        # Look for JSON data in script tags
-        if '__NUXT__' in page_source or '__INITIAL_STATE__' in page_source:
+    # Fall back to hydration state embedded in the rendered page
+    if not listings:
+        listings = extract_listings_from_html(page_source)
+        if listings:
+            logger.info(f"Found {len(listings)} listings in embedded page state")
+        elif '__NUXT__' in page_source or '__INITIAL_STATE__' in page_source:
             logger.info("Found state data in page - Vue/Nuxt app")
 
             # Save for manual inspection
             with open('page_for_inspection.html', 'w', encoding='utf-8') as f:
                 f.write(page_source)
 
-        return api_calls
+    if listings:
+        with open('clearlyacquired_api_listings.json', 'w', encoding='utf-8') as f:
+            json.dump(listings, f, indent=2, ensure_ascii=False)
+        logger.info(f"Saved {len(listings)} listings to clearlyacquired_api_listings.json")
 
-    finally:
-        driver.quit()
+    return listings
 
 
 if __name__ == "__main__":
     logger.info("Starting API scraper...")
-    api_calls = scrape_clearlyacquired_api()
+    listings = scrape_clearlyacquired_api()
 
-    if api_calls:
-        logger.info("\nAPI Calls Found:")
-        for call in api_calls[:10]:  # Show first 10
-            logger.info(f"  {call['url']}")
+    if listings:
+        logger.info(f"\nListings Found: {len(listings)}")
+        for listing in listings[:10]:  # Show first 10
+            logger.info(f"  {listing.get('title') or listing.get('name')}")
     else:
-        logger.warning("No API calls found - data may be embedded in page or requires authentication")
+        logger.warning("No listing API calls found - data may be embedded in page or requires authentication")
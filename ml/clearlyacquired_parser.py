@@ -0,0 +1,179 @@
+"""
+Structural parser for ClearlyAcquired listing cards
+
+Turns raw container text (as returned by the Selenium scrapers) into typed
+listing records. A container that wraps many cards is split into one record
+per card, and records are de-duplicated by a hash of their content, so
+nested wrappers no longer produce repeated or merged listings.
+"""
+
+import hashlib
+import json
+import logging
+import re
+import sys
+from typing import Dict, Iterable, List, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Card metric labels and the record field each one fills
+METRIC_FIELDS = {
+    'asking price': 'asking_price',
+    'headquartered': 'headquartered',
+    'founded': 'founded',
+    'employees': 'employees',
+    'revenue': 'revenue',
+    'cash flow': 'cash_flow',
+}
+
+# Fields parsed as currency amounts; the original text is kept alongside
+MONEY_FIELDS = {'asking_price', 'revenue', 'cash_flow'}
+INTEGER_FIELDS = {'founded', 'employees'}
+
+HASH_FIELDS = ('title', 'asking_price_text', 'headquartered', 'founded', 'employees')
+
+_MONEY_RE = re.compile(r'\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|m|mm|million|b|billion)?\b', re.IGNORECASE)
+_MONEY_SCALE = {'k': 1e3, 'm': 1e6, 'mm': 1e6, 'million': 1e6, 'b': 1e9, 'billion': 1e9}
+
+
+def parse_money(text: str) -> Optional[float]:
+    """Parse '$1,499,900.00' or '$2.5M' into a number; 'Best Offer' gives None"""
+    match = _MONEY_RE.search(text or '')
+    if not match:
+        return None
+    value = float(match.group(1).replace(',', ''))
+    suffix = (match.group(2) or '').lower()
+    return value * _MONEY_SCALE.get(suffix, 1)
+
+
+def parse_int(text: str) -> Optional[int]:
+    match = re.search(r'\d[\d,]*', text or '')
+    return int(match.group(0).replace(',', '')) if match else None
+
+
+def _metric_field(line: str) -> Optional[str]:
+    if not line.endswith(':'):
+        return None
+    return METRIC_FIELDS.get(line[:-1].strip().lower())
+
+
+def split_card_text(text: str) -> List[Dict]:
+    """
+    Split container text into one record per card
+
+    Cards render as a title line followed by 'Label:' / value line pairs;
+    any other line starts the next card. Lines with no metrics (navigation,
+    sort bars) never become records.
+    """
+    lines = [line.strip() for line in (text or '').splitlines() if line.strip()]
+    records = []
+    current = None
+    i = 0
+    while i < len(lines):
+        field = _metric_field(lines[i])
+        if field and current is not None and i + 1 < len(lines):
+            current[field] = lines[i + 1]
+            i += 2
+            continue
+        current = {'title': lines[i]}
+        records.append(current)
+        i += 1
+    return [record for record in records if len(record) > 1]
+
+
+def type_record(record: Dict) -> Dict:
+    """Convert metric strings into numbers, keeping the original price text"""
+    typed = {'title': record['title']}
+    for field, value in record.items():
+        if field in MONEY_FIELDS:
+            typed[f'{field}_text'] = value
+            typed[field] = parse_money(value)
+        elif field in INTEGER_FIELDS:
+            typed[field] = parse_int(value)
+        elif field != 'title':
+            typed[field] = value
+    return typed
+
+
+# Hydration-state keys for each card field, in order of preference
+STATE_FIELDS = {
+    'title': ('title', 'businessName', 'name'),
+    'asking_price': ('askingPrice', 'asking_price', 'price'),
+    'headquartered': ('headquartered', 'location'),
+    'founded': ('founded', 'yearFounded'),
+    'employees': ('employees', 'employeeCount'),
+    'revenue': ('revenue',),
+    'cash_flow': ('cashFlow', 'cash_flow'),
+}
+
+
+def type_state_record(record: Dict) -> Optional[Dict]:
+    """Type an embedded-state listing into the same record parse_listings produces"""
+    card = {}
+    for field, keys in STATE_FIELDS.items():
+        value = next((record[key] for key in keys if record.get(key) not in (None, '')), None)
+        if value is not None and not isinstance(value, (dict, list)):
+            card[field] = str(value).strip()
+    if 'title' not in card:
+        return None
+    listing = type_record(card)
+    listing['url'] = record.get('url')
+    listing['content_hash'] = content_hash(listing)
+    return listing
+
+
+def content_hash(record: Dict) -> str:
+    """Stable hash of a listing's visible content"""
+    key = '|'.join(str(record.get(field) or '').strip().lower() for field in HASH_FIELDS)
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def _merge(listing: Dict, duplicate: Dict) -> None:
+    """Fill the listing's empty fields from a duplicate of the same card"""
+    for key, value in duplicate.items():
+        if listing.get(key) in (None, '') and value not in (None, ''):
+            listing[key] = value
+
+
+def parse_listings(raw_listings: Iterable[Dict]) -> List[Dict]:
+    """Parse raw {'text', 'url', ...} containers into unique typed listings"""
+    listings = []
+    by_hash = {}
+    for raw in raw_listings:
+        cards = split_card_text(raw.get('text', ''))
+        for card in cards:
+            listing = type_record(card)
+            # A container's link and data attributes only describe it when it
+            # holds a single card; wrappers around many cards carry neither
+            listing['url'] = raw.get('url') if len(cards) == 1 else None
+            if len(cards) == 1:
+                for key, value in raw.items():
+                    if key not in ('text', 'url'):
+                        listing.setdefault(key, value)
+
+            listing['content_hash'] = content_hash(listing)
+            # The same card is often seen first through a wrapper, without the
+            # url and data attributes its own element carries
+            if listing['content_hash'] in by_hash:
+                _merge(by_hash[listing['content_hash']], listing)
+                continue
+            by_hash[listing['content_hash']] = listing
+            listings.append(listing)
+    return listings
+
+
+def main():
+    """Re-parse a raw scraper dump in place: python -m ml.clearlyacquired_parser <file>"""
+    filename = sys.argv[1] if len(sys.argv) > 1 else 'clearlyacquired_listings.json'
+    with open(filename, encoding='utf-8') as f:
+        raw_listings = json.load(f)
+
+    listings = parse_listings(raw_listings)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(listings, f, indent=2, ensure_ascii=False)
+    logger.info(f"Parsed {len(raw_listings)} containers into {len(listings)} unique listings")
+
+
+if __name__ == "__main__":
+    main()
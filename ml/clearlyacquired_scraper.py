@@ -5,16 +5,24 @@ Scraper for ClearlyAcquired business listings
 import requests
 from bs4 import BeautifulSoup
 import json
+import sys
 import time
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
 import logging
 
+from .embedded_state import extract_listings_from_html
+from .http_cache import DEFAULT_CACHE_DIR, CachedResponse, HttpCache
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
 class ClearlyAcquiredScraper:
-    def __init__(self):
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR, offline: bool = False):
+        """
+        cache_dir keeps fetched pages for conditional re-fetch (None disables
+        it); offline replays from that cache without touching the network.
+        """
         self.base_url = "https://app.clearlyacquired.com"
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
@@ -30,17 +38,27 @@ class ClearlyAcquiredScraper:
         }
         self.session = requests.Session()
         self.session.headers.update(self.headers)
+        self.cache = HttpCache(cache_dir, offline=offline, session=self.session) if cache_dir else None
 
     def fetch_page(self, url: str, max_retries: int = 3) -> Optional[str]:
         """Fetch a page with retry logic"""
+        response = self.fetch(url, max_retries)
+        return response.text if response else None
+
+    def fetch(self, url: str, max_retries: int = 3) -> Optional[Union[CachedResponse, requests.Response]]:
+        """Fetch a response with retry logic, revalidating cached copies"""
         for attempt in range(max_retries):
             try:
                 logger.info(f"Fetching {url} (attempt {attempt + 1}/{max_retries})")
+                if self.cache:
+                    return self.cache.get(url, timeout=30)
                 response = self.session.get(url, timeout=30)
                 response.raise_for_status()
-                return response.text
+                return response
             except requests.exceptions.RequestException as e:
                 logger.error(f"Error fetching {url}: {e}")
+                if self.cache and self.cache.offline:
+                    return None
                 if attempt < max_retries - 1:
                     time.sleep(2 ** attempt)  # Exponential backoff
                 else:
@@ -84,16 +102,57 @@ class ClearlyAcquiredScraper:
             logger.error(f"Error parsing listing: {e}")
             return None
 
+    # Bump when parse_page output changes, so parses memoized in the HTTP cache are redone
+    PARSER_VERSION = '2'
+
+    # Hydration-state keys for each field parse_listing fills, in order of preference
+    STATE_FIELDS = {
+        'title': ('title', 'businessName', 'name'),
+        'location': ('location', 'headquartered'),
+        'price': ('askingPrice', 'asking_price', 'price'),
+        'category': ('category', 'industry'),
+        'url': ('url', 'link', 'href'),
+    }
+
+    def parse_state_record(self, record: Dict) -> Optional[Dict]:
+        """Map an embedded-state listing onto the fields parse_listing extracts"""
+        listing = {}
+        for field, keys in self.STATE_FIELDS.items():
+            value = next((record[key] for key in keys if record.get(key) not in (None, '')), None)
+            if value is None or isinstance(value, (dict, list)):
+                continue
+            if field == 'price' and isinstance(value, (int, float)):
+                value = f"${value:,.0f}"
+            listing[field] = str(value).strip()
+        if 'url' in listing and not listing['url'].startswith('http'):
+            listing['url'] = self.base_url + listing['url']
+        return listing if listing else None
+
     def scrape_listings(self, url: str = None) -> List[Dict]:
         """Scrape all listings from the page"""
         if url is None:
             url = f"{self.base_url}/listings"
 
-        html = self.fetch_page(url)
-        if not html:
+        response = self.fetch(url)
+        if response is None:
             logger.error("Failed to fetch page")
             return []
 
+        if self.cache:
+            # An unchanged page (304 or offline replay) reuses the last parse
+            return self.cache.parsed(response, self.parse_page, version=self.PARSER_VERSION)
+        return self.parse_page(response.text)
+
+    def parse_page(self, html: str) -> List[Dict]:
+        """Extract listings from a listings page's HTML"""
+        # Hydration payloads embedded in the HTML are the cheapest source;
+        # only fall back to walking the DOM when there are none
+        state_records = extract_listings_from_html(html)
+        listings = [listing for listing in map(self.parse_state_record, state_records) if listing]
+        if listings:
+            logger.info(f"Found {len(listings)} listings in embedded page state")
+            return listings
+
         soup = BeautifulSoup(html, 'html.parser')
 
         # Try different common listing container patterns
@@ -106,22 +165,11 @@ class ClearlyAcquiredScraper:
 
         logger.info(f"Found {len(listing_containers)} potential listing containers")
 
-        listings = []
         for container in listing_containers:
             listing = self.parse_listing(container)
             if listing:
                 listings.append(listing)
 
-        # Check if page has JSON data
-        script_tags = soup.find_all('script', type='application/json')
-        for script in script_tags:
-            try:
-                data = json.loads(script.string)
-                logger.info(f"Found JSON data: {type(data)}")
-                # Process JSON data if it contains listings
-            except json.JSONDecodeError:
-                pass
-
         return listings
 
     def save_to_json(self, listings: List[Dict], filename: str = "clearlyacquired_listings.json"):
@@ -132,7 +180,8 @@ class ClearlyAcquiredScraper:
 
 
 def main():
-    scraper = ClearlyAcquiredScraper()
+    # --offline replays the last run from the HTTP cache with no network access
+    scraper = ClearlyAcquiredScraper(offline='--offline' in sys.argv)
 
     logger.info("Starting ClearlyAcquired scraper...")
     listings = scraper.scrape_listings()
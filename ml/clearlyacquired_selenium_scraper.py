@@ -1,5 +1,7 @@
 """
 Advanced scraper for ClearlyAcquired using Selenium to handle JavaScript
+
+Run from the repository root: python -m ml.clearlyacquired_selenium_scraper
 """
 
 from selenium import webdriver
@@ -13,13 +15,84 @@ import time
 import logging
 from typing import List, Dict
 
+from .clearlyacquired_parser import parse_listings
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Selectors tried in order; the first one that matches anything wins
+LISTING_SELECTORS = [
+    "//div[contains(@class, 'vertical-business-card')]",
+    "//div[contains(@class, 'listing')]",
+    "//div[contains(@class, 'card')]",
+    "//article",
+    "//div[contains(@class, 'item')]",
+    "//div[@data-testid='listing']",
+    "//a[contains(@href, '/listing/')]",
+]
+
+DATA_ATTRIBUTES = ['data-id', 'data-title', 'data-price', 'data-location']
+
+# Runs in the page: evaluates the selectors and returns every matched
+# container's text, link and data attributes in a single WebDriver round trip.
+# Containers that wrap other matched containers are dropped, so only the
+# leaf-most cards are returned.
+BULK_EXTRACT_SCRIPT = """
+const selectors = arguments[0];
+const dataAttributes = arguments[1];
+for (const selector of selectors) {
+  const snapshot = document.evaluate(
+    selector, document, null, XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+  if (snapshot.snapshotLength === 0) {
+    continue;
+  }
+  const nodes = [];
+  for (let i = 0; i < snapshot.snapshotLength; i++) {
+    nodes.push(snapshot.snapshotItem(i));
+  }
+  const matched = new Set(nodes);
+  const wrappers = new Set();
+  for (const node of nodes) {
+    for (let parent = node.parentElement; parent; parent = parent.parentElement) {
+      if (matched.has(parent)) {
+        // Outer wrappers are marked when the walk starts from this parent
+        wrappers.add(parent);
+        break;
+      }
+    }
+  }
+  const listings = [];
+  for (const el of nodes) {
+    if (wrappers.has(el)) {
+      continue;
+    }
+    const link = el.querySelector('a') || (el.tagName === 'A' ? el : null);
+    const data = {};
+    for (const attr of dataAttributes) {
+      const value = el.getAttribute(attr);
+      if (value) {
+        data[attr.replace('data-', '')] = value;
+      }
+    }
+    listings.push({text: (el.innerText || '').trim(), url: link ? link.href : null, data: data});
+  }
+  return {selector: selector, listings: listings};
+}
+return {selector: null, listings: []};
+"""
+
 
 class ClearlyAcquiredSeleniumScraper:
-    def __init__(self, headless: bool = True):
-        """Initialize the scraper with Selenium"""
+    def __init__(self, headless: bool = True, bulk_extract: bool = True, structured: bool = True):
+        """
+        Initialize the scraper with Selenium
+
+        bulk_extract pulls all listing containers with one execute_script
+        call instead of several WebDriver calls per element; structured
+        splits container text into typed, de-duplicated listing records.
+        """
+        self.bulk_extract = bulk_extract
+        self.structured = structured
         chrome_options = Options()
         if headless:
             chrome_options.add_argument("--headless")
@@ -46,44 +119,15 @@ class ClearlyAcquiredSeleniumScraper:
                 f.write(self.driver.page_source)
             logger.info("Saved page source to clearlyacquired_page_source.html")
 
-            listings = []
-
-            # Try multiple selectors to find listings
-            selectors = [
-                "//div[contains(@class, 'listing')]",
-                "//div[contains(@class, 'card')]",
-                "//article",
-                "//div[contains(@class, 'item')]",
-                "//div[@data-testid='listing']",
-                "//a[contains(@href, '/listing/')]",
-            ]
-
-            for selector in selectors:
-                try:
-                    elements = self.driver.find_elements(By.XPATH, selector)
-                    if elements:
-                        logger.info(f"Found {len(elements)} elements with selector: {selector}")
-                        break
-                except NoSuchElementException:
-                    continue
-
-            # If no specific listing elements found, try to extract all visible text
-            if not elements:
-                logger.warning("No listing elements found with standard selectors")
-                logger.info("Extracting page structure...")
-                body = self.driver.find_element(By.TAG_NAME, "body")
-                logger.info(f"Page text preview:\n{body.text[:500]}")
-                return listings
-
-            # Parse each listing
-            for element in elements:
-                try:
-                    listing = self.parse_listing_element(element)
-                    if listing:
-                        listings.append(listing)
-                except Exception as e:
-                    logger.error(f"Error parsing element: {e}")
-                    continue
+            if self.bulk_extract:
+                listings = self.extract_listings_bulk()
+            else:
+                listings = self.extract_listings_per_element()
+
+            if self.structured:
+                raw_count = len(listings)
+                listings = parse_listings(listings)
+                logger.info(f"Parsed {raw_count} containers into {len(listings)} unique listings")
 
             logger.info(f"Successfully scraped {len(listings)} listings")
             return listings
@@ -94,6 +138,58 @@ class ClearlyAcquiredSeleniumScraper:
         finally:
             self.driver.quit()
 
+    def extract_listings_bulk(self) -> List[Dict]:
+        """Extract every matched listing container in one execute_script call"""
+        start = time.perf_counter()
+        result = self.driver.execute_script(BULK_EXTRACT_SCRIPT, LISTING_SELECTORS, DATA_ATTRIBUTES)
+
+        if not result['selector']:
+            logger.warning("No listing elements found with standard selectors")
+            return []
+
+        logger.info(f"Found {len(result['listings'])} elements with selector: {result['selector']}")
+        listings = []
+        for raw in result['listings']:
+            listing = {'text': raw['text'], 'url': raw['url']}
+            listing.update(raw['data'])
+            if listing['text'] or listing['url']:
+                listings.append(listing)
+
+        logger.info(f"Bulk extraction took {(time.perf_counter() - start) * 1000:.1f} ms")
+        return listings
+
+    def extract_listings_per_element(self) -> List[Dict]:
+        """Extract listings with individual WebDriver calls per element"""
+        elements = []
+        for selector in LISTING_SELECTORS:
+            try:
+                elements = self.driver.find_elements(By.XPATH, selector)
+                if elements:
+                    logger.info(f"Found {len(elements)} elements with selector: {selector}")
+                    break
+            except NoSuchElementException:
+                continue
+
+        # If no specific listing elements found, try to extract all visible text
+        if not elements:
+            logger.warning("No listing elements found with standard selectors")
+            logger.info("Extracting page structure...")
+            body = self.driver.find_element(By.TAG_NAME, "body")
+            logger.info(f"Page text preview:\n{body.text[:500]}")
+            return []
+
+        # Parse each listing
+        listings = []
+        for element in elements:
+            try:
+                listing = self.parse_listing_element(element)
+                if listing:
+                    listings.append(listing)
+            except Exception as e:
+                logger.error(f"Error parsing element: {e}")
+                continue
+        return listings
+
     def parse_listing_element(self, element) -> Dict:
         """Parse a single listing element"""
         listing = {}
@@ -110,7 +206,7 @@ class ClearlyAcquiredSeleniumScraper:
                 listing['url'] = element.get_attribute('href') if element.tag_name == 'a' else None
 
             # Try to extract data attributes
-            for attr in ['data-id', 'data-title', 'data-price', 'data-location']:
+            for attr in DATA_ATTRIBUTES:
                 value = element.get_attribute(attr)
                 if value:
                     listing[attr.replace('data-', '')] = value
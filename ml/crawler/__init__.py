@@ -0,0 +1,30 @@
+"""
+Multi-source listing crawler
+
+Source adapters plug into one scheduler that owns the priority frontier,
+per-domain concurrency limits, the shared HTTP session and Chrome driver
+pool, and the common record sink.
+
+Run from the repository root:
+    python -m ml.crawler --sources bizbuysell clearlyacquired
+"""
+
+from .adapters import ADAPTERS, BizBuySellAdapter, ClearlyAcquiredAdapter, SourceAdapter
+from .fetchers import DriverPool, FetchResult, HttpFetcher
+from .frontier import CrawlRequest, Frontier
+from .scheduler import CrawlScheduler
+from .sinks import RecordSink
+
+__all__ = [
+    'ADAPTERS',
+    'BizBuySellAdapter',
+    'ClearlyAcquiredAdapter',
+    'CrawlRequest',
+    'CrawlScheduler',
+    'DriverPool',
+    'FetchResult',
+    'Frontier',
+    'HttpFetcher',
+    'RecordSink',
+    'SourceAdapter',
+]
@@ -0,0 +1,64 @@
+"""
+Crawl several marketplaces at once with shared capacity
+
+    python -m ml.crawler --sources bizbuysell clearlyacquired --drivers 2
+"""
+
+import argparse
+import logging
+import os
+
+from ..http_cache import DEFAULT_CACHE_DIR
+
+from .adapters import ADAPTERS, BizBuySellAdapter
+from .fetchers import DriverPool, HttpFetcher
+from .scheduler import CrawlScheduler
+from .sinks import RecordSink
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl business listing marketplaces")
+    parser.add_argument('--sources', nargs='+', choices=sorted(ADAPTERS), default=sorted(ADAPTERS))
+    parser.add_argument('--max-listings', type=int, default=10, help="BizBuySell detail pages to crawl")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--drivers', type=int, default=2, help="Chrome drivers shared by all sources")
+    parser.add_argument('--domain-concurrency', type=int, default=2)
+    parser.add_argument('--politeness-delay', type=float, default=1.0)
+    parser.add_argument('--render-wait', type=float, default=5.0)
+    parser.add_argument('--no-headless', action='store_true')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="HTTP cache directory ('' disables it)")
+    parser.add_argument('--offline', action='store_true', help="Replay HTTP fetches from the cache only")
+    parser.add_argument('--output', default='output/listings.json')
+    parser.add_argument('--csv', default='output/listings.csv')
+    args = parser.parse_args()
+
+    adapters = []
+    for name in args.sources:
+        if name == BizBuySellAdapter.name:
+            adapters.append(BizBuySellAdapter(max_listings=args.max_listings))
+        else:
+            adapters.append(ADAPTERS[name]())
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    scheduler = CrawlScheduler(
+        adapters,
+        RecordSink(args.output, args.csv),
+        http_fetcher=HttpFetcher(pool_size=args.workers, cache_dir=args.cache_dir or None, offline=args.offline),
+        driver_pool=DriverPool(
+            size=args.drivers,
+            headless=not args.no_headless,
+            render_wait=args.render_wait,
+            offline=args.offline
+        ),
+        workers=args.workers,
+        domain_concurrency=args.domain_concurrency,
+        politeness_delay=args.politeness_delay
+    )
+    scheduler.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Source adapters plugged into the shared crawl scheduler
+
+An adapter only knows its site: which URLs to start from, which fetcher a
+request needs and how to turn a fetched page into records and follow-up
+requests. Fetching, retries, concurrency and output are the scheduler's.
+
+Only BizBuySellScraperV2's search and detail flow and the ClearlyAcquired
+card scrape are ported here. bizbuysell_complete_scraper.BizBuySellScraper
+and clearlyacquired_api_scraper still run standalone.
+"""
+
+import logging
+from itertools import count
+from typing import Dict, List, Tuple
+
+from bs4 import BeautifulSoup
+
+from ..clearlyacquired_parser import parse_listings, type_state_record
+from ..embedded_state import extract_listings_from_html
+
+from .fetchers import FetchResult
+from .frontier import CrawlRequest
+
+logger = logging.getLogger(__name__)
+
+# Follow-up requests run before new index pages so records reach the sink early
+DETAIL_PRIORITY = 0
+INDEX_PRIORITY = 10
+
+ParseResult = Tuple[List[Dict], List[CrawlRequest]]
+
+
+class SourceAdapter:
+    """Base class for a marketplace plugged into the crawl scheduler"""
+
+    name = 'source'
+    # Bump when parse() output changes, so parses memoized in the HTTP cache are redone
+    parser_version = '1'
+
+    def seeds(self) -> List[CrawlRequest]:
+        raise NotImplementedError
+
+    def parse(self, request: CrawlRequest, result: FetchResult) -> ParseResult:
+        raise NotImplementedError
+
+    def request(self, url: str, **kwargs) -> CrawlRequest:
+        return CrawlRequest(url=url, source=self.name, **kwargs)
+
+
+class BizBuySellAdapter(SourceAdapter):
+    """Search results page -> listing detail pages, both browser-rendered"""
+
+    name = 'bizbuysell'
+
+    def __init__(self, search_url: str = "https://www.bizbuysell.com/businesses-for-sale/", max_listings: int = 10):
+        from bizbuysell_scraper_v2 import BizBuySellScraperV2
+
+        self.search_url = search_url
+        self.max_listings = max_listings
+        self.parse_listing_page = BizBuySellScraperV2.parse_listing_page
+        self._ids = count(1)
+
+    def seeds(self) -> List[CrawlRequest]:
+        return [self.request(self.search_url, kind='search', fetcher='browser', priority=INDEX_PRIORITY)]
+
+    def parse(self, request: CrawlRequest, result: FetchResult) -> ParseResult:
+        if request.kind == 'search':
+            soup = BeautifulSoup(result.text, 'html.parser')
+            listing_urls = []
+            for link in soup.select("a[href*='/business/']"):
+                href = link['href']
+                if href.startswith('/'):
+                    href = 'https://www.bizbuysell.com' + href
+                if 'bizbuysell.com' in href and href not in listing_urls:
+                    listing_urls.append(href)
+            logger.info(f"[{self.name}] Found {len(listing_urls)} listing URLs")
+            follow = [
+                self.request(url, kind='detail', fetcher='browser', priority=DETAIL_PRIORITY)
+                for url in listing_urls[:self.max_listings]
+            ]
+            return [], follow
+
+        listing = self.parse_listing_page(result.text, request.url, next(self._ids))
+        return [listing], []
+
+
+class ClearlyAcquiredAdapter(SourceAdapter):
+    """
+    Listings page over plain HTTP first; hydration state is parsed straight
+    from the HTML, and only a page without it is re-queued for a browser
+    render whose cards go through the structural parser.
+    """
+
+    name = 'clearlyacquired'
+
+    def __init__(self, url: str = "https://app.clearlyacquired.com/listings"):
+        self.url = url
+
+    def seeds(self) -> List[CrawlRequest]:
+        return [self.request(self.url, kind='listings', fetcher='http', priority=INDEX_PRIORITY)]
+
+    def parse(self, request: CrawlRequest, result: FetchResult) -> ParseResult:
+        listings = [listing for listing in map(type_state_record, extract_listings_from_html(result.text)) if listing]
+        if listings:
+            logger.info(f"[{self.name}] Found {len(listings)} listings in embedded page state")
+            return listings, []
+
+        if request.fetcher == 'http':
+            return [], [self.request(request.url, kind='listings', fetcher='browser', priority=INDEX_PRIORITY)]
+
+        soup = BeautifulSoup(result.text, 'html.parser')
+        cards = [
+            {'text': card.get_text('\n'), 'url': card.a['href'] if card.a and card.a.has_attr('href') else None}
+            for card in soup.select("div[class*='vertical-business-card']")
+        ]
+        return parse_listings(cards), []
+
+
+ADAPTERS = {
+    BizBuySellAdapter.name: BizBuySellAdapter,
+    ClearlyAcquiredAdapter.name: ClearlyAcquiredAdapter,
+}
@@ -0,0 +1,171 @@
+"""
+Shared fetchers: one pooled HTTP session and one pool of Chrome drivers
+
+Every adapter fetches through these, so connection reuse and the number of
+live browsers are bounded for the whole crawl rather than per scraper.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..http_cache import CacheMiss, CachedResponse, HttpCache
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Language': 'en-US,en;q=0.5',
+}
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int
+    text: str
+    # Set when the page came through the HTTP cache
+    cached: Optional[CachedResponse] = None
+
+
+class HttpFetcher:
+    """
+    requests.Session with a connection pool sized for the crawl's workers
+
+    With cache_dir set, pages are revalidated against an on-disk cache
+    (offline replays from it with no network access).
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 16,
+        timeout: int = 30,
+        headers: Optional[Dict[str, str]] = None,
+        cache_dir: Optional[str] = None,
+        offline: bool = False
+    ):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update(headers or DEFAULT_HEADERS)
+        # Retries are owned by the scheduler so they respect domain limits
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=Retry(total=0))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.cache = HttpCache(cache_dir, offline=offline, session=self.session) if cache_dir else None
+
+    def fetch(self, url: str) -> FetchResult:
+        if self.cache:
+            response = self.cache.get(url, timeout=self.timeout)
+            return FetchResult(url=response.url, status=response.status_code, text=response.text, cached=response)
+        response = self.session.get(url, timeout=self.timeout)
+        response.raise_for_status()
+        return FetchResult(url=response.url, status=response.status_code, text=response.text)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+class DriverPool:
+    """
+    Fixed-size pool of headless Chrome drivers
+
+    Drivers are started lazily, handed out one request at a time and reused
+    across sources; a driver that errors is replaced rather than returned.
+    Rendered pages aren't cached, so offline=True fails every fetch at once.
+    """
+
+    def __init__(self, size: int = 2, headless: bool = True, render_wait: float = 5.0, offline: bool = False):
+        self.size = size
+        self.headless = headless
+        self.render_wait = render_wait
+        self.offline = offline
+        self._idle: List = []
+        self._drivers: List = []
+        self._available = threading.Condition()
+
+    def _create_driver(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.options import Options
+
+        chrome_options = Options()
+        if self.headless:
+            chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        chrome_options.add_argument('--disable-blink-features=AutomationControlled')
+        chrome_options.add_argument(f'--user-agent={USER_AGENT}')
+        chrome_options.add_experimental_option("excludeSwitches", ["enable-automation"])
+        chrome_options.add_experimental_option('useAutomationExtension', False)
+
+        driver = webdriver.Chrome(options=chrome_options)
+        driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+        return driver
+
+    def _acquire(self):
+        with self._available:
+            while not self._idle and len(self._drivers) >= self.size:
+                self._available.wait()
+            if self._idle:
+                return self._idle.pop()
+            # Reserve the slot before the slow driver start-up
+            self._drivers.append(None)
+
+        try:
+            driver = self._create_driver()
+        except Exception:
+            with self._available:
+                self._drivers.remove(None)
+                self._available.notify()
+            raise
+        with self._available:
+            self._drivers[self._drivers.index(None)] = driver
+        return driver
+
+    @contextmanager
+    def driver(self):
+        driver = self._acquire()
+        try:
+            yield driver
+        except Exception:
+            self._discard(driver)
+            raise
+        with self._available:
+            self._idle.append(driver)
+            self._available.notify()
+
+    def _discard(self, driver) -> None:
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        with self._available:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+            self._available.notify()
+
+    def fetch(self, url: str) -> FetchResult:
+        if self.offline:
+            raise CacheMiss(f"{url} needs a browser, which offline mode never starts")
+        with self.driver() as driver:
+            driver.get(url)
+            time.sleep(self.render_wait)  # Give client-side rendering time to finish
+            return FetchResult(url=driver.current_url, status=200, text=driver.page_source)
+
+    def close(self) -> None:
+        with self._available:
+            drivers, self._drivers, self._idle = self._drivers, [], []
+        for driver in filter(None, drivers):
+            try:
+                driver.quit()
+            except Exception as e:
+                logger.debug(f"Error closing driver: {e}")
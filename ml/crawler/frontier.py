@@ -0,0 +1,83 @@
+"""
+Priority frontier shared by every source adapter
+
+Requests are popped lowest priority value first, FIFO within a priority.
+URLs are de-duplicated per (url, fetcher), so a page fetched over plain
+HTTP can still be re-queued for a browser render.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+from urllib.parse import urlparse
+
+
+@dataclass
+class CrawlRequest:
+    url: str
+    source: str
+    kind: str = 'page'
+    fetcher: str = 'http'
+    priority: int = 10
+    attempts: int = 0
+    not_before: float = 0.0
+
+    @property
+    def domain(self) -> str:
+        return urlparse(self.url).netloc.lower()
+
+    @property
+    def key(self) -> str:
+        return f"{self.fetcher}:{self.url}"
+
+
+class Frontier:
+    """Thread-safe priority queue of crawl requests with URL de-duplication"""
+
+    def __init__(self):
+        self._heap: List = []
+        self._seen = set()
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+    def push(self, request: CrawlRequest, force: bool = False) -> bool:
+        """Queue a request; returns False if its URL was already queued"""
+        with self._lock:
+            if request.key in self._seen and not force:
+                return False
+            self._seen.add(request.key)
+            heapq.heappush(self._heap, (request.priority, next(self._counter), request))
+            return True
+
+    def pop(self, eligible: Callable[[CrawlRequest], bool]) -> Optional[CrawlRequest]:
+        """
+        Pop the highest-priority request that eligible() accepts
+
+        Requests skipped on the way (busy domain, retry backoff) keep their
+        place in the queue.
+        """
+        with self._lock:
+            skipped = []
+            found = None
+            while self._heap:
+                entry = heapq.heappop(self._heap)
+                if eligible(entry[2]):
+                    found = entry[2]
+                    break
+                skipped.append(entry)
+            for entry in skipped:
+                heapq.heappush(self._heap, entry)
+            return found
+
+    def next_ready_at(self) -> Optional[float]:
+        """Earliest not_before among queued requests, if any are backing off"""
+        with self._lock:
+            pending = [entry[2].not_before for entry in self._heap if entry[2].not_before > time.time()]
+            return min(pending) if pending else None
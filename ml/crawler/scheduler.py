@@ -0,0 +1,162 @@
+"""
+Shared crawl scheduler
+
+All adapters feed one priority frontier. A dispatcher hands requests to a
+single worker pool while enforcing per-domain concurrency and a politeness
+delay, so several marketplaces crawl side by side and share the HTTP
+session and browser pool instead of running one script after another.
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Dict, List, Optional
+
+from ..http_cache import CacheMiss
+
+from .adapters import ParseResult, SourceAdapter
+from .fetchers import DriverPool, FetchResult, HttpFetcher
+from .frontier import CrawlRequest, Frontier
+from .sinks import RecordSink
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlScheduler:
+    def __init__(
+        self,
+        adapters: List[SourceAdapter],
+        sink: RecordSink,
+        http_fetcher: Optional[HttpFetcher] = None,
+        driver_pool: Optional[DriverPool] = None,
+        workers: int = 8,
+        domain_concurrency: int = 2,
+        domain_limits: Optional[Dict[str, int]] = None,
+        politeness_delay: float = 1.0,
+        max_retries: int = 3,
+        retry_backoff: float = 2.0
+    ):
+        self.adapters = {adapter.name: adapter for adapter in adapters}
+        self.sink = sink
+        self.http_fetcher = http_fetcher or HttpFetcher(pool_size=workers)
+        self.driver_pool = driver_pool or DriverPool()
+        self.workers = workers
+        self.domain_concurrency = domain_concurrency
+        self.domain_limits = domain_limits or {}
+        self.politeness_delay = politeness_delay
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self.frontier = Frontier()
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._in_flight: Dict[str, int] = defaultdict(int)
+        self._next_allowed: Dict[str, float] = defaultdict(float)
+        self._active = 0
+        self._changed = threading.Condition()
+
+    def _eligible(self, request: CrawlRequest) -> bool:
+        now = time.time()
+        domain = request.domain
+        limit = self.domain_limits.get(domain, self.domain_concurrency)
+        return (
+            request.not_before <= now
+            and self._next_allowed[domain] <= now
+            and self._in_flight[domain] < limit
+        )
+
+    def _fetch(self, request: CrawlRequest) -> FetchResult:
+        if request.fetcher == 'browser':
+            return self.driver_pool.fetch(request.url)
+        return self.http_fetcher.fetch(request.url)
+
+    def _parse(self, adapter: SourceAdapter, request: CrawlRequest, result: FetchResult) -> ParseResult:
+        cache = self.http_fetcher.cache
+        if cache is None or result.cached is None:
+            return adapter.parse(request, result)
+
+        def parse(_text):
+            records, follow = adapter.parse(request, result)
+            return {'records': records, 'follow': [asdict(follow_request) for follow_request in follow]}
+
+        # A page that revalidated as unchanged reuses its previous parse
+        parsed = cache.parsed(result.cached, parse, version=f"{adapter.name}:{adapter.parser_version}")
+        return parsed['records'], [CrawlRequest(**follow_request) for follow_request in parsed['follow']]
+
+    def _process(self, request: CrawlRequest) -> None:
+        adapter = self.adapters[request.source]
+        stats = self.stats[request.source]
+        try:
+            result = self._fetch(request)
+            records, follow = self._parse(adapter, request, result)
+        except Exception as e:
+            stats['errors'] += 1
+            if not isinstance(e, CacheMiss) and request.attempts + 1 < self.max_retries:
+                request.attempts += 1
+                request.not_before = time.time() + self.retry_backoff ** request.attempts
+                logger.warning(f"[{request.source}] {request.url} failed ({e}); retry {request.attempts}")
+                self.frontier.push(request, force=True)
+            else:
+                stats['failed'] += 1
+                logger.error(f"[{request.source}] Giving up on {request.url}: {e}")
+            return
+
+        stats['fetched'] += 1
+        stats['records'] += self.sink.add(request.source, records)
+        for follow_request in follow:
+            self.frontier.push(follow_request)
+
+    def _run_request(self, request: CrawlRequest) -> None:
+        try:
+            self._process(request)
+        finally:
+            with self._changed:
+                self._in_flight[request.domain] -= 1
+                self._active -= 1
+                self._changed.notify_all()
+
+    def _wait_timeout(self) -> Optional[float]:
+        """How long the dispatcher may sleep before something could become eligible"""
+        now = time.time()
+        candidates = [at for at in self._next_allowed.values() if at > now]
+        backoff = self.frontier.next_ready_at()
+        if backoff:
+            candidates.append(backoff)
+        return max(min(candidates) - now, 0.01) if candidates else None
+
+    def run(self) -> Dict[str, Dict[str, int]]:
+        """Crawl until the frontier is empty and no request is in flight"""
+        for adapter in self.adapters.values():
+            for request in adapter.seeds():
+                self.frontier.push(request)
+
+        start = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                with self._changed:
+                    while True:
+                        request = None
+                        if self._active < self.workers:
+                            request = self.frontier.pop(self._eligible)
+                        if request is not None:
+                            domain = request.domain
+                            self._in_flight[domain] += 1
+                            self._next_allowed[domain] = time.time() + self.politeness_delay
+                            self._active += 1
+                            executor.submit(self._run_request, request)
+                            continue
+                        if self._active == 0 and len(self.frontier) == 0:
+                            break
+                        self._changed.wait(timeout=self._wait_timeout())
+        finally:
+            self.sink.flush()
+            self.http_fetcher.close()
+            self.driver_pool.close()
+
+        elapsed = time.perf_counter() - start
+        for source, stats in self.stats.items():
+            logger.info(f"[{source}] {dict(stats)}")
+        logger.info(f"Crawl finished in {elapsed:.1f}s with {len(self.sink.records)} records")
+        return {source: dict(stats) for source, stats in self.stats.items()}
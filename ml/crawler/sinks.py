@@ -0,0 +1,87 @@
+"""
+Common record sink for every source
+
+Records are tagged with their source, de-duplicated and written to one
+JSON file (and optionally CSV) for the whole crawl.
+"""
+
+import csv
+import json
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from ..clearlyacquired_parser import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+def record_key(record: Dict) -> str:
+    """
+    De-duplication key: the source's own id, else the listing URL, else a
+    content hash, so a listing whose price or text changed between pages
+    is still recognised as the same listing
+    """
+    for field in ('id', 'url', 'content_hash'):
+        if record.get(field):
+            return f"{record.get('source')}:{record[field]}"
+    return f"{record.get('source')}:{content_hash(record)}"
+
+
+class RecordSink:
+    """Thread-safe, de-duplicating collector of listing records"""
+
+    def __init__(self, json_path: str, csv_path: Optional[str] = None, flush_every: int = 50):
+        self.json_path = json_path
+        self.csv_path = csv_path
+        self.flush_every = flush_every
+        self.records: List[Dict] = []
+        self._seen = set()
+        self._unflushed = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def add(self, source: str, records: Iterable[Dict]) -> int:
+        """Add records from a source; returns how many were new"""
+        added = 0
+        with self._lock:
+            for record in records:
+                record = dict(record, source=source)
+                key = record_key(record)
+                if key in self._seen:
+                    continue
+                self._seen.add(key)
+                self.records.append(record)
+                added += 1
+            self._unflushed += added
+            flush = self._unflushed >= self.flush_every
+        if flush:
+            self.flush()
+        return added
+
+    def flush(self) -> None:
+        """Write everything collected so far; partial crawls still leave output"""
+        with self._write_lock:
+            with self._lock:
+                records = list(self.records)
+                self._unflushed = 0
+            self._write(records)
+
+    def _write(self, records: List[Dict]) -> None:
+        with open(self.json_path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, indent=2, ensure_ascii=False)
+
+        if self.csv_path and records:
+            fieldnames = []
+            for record in records:
+                fieldnames.extend(key for key in record if key not in fieldnames)
+            with open(self.csv_path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                for record in records:
+                    writer.writerow({
+                        key: '; '.join(map(str, value)) if isinstance(value, list) else value
+                        for key, value in record.items()
+                    })
+
+        logger.info(f"Wrote {len(records)} records to {self.json_path}")
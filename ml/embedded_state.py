@@ -0,0 +1,171 @@
+"""
+Fast path for listing data embedded in server-rendered hydration state
+
+Nuxt/Next/Vue apps often ship the page's data as JSON inside the HTML
+(__NEXT_DATA__, __NUXT_DATA__, window.__INITIAL_STATE__ = {...},
+<script type="application/json">). When it is present, parsing that JSON
+straight from the raw HTML is far cheaper than building a DOM or driving a
+browser.
+
+Benchmark against a saved page:
+    python -m ml.embedded_state ml/clearlyacquired_page_source.html
+"""
+
+import json
+import logging
+import re
+import sys
+import time
+from typing import Any, Dict, List
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Keys that identify a dict as a business listing. Title and price keys alone
+# also describe nav and category entries, so a listing needs two of these
+# keys and at least one of them has to be listing-specific.
+LISTING_KEYS = {'title', 'name', 'askingPrice', 'asking_price', 'price', 'headquartered', 'businessName', 'cashFlow'}
+GENERIC_KEYS = {'title', 'name', 'price'}
+
+_SCRIPT_RE = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.IGNORECASE | re.DOTALL)
+_JSON_TYPE_RE = re.compile(r'type\s*=\s*["\']application/(?:ld\+)?json["\']', re.IGNORECASE)
+_ID_RE = re.compile(r'id\s*=\s*["\']([^"\']+)["\']', re.IGNORECASE)
+_ASSIGNMENT_RE = re.compile(r'window\.(__[A-Z_]+__)\s*=\s*')
+
+_decoder = json.JSONDecoder()
+
+# Nuxt 3 devalue wrappers whose single argument is the wrapped value
+_DEVALUE_WRAPPERS = {'Reactive', 'ShallowReactive', 'Ref', 'ShallowRef', 'EmptyRef', 'EmptyShallowRef'}
+
+
+def is_listing(item: Dict) -> bool:
+    matched = LISTING_KEYS & item.keys()
+    return len(matched) >= 2 and bool(matched - GENERIC_KEYS)
+
+
+def find_listing_records(payload: Any) -> List[Dict]:
+    """Return the largest list of listing-like dicts anywhere in a JSON payload"""
+    best: List[Dict] = []
+    stack = [payload]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            dicts = [item for item in node if isinstance(item, dict)]
+            if dicts and len(dicts) > len(best) and all(is_listing(item) for item in dicts):
+                best = dicts
+            stack.extend(node)
+    return best
+
+
+def unflatten_devalue(values: List[Any]) -> Any:
+    """Rebuild a Nuxt 3 __NUXT_DATA__ payload, which stores values by index"""
+    cache: Dict[int, Any] = {}
+
+    def resolve(index):
+        if not isinstance(index, int) or index < 0:
+            return None
+        if index in cache:
+            return cache[index]
+        value = values[index]
+        if isinstance(value, list):
+            if value and isinstance(value[0], str) and value[0] in _DEVALUE_WRAPPERS:
+                cache[index] = resolve(value[1]) if len(value) > 1 else None
+            elif value and isinstance(value[0], str) and value[0] in ('Set', 'Map', 'Date', 'RegExp'):
+                cache[index] = [resolve(item) for item in value[1:]]
+            else:
+                result = []
+                cache[index] = result
+                result.extend(resolve(item) for item in value)
+        elif isinstance(value, dict):
+            result = {}
+            cache[index] = result
+            for key, item in value.items():
+                result[key] = resolve(item)
+        else:
+            cache[index] = value
+        return cache[index]
+
+    return resolve(0)
+
+
+def extract_embedded_state(html: str) -> List[Any]:
+    """Parse every hydration payload found in raw HTML"""
+    payloads = []
+
+    for attrs, body in _SCRIPT_RE.findall(html):
+        body = body.strip()
+        if not body:
+            continue
+
+        if _JSON_TYPE_RE.search(attrs):
+            try:
+                payload = json.loads(body)
+            except json.JSONDecodeError:
+                continue
+            id_match = _ID_RE.search(attrs)
+            if id_match and id_match.group(1) == '__NUXT_DATA__' and isinstance(payload, list):
+                payload = unflatten_devalue(payload)
+            payloads.append(payload)
+            continue
+
+        for match in _ASSIGNMENT_RE.finditer(body):
+            try:
+                payload, _ = _decoder.raw_decode(body, match.end())
+            except json.JSONDecodeError:
+                # Nuxt 2 ships __NUXT__ as a JS function call, not JSON
+                logger.debug(f"{match.group(1)} is not plain JSON, skipping")
+                continue
+            payloads.append(payload)
+
+    return payloads
+
+
+def extract_listings_from_html(html: str) -> List[Dict]:
+    """Listing records from the largest listing array in any hydration payload"""
+    best: List[Dict] = []
+    for payload in extract_embedded_state(html):
+        records = find_listing_records(payload)
+        if len(records) > len(best):
+            best = records
+    return best
+
+
+def benchmark(path: str, repeat: int = 20) -> Dict[str, float]:
+    """Compare the embedded-state scan with a BeautifulSoup DOM walk on a saved page"""
+    from bs4 import BeautifulSoup
+
+    with open(path, encoding='utf-8') as f:
+        html = f.read()
+
+    payloads = extract_embedded_state(html)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        listings = extract_listings_from_html(html)
+    state_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        soup = BeautifulSoup(html, 'html.parser')
+        containers = soup.find_all('div', class_=lambda x: x and 'card' in x.lower())
+    dom_ms = (time.perf_counter() - start) * 1000 / repeat
+
+    results = {
+        'html_bytes': len(html),
+        'payloads_found': len(payloads),
+        'listings_found': len(listings),
+        'embedded_state_ms': state_ms,
+        'dom_walk_ms': dom_ms,
+        'dom_containers': len(containers),
+    }
+    logger.info(
+        f"{path}: {len(html)} bytes, {len(payloads)} payloads, {len(listings)} listings; "
+        f"embedded state {state_ms:.2f} ms vs DOM walk {dom_ms:.2f} ms "
+        f"({dom_ms / max(state_ms, 1e-9):.0f}x)"
+    )
+    return results
+
+
+if __name__ == "__main__":
+    benchmark(sys.argv[1] if len(sys.argv) > 1 else 'clearlyacquired_page_source.html')
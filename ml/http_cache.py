@@ -0,0 +1,187 @@
+"""
+On-disk HTTP response cache with conditional re-fetch
+
+Bodies are stored gzip-compressed next to their ETag/Last-Modified
+validators. Later fetches send If-None-Match/If-Modified-Since, so an
+unchanged page comes back as a bodiless 304 and its cached parse result is
+reused without parsing again. Offline mode replays purely from the cache:
+
+    cache = HttpCache('.http_cache', offline=True)
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = '.http_cache'
+
+
+class CacheMiss(requests.exceptions.ConnectionError):
+    """
+    Raised in offline mode for a URL that was never cached
+
+    Retrying can't help, so callers with retry loops should give up at once.
+    """
+
+
+@dataclass
+class CachedResponse:
+    url: str
+    status_code: int
+    content: bytes
+    headers: Dict[str, str]
+    cache_key: str
+    # True when the body came from disk (304 revalidation or offline replay)
+    from_cache: bool = False
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+
+    @property
+    def encoding(self) -> str:
+        content_type = self.headers.get('content-type', '')
+        if 'charset=' in content_type:
+            return content_type.split('charset=')[-1].split(';')[0].strip()
+        return 'utf-8'
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class HttpCache:
+    """Conditional GETs through a requests session, backed by a cache directory"""
+
+    def __init__(
+        self,
+        cache_dir: str = DEFAULT_CACHE_DIR,
+        offline: bool = False,
+        session: Optional[requests.Session] = None
+    ):
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.session = session or requests.Session()
+        self.stats = {'hits': 0, 'revalidated': 0, 'downloaded': 0, 'parse_reused': 0}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{suffix}")
+
+    def _load(self, url: str) -> Optional[Dict[str, Any]]:
+        key = self.key(url)
+        try:
+            with open(self._path(key, '.json'), encoding='utf-8') as f:
+                meta = json.load(f)
+            with gzip.open(self._path(key, '.body.gz'), 'rb') as f:
+                meta['content'] = f.read()
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def _store(self, key: str, response: requests.Response) -> None:
+        meta = {
+            'url': response.url,
+            'status_code': response.status_code,
+            'headers': {k.lower(): v for k, v in response.headers.items()},
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'stored_at': time.time(),
+        }
+        _write_atomic(self._path(key, '.body.gz'), gzip.compress(response.content))
+        _write_atomic(self._path(key, '.json'), json.dumps(meta).encode('utf-8'))
+        # A new body invalidates whatever was parsed from the old one
+        try:
+            os.unlink(self._path(key, '.parsed.json'))
+        except FileNotFoundError:
+            pass
+
+    def _cached_response(self, key: str, cached: Dict[str, Any]) -> CachedResponse:
+        return CachedResponse(
+            url=cached['url'],
+            status_code=cached['status_code'],
+            content=cached['content'],
+            headers=cached['headers'],
+            cache_key=key,
+            from_cache=True
+        )
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: int = 30) -> CachedResponse:
+        """GET url, revalidating a cached copy instead of re-downloading it"""
+        key = self.key(url)
+        cached = self._load(url)
+
+        if self.offline:
+            if cached is None:
+                raise CacheMiss(f"{url} is not in the HTTP cache")
+            self.stats['hits'] += 1
+            return self._cached_response(key, cached)
+
+        request_headers = dict(headers or {})
+        if cached:
+            if cached.get('etag'):
+                request_headers['If-None-Match'] = cached['etag']
+            if cached.get('last_modified'):
+                request_headers['If-Modified-Since'] = cached['last_modified']
+
+        response = self.session.get(url, headers=request_headers, timeout=timeout)
+
+        if response.status_code == 304 and cached:
+            self.stats['revalidated'] += 1
+            logger.debug(f"Not modified: {url}")
+            return self._cached_response(key, cached)
+
+        response.raise_for_status()
+        self.stats['downloaded'] += 1
+        self._store(key, response)
+        return CachedResponse(
+            url=response.url,
+            status_code=response.status_code,
+            content=response.content,
+            headers={k.lower(): v for k, v in response.headers.items()},
+            cache_key=key
+        )
+
+    def parsed(self, response: CachedResponse, parse: Callable[[str], Any], version: str = '') -> Any:
+        """
+        parse(response.text), memoized per cached body and parser version
+
+        Results must be JSON-serializable; a response served from cache
+        reuses the stored result instead of parsing again, unless it was
+        stored by a different version of the parser.
+        """
+        path = self._path(response.cache_key, '.parsed.json')
+        if response.from_cache:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    stored = json.load(f)
+                if isinstance(stored, dict) and stored.get('version') == version and 'result' in stored:
+                    self.stats['parse_reused'] += 1
+                    return stored['result']
+            except (OSError, ValueError):
+                pass
+
+        result = parse(response.text)
+        stored = {'version': version, 'result': result}
+        _write_atomic(path, json.dumps(stored, ensure_ascii=False).encode('utf-8'))
+        return result
@@ -0,0 +1,155 @@
+"""
+Replay of captured listing API calls against a local mock server
+
+The server serves 23 canned listings, paged by query parameters or by a JSON
+POST body, the way the ClearlyAcquired listing API does. /listings reports a
+total, /counted reports only the page's own count and /filtered insists on
+its repeated status parameters.
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+from ml.clearlyacquired_api_scraper import _pagination, build_session, replay_pagination
+
+LISTINGS = [
+    {'id': i, 'businessName': f'Business {i}', 'askingPrice': 100_000 * (i + 1)}
+    for i in range(23)
+]
+
+
+class ListingApi(BaseHTTPRequestHandler):
+    """/listings and friends page by page/pageSize; /search by offset/limit in the body"""
+
+    def _send(self, payload, status=200):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urlparse(self.path)
+        repeated = parse_qs(parts.query)
+        query = {key: values[0] for key, values in repeated.items()}
+        if parts.path == '/broken':
+            self._send({'error': 'boom'}, status=500)
+            return
+        if parts.path == '/filtered' and repeated.get('status') != ['open', 'pending']:
+            self._send({'error': 'missing status filter'}, status=400)
+            return
+        size = int(query.get('pageSize', 10))
+        page = int(query.get('page', 1))
+        items = LISTINGS[(page - 1) * size:page * size]
+        payload = {'data': {'items': items}}
+        if parts.path == '/listings':
+            payload['data']['total'] = len(LISTINGS)
+        if parts.path == '/counted':
+            payload['data']['count'] = len(items)
+        self._send(payload)
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        offset, limit = body['offset'], body['limit']
+        self._send({'results': LISTINGS[offset:offset + limit], 'totalCount': len(LISTINGS)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope='module')
+def api_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ListingApi)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def session():
+    return build_session([])
+
+
+def captured(url, **call):
+    """A harvested call whose payload is the page the browser already received"""
+    call.setdefault('method', 'GET')
+    call.setdefault('headers', {'Accept': 'application/json'})
+    if call['method'] == 'GET':
+        call['payload'] = requests.get(url, timeout=5).json()
+    else:
+        call['payload'] = requests.post(url, data=call['post_data'], timeout=5).json()
+    return {'url': url, **call}
+
+
+def ids(records):
+    return [record['id'] for record in records]
+
+
+def test_replays_pages_concurrently_when_total_is_known(api_url, session):
+    call = captured(f'{api_url}/listings?page=1&pageSize=10')
+    assert ids(replay_pagination(session, call)) == list(range(23))
+
+
+def test_replays_pages_until_a_short_page_without_total(api_url, session):
+    call = captured(f'{api_url}/feed?page=1&pageSize=10')
+    assert ids(replay_pagination(session, call)) == list(range(23))
+
+
+def test_replays_offsets_in_json_body(api_url, session):
+    call = captured(f'{api_url}/search', method='POST', post_data=json.dumps({'offset': 0, 'limit': 5}))
+    assert ids(replay_pagination(session, call)) == list(range(23))
+
+
+def test_max_pages_bounds_the_replay(api_url, session):
+    call = captured(f'{api_url}/feed?page=1&pageSize=5')
+    assert ids(replay_pagination(session, call, max_pages=2)) == list(range(15))
+
+
+def test_pages_before_a_captured_later_page_are_fetched(api_url, session):
+    call = captured(f'{api_url}/listings?page=3&pageSize=5')
+    assert ids(replay_pagination(session, call)) == list(range(23))
+
+
+def test_pages_before_a_captured_later_page_without_total(api_url, session):
+    call = captured(f'{api_url}/feed?page=2&pageSize=10')
+    assert ids(replay_pagination(session, call)) == list(range(23))
+
+
+def test_unaligned_captured_offset_replays_from_zero(api_url, session):
+    call = captured(f'{api_url}/search', method='POST', post_data=json.dumps({'offset': 7, 'limit': 5}))
+    assert ids(replay_pagination(session, call)) == list(range(23))
+
+
+def test_count_of_the_page_is_not_a_total(api_url, session):
+    call = captured(f'{api_url}/counted?page=1&pageSize=10')
+    assert ids(replay_pagination(session, call)) == list(range(23))
+
+
+def test_repeated_query_params_are_kept(api_url, session):
+    call = captured(f'{api_url}/filtered?status=open&status=pending&page=1&pageSize=10')
+    assert ids(replay_pagination(session, call)) == list(range(23))
+
+
+def test_non_integer_offsets_are_not_paginated():
+    assert _pagination({'start': '2024-01-01', 'from': 'cursor-abc'}) is None
+    assert _pagination({'start': '2024-01-01', 'skip': '20'}) == ('skip', 'offset', 20)
+
+
+def test_cursor_paged_call_keeps_the_captured_page(api_url, session):
+    call = captured(f'{api_url}/feed?pageSize=10&start=2024-01-01')
+    assert ids(replay_pagination(session, call)) == list(range(10))
+
+
+def test_server_errors_surface_as_request_exceptions(api_url, session):
+    call = captured(f'{api_url}/feed?page=1&pageSize=10')
+    call['url'] = f'{api_url}/broken?page=1&pageSize=10'
+    with pytest.raises(requests.exceptions.RequestException):
+        replay_pagination(session, call)
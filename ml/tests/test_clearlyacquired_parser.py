@@ -0,0 +1,33 @@
+"""
+Money parsing and card parsing on ordinary listing text
+"""
+
+import pytest
+
+from ml.clearlyacquired_parser import parse_listings, parse_money
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('$1,499,900.00', 1_499_900.0),
+    ('$2.5M', 2_500_000.0),
+    ('750k', 750_000.0),
+    ('Best Offer', None),
+    ('Contact seller, negotiable', None),
+    ('Price: , TBD', None),
+    (',', None),
+    ('', None),
+    (None, None),
+])
+def test_parse_money(text, expected):
+    assert parse_money(text) == expected
+
+
+def test_cards_with_stray_commas_still_parse():
+    raw = [{
+        'text': 'Corner Bakery\nAsking Price:\nContact seller, negotiable\nHeadquartered:\nTX',
+        'url': 'https://app.clearlyacquired.com/listings/1',
+    }]
+    [listing] = parse_listings(raw)
+    assert listing['title'] == 'Corner Bakery'
+    assert listing['asking_price_text'] == 'Contact seller, negotiable'
+    assert listing['asking_price'] is None
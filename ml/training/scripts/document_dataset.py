@@ -0,0 +1,261 @@
+"""
+Document classification datasets backed by pre-tokenized, memory-mapped shards
+
+Each split directory is laid out as <split_path>/<document_type>/<file>.
+The first run OCRs, tokenizes and resizes every document once and writes the
+processor output to .npy shards under data.cache_dir; later epochs and
+reruns memory-map those shards and never touch OCR or the tokenizer again.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import structlog
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+
+logger = structlog.get_logger()
+
+# Label order matches the document_type enum in backend/svc-catalog/schema.sql
+DOCUMENT_TYPES = [
+    'capital_account',
+    'quarterly_financials',
+    'loan_agreement',
+    'covenant_calc',
+    'board_deck',
+    'other',
+]
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.tif', '.tiff', '.bmp'}
+
+# Bump when the on-disk shard layout changes so stale caches are rebuilt
+SHARD_FORMAT_VERSION = 1
+
+# Arrays stored per shard; attention_mask is rebuilt from lengths at collation
+SHARD_ARRAYS = ('input_ids', 'bbox', 'pixel_values', 'labels', 'lengths')
+
+
+def list_documents(split_path: str) -> List[Tuple[Path, int]]:
+    """List (file, label) pairs for a split, one sub-directory per document type"""
+    root = Path(split_path)
+    documents = []
+    for label, doc_type in enumerate(DOCUMENT_TYPES):
+        class_dir = root / doc_type
+        if not class_dir.is_dir():
+            continue
+        for path in sorted(class_dir.iterdir()):
+            if path.suffix.lower() in IMAGE_EXTENSIONS:
+                documents.append((path, label))
+    return documents
+
+
+def split_fingerprint(documents: List[Tuple[Path, int]], processor, config) -> str:
+    """Hash of the inputs and processing settings that determine shard contents"""
+    h = hashlib.sha256()
+    h.update(json.dumps({
+        'version': SHARD_FORMAT_VERSION,
+        'processor': getattr(processor, 'name_or_path', None) or config['model']['pretrained'],
+        'max_seq_length': config['data']['max_seq_length'],
+        'image_size': list(config['data']['image_size']),
+    }, sort_keys=True).encode())
+    for path, label in documents:
+        stat = path.stat()
+        h.update(f"{path}|{label}|{stat.st_size}|{stat.st_mtime_ns}\n".encode())
+    return h.hexdigest()[:16]
+
+
+def _encode_batch(processor, paths: List[Path], max_seq_length: int) -> Dict[str, np.ndarray]:
+    images = [Image.open(path).convert('RGB') for path in paths]
+    encoding = processor(
+        images,
+        truncation=True,
+        padding='max_length',
+        max_length=max_seq_length,
+        return_tensors='np'
+    )
+    return {
+        'input_ids': encoding['input_ids'],
+        'bbox': encoding['bbox'],
+        'pixel_values': encoding['pixel_values'],
+        'lengths': encoding['attention_mask'].sum(axis=1),
+    }
+
+
+def build_shards(
+    documents: List[Tuple[Path, int]],
+    processor,
+    config,
+    output_dir: Path,
+    shard_size: int = 1024,
+    batch_size: int = 16
+) -> None:
+    """Run the processor over every document once and write .npy shards"""
+    max_seq_length = config['data']['max_seq_length']
+    height, width = config['data']['image_size']
+
+    tmp_dir = output_dir.with_name(output_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    shards = []
+    for shard_idx, start in enumerate(range(0, len(documents), shard_size)):
+        chunk = documents[start:start + shard_size]
+        n = len(chunk)
+        prefix = tmp_dir / f"shard-{shard_idx:05d}"
+
+        arrays = {
+            'input_ids': np.lib.format.open_memmap(
+                f"{prefix}-input_ids.npy", mode='w+', dtype=np.int32, shape=(n, max_seq_length)),
+            'bbox': np.lib.format.open_memmap(
+                f"{prefix}-bbox.npy", mode='w+', dtype=np.int16, shape=(n, max_seq_length, 4)),
+            'pixel_values': np.lib.format.open_memmap(
+                f"{prefix}-pixel_values.npy", mode='w+', dtype=np.float16, shape=(n, 3, height, width)),
+            'labels': np.lib.format.open_memmap(
+                f"{prefix}-labels.npy", mode='w+', dtype=np.int64, shape=(n,)),
+            'lengths': np.lib.format.open_memmap(
+                f"{prefix}-lengths.npy", mode='w+', dtype=np.int32, shape=(n,)),
+        }
+        arrays['labels'][:] = [label for _, label in chunk]
+
+        for offset in range(0, n, batch_size):
+            batch = chunk[offset:offset + batch_size]
+            encoded = _encode_batch(processor, [path for path, _ in batch], max_seq_length)
+            end = offset + len(batch)
+            for name, values in encoded.items():
+                arrays[name][offset:end] = values
+
+        for array in arrays.values():
+            array.flush()
+        shards.append({'prefix': prefix.name, 'size': n})
+        logger.info("Wrote shard", shard=shard_idx, documents=n)
+
+    with open(tmp_dir / 'manifest.json', 'w') as f:
+        json.dump({
+            'version': SHARD_FORMAT_VERSION,
+            'max_seq_length': max_seq_length,
+            'image_size': [height, width],
+            'num_documents': len(documents),
+            'shards': shards,
+        }, f, indent=2)
+
+    # Publish atomically so an interrupted build is never mistaken for a cache hit
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+
+
+class ShardedDocumentDataset(Dataset):
+    """Dataset reading pre-tokenized documents from memory-mapped shards"""
+
+    def __init__(self, shard_dir: Path):
+        self.shard_dir = Path(shard_dir)
+        with open(self.shard_dir / 'manifest.json') as f:
+            self.manifest = json.load(f)
+
+        sizes = [shard['size'] for shard in self.manifest['shards']]
+        self.offsets = np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64)
+        # Shards are opened lazily so dataloader workers each map their own views
+        self._shards = None
+
+    def _open(self):
+        if self._shards is None:
+            self._shards = [
+                {
+                    name: np.load(self.shard_dir / f"{shard['prefix']}-{name}.npy", mmap_mode='r')
+                    for name in SHARD_ARRAYS
+                }
+                for shard in self.manifest['shards']
+            ]
+        return self._shards
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_shards'] = None
+        return state
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """Unpadded token count of every document, used for length-grouped batching"""
+        return np.concatenate([shard['lengths'] for shard in self._open()])
+
+    def __getitem__(self, idx: int) -> Dict[str, torch.Tensor]:
+        shard_idx = int(np.searchsorted(self.offsets, idx, side='right')) - 1
+        row = idx - int(self.offsets[shard_idx])
+        shard = self._open()[shard_idx]
+
+        # Sequences are returned unpadded; DynamicPaddingCollator pads per batch
+        length = int(shard['lengths'][row])
+        return {
+            'input_ids': torch.from_numpy(shard['input_ids'][row, :length].astype(np.int64)),
+            'bbox': torch.from_numpy(shard['bbox'][row, :length].astype(np.int64)),
+            'pixel_values': torch.from_numpy(shard['pixel_values'][row].astype(np.float32)),
+            'labels': torch.tensor(int(shard['labels'][row])),
+        }
+
+
+class DynamicPaddingCollator:
+    """Pads each batch only to its longest sequence instead of max_seq_length"""
+
+    def __init__(self, pad_token_id: int = 1, pad_to_multiple_of: Optional[int] = 8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features: List[Dict[str, torch.Tensor]]) -> Dict[str, torch.Tensor]:
+        lengths = [len(feature['input_ids']) for feature in features]
+        max_length = max(lengths)
+        if self.pad_to_multiple_of:
+            multiple = self.pad_to_multiple_of
+            max_length = (max_length + multiple - 1) // multiple * multiple
+
+        batch_size = len(features)
+        input_ids = torch.full((batch_size, max_length), self.pad_token_id, dtype=torch.long)
+        bbox = torch.zeros((batch_size, max_length, 4), dtype=torch.long)
+        attention_mask = torch.zeros((batch_size, max_length), dtype=torch.long)
+        for i, (feature, length) in enumerate(zip(features, lengths)):
+            input_ids[i, :length] = feature['input_ids']
+            bbox[i, :length] = feature['bbox']
+            attention_mask[i, :length] = 1
+
+        return {
+            'input_ids': input_ids,
+            'bbox': bbox,
+            'attention_mask': attention_mask,
+            'pixel_values': torch.stack([feature['pixel_values'] for feature in features]),
+            'labels': torch.stack([feature['labels'] for feature in features]),
+        }
+
+
+def load_split(split_path: str, processor, config) -> Optional[ShardedDocumentDataset]:
+    """Load a split from its shard cache, building the cache on first use"""
+    documents = list_documents(split_path)
+    if not documents:
+        logger.warning("No documents found", split_path=split_path)
+        return None
+
+    cache_root = Path(config['data'].get('cache_dir', 'datasets/documents/cache'))
+    fingerprint = split_fingerprint(documents, processor, config)
+    shard_dir = cache_root / f"{Path(split_path).name}-{fingerprint}"
+
+    if (shard_dir / 'manifest.json').exists():
+        logger.info("Using cached shards", split_path=split_path, shard_dir=str(shard_dir))
+    else:
+        logger.info("Building shards", split_path=split_path,
+                    documents=len(documents), shard_dir=str(shard_dir))
+        build_shards(
+            documents,
+            processor,
+            config,
+            shard_dir,
+            shard_size=config['data'].get('shard_size', 1024),
+            batch_size=config['data'].get('preprocess_batch_size', 16)
+        )
+
+    return ShardedDocumentDataset(shard_dir)
@@ -0,0 +1,177 @@
+"""
+Step-level performance telemetry for document classifier training
+
+StepTelemetry accumulates wall time per phase (data loading, forward,
+backward, optimizer) as the trainer runs; StepTelemetryCallback turns it
+into per-step MLflow metrics together with tokens/second and peak RSS, and
+runs the torch profiler over a sampled window of steps.
+"""
+
+import resource
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import mlflow
+import structlog
+import torch
+from mlflow.entities import Metric
+from mlflow.tracking import MlflowClient
+from transformers import TrainerCallback
+
+logger = structlog.get_logger()
+
+PHASES = ('data_loading', 'forward', 'backward', 'optimizer')
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+class StepTelemetry:
+    """Phase timings and token counts accumulated between optimizer steps"""
+
+    def __init__(self):
+        self.phase_seconds: Dict[str, float] = defaultdict(float)
+        self.tokens = 0
+        self.samples = 0
+        self._last_mark = time.perf_counter()
+
+    def mark(self) -> float:
+        """Return seconds since the previous mark and start a new interval"""
+        now = time.perf_counter()
+        elapsed = now - self._last_mark
+        self._last_mark = now
+        return elapsed
+
+    def add(self, phase: str, seconds: float) -> None:
+        self.phase_seconds[phase] += seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] += time.perf_counter() - start
+
+    def count_batch(self, inputs: Dict[str, torch.Tensor]) -> None:
+        mask = inputs.get('attention_mask')
+        if mask is not None:
+            self.tokens += int(mask.sum())
+            self.samples += int(mask.shape[0])
+
+    def reset(self) -> Dict[str, float]:
+        """Return the accumulated step telemetry and clear it"""
+        snapshot = {f'{phase}_seconds': self.phase_seconds.get(phase, 0.0) for phase in PHASES}
+        snapshot['tokens'] = self.tokens
+        snapshot['samples'] = self.samples
+        self.phase_seconds = defaultdict(float)
+        self.tokens = 0
+        self.samples = 0
+        return snapshot
+
+
+class StepTelemetryCallback(TrainerCallback):
+    """Logs per-step telemetry to MLflow and profiles a sampled window of steps"""
+
+    def __init__(self, telemetry: StepTelemetry, config: Optional[Dict] = None):
+        config = config or {}
+        self.telemetry = telemetry
+        self.flush_every = config.get('flush_every_n_steps', 10)
+        self.profiler_start = config.get('profiler_start_step', 20)
+        self.profiler_warmup = config.get('profiler_warmup_steps', 2)
+        self.profiler_active = config.get('profiler_active_steps', 5)
+        self.trace_dir = Path(config.get('trace_dir', 'profiler'))
+        self._pending: List[Metric] = []
+        self._client = MlflowClient()
+        self._profiler = None
+
+    def _start_profiler(self) -> None:
+        if self.profiler_active <= 0:
+            return
+        self.trace_dir.mkdir(parents=True, exist_ok=True)
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._profiler = torch.profiler.profile(
+            activities=activities,
+            schedule=torch.profiler.schedule(
+                skip_first=self.profiler_start,
+                wait=0,
+                warmup=self.profiler_warmup,
+                active=self.profiler_active,
+                repeat=1
+            ),
+            on_trace_ready=self._on_trace_ready,
+            profile_memory=True
+        )
+        self._profiler.start()
+
+    def _on_trace_ready(self, profiler) -> None:
+        trace_path = self.trace_dir / f"trace_step_{profiler.step_num}.json"
+        profiler.export_chrome_trace(str(trace_path))
+        table = profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=40)
+        logger.info("Profiler window captured", trace=str(trace_path))
+        if mlflow.active_run():
+            mlflow.log_artifact(str(trace_path), artifact_path="profiler")
+            mlflow.log_text(table, f"profiler/key_averages_step_{profiler.step_num}.txt")
+
+    def _flush(self) -> None:
+        run = mlflow.active_run()
+        if run and self._pending:
+            # Batched requests instead of a tracking-server call per metric;
+            # MLflow accepts at most 1000 metrics per log_batch call
+            for start in range(0, len(self._pending), 1000):
+                self._client.log_batch(run.info.run_id, metrics=self._pending[start:start + 1000])
+        self._pending = []
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._start_profiler()
+        self.telemetry.reset()
+        self.telemetry.mark()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        # Time since the last backward pass: grad clipping, optimizer and scheduler
+        self.telemetry.add('optimizer', self.telemetry.mark())
+        step = self.telemetry.reset()
+
+        step_seconds = sum(step[f'{phase}_seconds'] for phase in PHASES)
+        values = {f'telemetry/{key}': float(value) for key, value in step.items()}
+        values['telemetry/step_seconds'] = step_seconds
+        values['telemetry/peak_rss_mb'] = peak_rss_mb()
+        if step_seconds > 0:
+            values['telemetry/tokens_per_second'] = step['tokens'] / step_seconds
+            values['telemetry/samples_per_second'] = step['samples'] / step_seconds
+
+        timestamp = int(time.time() * 1000)
+        self._pending.extend(
+            Metric(key, value, timestamp, state.global_step) for key, value in values.items()
+        )
+        if state.global_step % self.flush_every == 0:
+            self._flush()
+
+        if self._profiler is not None:
+            self._profiler.step()
+
+        # Exclude the callback's own bookkeeping from the next data-loading phase
+        self.telemetry.mark()
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        # Evaluation and checkpointing run between steps; keep them out of data loading
+        self.telemetry.mark()
+
+    def on_save(self, args, state, control, **kwargs):
+        self.telemetry.mark()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self._flush()
+        if self._profiler is not None:
+            self._profiler.stop()
+            self._profiler = None
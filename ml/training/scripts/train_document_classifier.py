@@ -5,6 +5,7 @@ Uses LayoutLMv3 or similar document understanding model
 """
 
 import os
+import time
 import yaml
 import mlflow
 import torch
@@ -15,9 +16,13 @@ from transformers import (
     TrainingArguments,
     Trainer
 )
-from datasets import load_dataset
+from transformers.trainer_pt_utils import LengthGroupedSampler
 import structlog
 
+from document_dataset import DOCUMENT_TYPES, DynamicPaddingCollator, load_split
+from metrics import classification_metrics
+from telemetry import StepTelemetry, StepTelemetryCallback
+
 logger = structlog.get_logger()
 
 def load_config(config_path: str):
@@ -27,21 +32,64 @@ def load_config(config_path: str):
 
 def setup_mlflow(config):
     """Initialize MLflow tracking"""
-    mlflow.set_tracking_uri(config['logging']['mlflow_tracking_uri'])
+    # MLFLOW_TRACKING_URI (e.g. file:./mlruns) overrides the config for local runs
+    mlflow.set_tracking_uri(
+        os.environ.get('MLFLOW_TRACKING_URI', config['logging']['mlflow_tracking_uri'])
+    )
     mlflow.set_experiment(config['logging']['experiment_name'])
 
-def prepare_datasets(config):
-    """Load and prepare training datasets"""
+def prepare_datasets(config, processor):
+    """Load and prepare training datasets from pre-tokenized shard caches"""
     logger.info("Loading datasets...")
 
-    # TODO: Implement actual dataset loading
-    # For now, return placeholder
-    train_dataset = None
-    val_dataset = None
-    test_dataset = None
+    train_dataset = load_split(config['data']['train_path'], processor, config)
+    val_dataset = load_split(config['data']['val_path'], processor, config)
+    test_dataset = load_split(config['data']['test_path'], processor, config)
 
     return train_dataset, val_dataset, test_dataset
 
+class DocumentTrainer(Trainer):
+    """
+    Trainer that buckets training batches by unpadded sequence length and
+    optionally records per-phase step timings into a StepTelemetry
+    """
+
+    def __init__(self, *args, group_by_length: bool = True,
+                 telemetry: StepTelemetry = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.group_by_length = group_by_length
+        self.telemetry = telemetry
+
+    def _get_train_sampler(self):
+        if not self.group_by_length or not hasattr(self.train_dataset, 'lengths'):
+            return super()._get_train_sampler()
+        # Pass precomputed lengths so the sampler never iterates the dataset
+        return LengthGroupedSampler(
+            self.args.train_batch_size * self.args.gradient_accumulation_steps,
+            lengths=self.train_dataset.lengths.tolist()
+        )
+
+    def training_step(self, model, inputs, *args, **kwargs):
+        if self.telemetry is None:
+            return super().training_step(model, inputs, *args, **kwargs)
+
+        # Time since the previous mark was spent waiting on the dataloader
+        self.telemetry.add('data_loading', self.telemetry.mark())
+        self.telemetry.count_batch(inputs)
+        forward_before = self.telemetry.phase_seconds['forward']
+        loss = super().training_step(model, inputs, *args, **kwargs)
+        # Everything in training_step except compute_loss is the backward pass
+        step_seconds = self.telemetry.mark()
+        forward_seconds = self.telemetry.phase_seconds['forward'] - forward_before
+        self.telemetry.add('backward', step_seconds - forward_seconds)
+        return loss
+
+    def compute_loss(self, model, inputs, *args, **kwargs):
+        if self.telemetry is None or not model.training:
+            return super().compute_loss(model, inputs, *args, **kwargs)
+        with self.telemetry.phase('forward'):
+            return super().compute_loss(model, inputs, *args, **kwargs)
+
 def create_model(config):
     """Initialize model and processor"""
     logger.info("Initializing model...",
@@ -50,6 +98,8 @@ def create_model(config):
     processor = LayoutLMv3Processor.from_pretrained(
         config['model']['pretrained']
     )
+    height, width = config['data']['image_size']
+    processor.image_processor.size = {'height': height, 'width': width}
 
     model = LayoutLMv3ForSequenceClassification.from_pretrained(
         config['model']['pretrained'],
@@ -61,15 +111,8 @@ def create_model(config):
 def compute_metrics(eval_pred):
     """Compute evaluation metrics"""
     predictions, labels = eval_pred
-    predictions = predictions.argmax(axis=-1)
-
-    # Calculate accuracy, precision, recall, F1
-    # TODO: Implement detailed metrics
-    accuracy = (predictions == labels).mean()
-
-    return {
-        'accuracy': accuracy
-    }
+    metrics, _ = classification_metrics(predictions, labels, DOCUMENT_TYPES)
+    return metrics
 
 def train(config_path: str):
     """Main training function"""
@@ -88,15 +131,20 @@ def train(config_path: str):
             'model_type': config['model']['type'],
             'learning_rate': config['training']['learning_rate'],
             'batch_size': config['training']['batch_size'],
-            'epochs': config['training']['epochs']
+            'epochs': config['training']['epochs'],
+            'dataloader_num_workers': config['data'].get('num_workers', 0),
+            'group_by_length': config['data'].get('group_by_length', True)
         })
 
-        # Prepare datasets
-        train_dataset, val_dataset, test_dataset = prepare_datasets(config)
-
         # Create model
         model, processor = create_model(config)
 
+        # Prepare datasets
+        train_dataset, val_dataset, test_dataset = prepare_datasets(config, processor)
+
+        # Parallel data loading; prefetching only applies with worker processes
+        num_workers = config['data'].get('num_workers', 0)
+
         # Training arguments
         training_args = TrainingArguments(
             output_dir=config['output']['checkpoint_dir'],
@@ -111,31 +159,67 @@ def train(config_path: str):
             eval_steps=config['logging']['eval_steps'],
             save_steps=config['logging']['save_steps'],
             load_best_model_at_end=True,
-            fp16=config['training']['mixed_precision'],
+            fp16=config['training']['mixed_precision'] and torch.cuda.is_available(),
             gradient_accumulation_steps=config['training']['gradient_accumulation_steps'],
-            max_grad_norm=config['optimization']['max_grad_norm']
+            max_grad_norm=config['optimization']['max_grad_norm'],
+            dataloader_num_workers=num_workers,
+            dataloader_prefetch_factor=config['data'].get('prefetch_factor', 2) if num_workers > 0 else None,
+            dataloader_persistent_workers=config['data'].get('persistent_workers', True) and num_workers > 0,
+            dataloader_pin_memory=torch.cuda.is_available()
         )
 
+        # Step telemetry: phase timings, tokens/s, peak RSS and a profiled window
+        profiling_config = config.get('profiling', {})
+        telemetry = StepTelemetry() if profiling_config.get('enabled', True) else None
+
         # Initialize trainer
-        trainer = Trainer(
+        trainer = DocumentTrainer(
             model=model,
             args=training_args,
             train_dataset=train_dataset,
             eval_dataset=val_dataset,
-            compute_metrics=compute_metrics
+            data_collator=DynamicPaddingCollator(
+                pad_token_id=processor.tokenizer.pad_token_id,
+                pad_to_multiple_of=config['data'].get('pad_to_multiple_of', 8)
+            ),
+            compute_metrics=compute_metrics,
+            group_by_length=config['data'].get('group_by_length', True),
+            telemetry=telemetry
         )
+        if telemetry is not None:
+            trainer.add_callback(StepTelemetryCallback(telemetry, profiling_config))
 
         # Train
         logger.info("Training started...")
+        start_time = time.perf_counter()
         train_result = trainer.train()
+        train_seconds = time.perf_counter() - start_time
 
         # Log metrics
         mlflow.log_metrics(train_result.metrics)
 
+        # Throughput report (wall clock, including data loading)
+        samples_per_second = len(train_dataset) * config['training']['epochs'] / train_seconds
+        logger.info("Training throughput",
+                    samples_per_second=round(samples_per_second, 2),
+                    dataloader_num_workers=num_workers)
+        mlflow.log_metrics({
+            'throughput_samples_per_second': samples_per_second,
+            'train_wall_seconds': train_seconds
+        })
+
         # Evaluate on test set
         logger.info("Evaluating on test set...")
-        test_metrics = trainer.evaluate(test_dataset)
-        mlflow.log_metrics({f"test_{k}": v for k, v in test_metrics.items()})
+        test_output = trainer.predict(test_dataset, metric_key_prefix="test")
+        mlflow.log_metrics(test_output.metrics)
+
+        # Per-class confusion matrix (rows = true, columns = predicted)
+        _, confusion = classification_metrics(
+            test_output.predictions, test_output.label_ids, DOCUMENT_TYPES)
+        mlflow.log_dict(
+            {'labels': DOCUMENT_TYPES, 'matrix': confusion.tolist()},
+            "test_confusion_matrix.json"
+        )
 
         # Save model
         logger.info("Saving model...", output_dir=config['output']['model_dir'])